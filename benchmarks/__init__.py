@@ -0,0 +1,14 @@
+"""Benchmarks of pyresample for airspeed velocity (asv).
+
+The benchmarks only use synthetic data, so they run offline. To benchmark
+the current environment and source tree run::
+
+    asv dev
+
+or, to store the results, ``asv run --python=same``. Running ``asv run``
+benchmarks the commits of the configured branches in fresh environments.
+
+Every suite is parametrized by the kind of source, a polar orbiter swath, a
+geostationary full disk area or a 1-D point cloud, and by its size. Time is
+measured by the ``time_*`` and peak memory by the ``peakmem_*`` benchmarks.
+"""
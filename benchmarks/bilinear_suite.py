@@ -0,0 +1,33 @@
+"""Benchmarks of the bilinear resampling."""
+
+from pyresample import bilinear
+
+from .common import get_radius, get_source, get_target
+
+
+class BilinearSuite(object):
+    """Bilinear interpolation to an area."""
+
+    params = (['polar', 'geostationary'], ['small', 'medium'])
+    param_names = ['source', 'size']
+    timeout = 300
+
+    def setup(self, source, size):
+        self.source_def, self.data = get_source(source, size)
+        self.target_def = get_target(size)
+        self.radius = get_radius(source, size)
+        self.bil_info = bilinear.get_bil_info(self.source_def,
+                                              self.target_def,
+                                              radius=self.radius)
+
+    def time_resample_bilinear(self, source, size):
+        bilinear.resample_bilinear(self.data, self.source_def,
+                                   self.target_def, radius=self.radius)
+
+    def peakmem_resample_bilinear(self, source, size):
+        bilinear.resample_bilinear(self.data, self.source_def,
+                                   self.target_def, radius=self.radius)
+
+    def time_get_sample_from_bil_info(self, source, size):
+        bilinear.get_sample_from_bil_info(self.data.ravel(), *self.bil_info,
+                                          output_shape=self.target_def.shape)
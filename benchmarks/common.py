@@ -0,0 +1,131 @@
+"""Synthetic geometries and data shared by the benchmarks."""
+
+import numpy as np
+
+from pyresample import geometry
+
+#: Rows and columns of the polar orbiter swath of every size
+POLAR_SHAPES = {'small': (256, 64), 'medium': (1024, 256),
+                'large': (4096, 1024)}
+#: Rows and columns of the geostationary full disk of every size
+GEOSTATIONARY_SHAPES = {'small': (256, 256), 'medium': (928, 928),
+                        'large': (3712, 3712)}
+#: Number of points of the point cloud of every size
+POINT_CLOUD_SIZES = {'small': 10000, 'medium': 200000, 'large': 2000000}
+#: Rows and columns of the target area of every size
+TARGET_SHAPES = {'small': (200, 200), 'medium': (800, 800),
+                 'large': (2000, 2000)}
+
+SIZES = ['small', 'medium', 'large']
+SOURCES = ['polar', 'geostationary', 'points']
+
+EARTH_RADIUS = 6370997.0
+
+
+def get_polar_swath(shape):
+    """Get a polar orbiter like swath.
+
+    The swath is 2900 km wide and follows a sun-synchronous orbit from 25N
+    over Europe towards the north pole.
+    """
+    rows, cols = shape
+    inclination = np.radians(98.7)
+    node_lon = np.radians(20.)
+    # Orbit plane through the ascending node
+    node = np.array([np.cos(node_lon), np.sin(node_lon), 0.])
+    north = np.array([-np.sin(node_lon) * np.cos(inclination),
+                      np.cos(node_lon) * np.cos(inclination),
+                      np.sin(inclination)])
+    normal = np.cross(node, north)
+
+    along = np.radians(np.linspace(25., 85., rows))[:, np.newaxis, np.newaxis]
+    across = np.linspace(-1450e3, 1450e3, cols)[np.newaxis, :, np.newaxis]
+    across = across / EARTH_RADIUS
+    track = np.cos(along) * node + np.sin(along) * north
+    coords = np.cos(across) * track + np.sin(across) * normal
+
+    lons = np.degrees(np.arctan2(coords[..., 1], coords[..., 0]))
+    lats = np.degrees(np.arcsin(np.clip(coords[..., 2], -1, 1)))
+    return geometry.SwathDefinition(lons=lons, lats=lats)
+
+
+def get_geostationary_area(shape):
+    """Get a geostationary full disk area, like the MSG SEVIRI one."""
+    rows, cols = shape
+    return geometry.AreaDefinition(
+        'geos', 'Geostationary full disk', 'geos',
+        {'a': '6378169.0', 'b': '6356583.8', 'h': '35785831.0',
+         'lon_0': '0.0', 'proj': 'geos', 'units': 'm'},
+        cols, rows,
+        [-5570248.4773392612, -5567248.074173444,
+         5567248.074173444, 5570248.4773392612])
+
+
+def get_point_cloud(size):
+    """Get randomly scattered points over Europe."""
+    random = np.random.RandomState(42)
+    lons = random.uniform(-20., 40., size)
+    lats = random.uniform(30., 75., size)
+    return geometry.SwathDefinition(lons=lons, lats=lats)
+
+
+def get_europe_area(shape):
+    """Get a polar stereographic area over Europe."""
+    rows, cols = shape
+    return geometry.AreaDefinition(
+        'euro', 'Europe', 'euro',
+        {'a': '6378144.0', 'b': '6356759.0', 'lat_0': '50.00',
+         'lat_ts': '50.00', 'lon_0': '8.00', 'proj': 'stere'},
+        cols, rows,
+        [-1370912.72, -909968.64, 1029087.28, 1490031.36])
+
+
+def get_data(shape, dtype=np.float64):
+    """Get smoothly varying data."""
+    rows = np.arange(shape[0], dtype=dtype)[:, np.newaxis]
+    cols = np.arange(np.prod(shape[1:]), dtype=dtype)[np.newaxis, :]
+    return (np.sin(rows / 17.) * np.cos(cols / 23.)).reshape(shape)
+
+
+def get_source(source, size):
+    """Get the geometry definition and data of a source.
+
+    Parameters
+    ----------
+    source : {'polar', 'geostationary', 'points'}
+        Kind of the source. The geostationary source is an area definition,
+        the others are swath definitions
+    size : {'small', 'medium', 'large'}
+        Size of the source
+    """
+    if source == 'polar':
+        geo_def = get_polar_swath(POLAR_SHAPES[size])
+    elif source == 'geostationary':
+        geo_def = get_geostationary_area(GEOSTATIONARY_SHAPES[size])
+    elif source == 'points':
+        geo_def = get_point_cloud(POINT_CLOUD_SIZES[size])
+    else:
+        raise ValueError('Unknown source: %s' % source)
+    return geo_def, get_data(geo_def.shape)
+
+
+def get_target(size):
+    """Get the target area of a benchmark size."""
+    return get_europe_area(TARGET_SHAPES[size])
+
+
+def get_radius(source, size):
+    """Get a radius of influence bridging the gaps between the source
+    pixels, and at least twice the target pixel size."""
+    if source == 'polar':
+        rows, cols = POLAR_SHAPES[size]
+        spacing = max(2900e3 / cols, np.radians(60.) * EARTH_RADIUS / rows)
+    elif source == 'geostationary':
+        # Pixels over Europe are about twice the size of the nadir pixels
+        spacing = 2 * 3000. * 3712 / GEOSTATIONARY_SHAPES[size][0]
+    else:
+        # Mean distance between the scattered points
+        spacing = np.sqrt(np.radians(60.) * np.radians(45.) *
+                          np.cos(np.radians(52.)) * EARTH_RADIUS ** 2 /
+                          POINT_CLOUD_SIZES[size])
+    return 2 * max(spacing, get_target(size).pixel_size_x)
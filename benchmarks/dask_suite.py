@@ -0,0 +1,64 @@
+"""Benchmarks of the dask based resamplers."""
+
+import numpy as np
+
+from pyresample import geometry
+
+from .common import SIZES, get_radius, get_source, get_target
+
+CHUNKS = 1024
+
+
+class XArrayResamplerNNSuite(object):
+    """Nearest neighbour resampling of a polar orbiter swath with dask."""
+
+    params = SIZES
+    param_names = ['size']
+    timeout = 300
+
+    def setup(self, size):
+        try:
+            import dask.array as da
+            import xarray as xr
+            from pyresample.kd_tree import XArrayResamplerNN
+        except ImportError:
+            raise NotImplementedError('dask and xarray are needed')
+        source_def, data = get_source('polar', size)
+        lons, lats = source_def.get_lonlats()
+        self.source_def = geometry.SwathDefinition(
+            lons=xr.DataArray(da.from_array(lons, chunks=CHUNKS),
+                              dims=('y', 'x')),
+            lats=xr.DataArray(da.from_array(lats, chunks=CHUNKS),
+                              dims=('y', 'x')))
+        self.data = xr.DataArray(da.from_array(data, chunks=CHUNKS),
+                                 dims=('y', 'x'))
+        self.target_def = get_target(size)
+        self.radius = get_radius('polar', size)
+        self.resampler_class = XArrayResamplerNN
+        XArrayResamplerNN.clear_kdtree_cache()
+
+    def teardown(self, size):
+        self.resampler_class.clear_kdtree_cache()
+
+    def _resample(self, neighbours):
+        resampler = self.resampler_class(self.source_def, self.target_def,
+                                         self.radius, neighbours=neighbours)
+        resampler.get_neighbour_info()
+        self.resampler_class.clear_kdtree_cache()
+        return resampler.get_sample_from_neighbour_info(self.data).compute()
+
+    def time_nearest(self, size):
+        self._resample(1)
+
+    def peakmem_nearest(self, size):
+        self._resample(1)
+
+    def time_weighted_8n(self, size):
+        resampler = self.resampler_class(self.source_def, self.target_def,
+                                         self.radius, neighbours=8)
+        resampler.get_neighbour_info()
+        self.resampler_class.clear_kdtree_cache()
+        resampler.get_sample_from_neighbour_info(
+            self.data, weight_funcs=lambda r: np.exp(-r ** 2 /
+                                                     self.radius ** 2)
+        ).compute()
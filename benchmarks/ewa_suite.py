@@ -0,0 +1,32 @@
+"""Benchmarks of the Elliptical Weighted Averaging resampling."""
+
+from pyresample.ewa import fornav, ll2cr
+
+from .common import SIZES, get_source, get_target
+
+ROWS_PER_SCAN = 16
+
+
+class EWASuite(object):
+    """EWA resampling of a polar orbiter swath to an area."""
+
+    params = SIZES
+    param_names = ['size']
+    timeout = 300
+
+    def setup(self, size):
+        self.source_def, self.data = get_source('polar', size)
+        self.target_def = get_target(size)
+        _, self.cols, self.rows = ll2cr(self.source_def, self.target_def)
+
+    def time_ll2cr(self, size):
+        ll2cr(self.source_def, self.target_def)
+
+    def time_fornav(self, size):
+        fornav(self.cols, self.rows, self.target_def, self.data,
+               rows_per_scan=ROWS_PER_SCAN)
+
+    def peakmem_ewa(self, size):
+        _, cols, rows = ll2cr(self.source_def, self.target_def)
+        fornav(cols, rows, self.target_def, self.data,
+               rows_per_scan=ROWS_PER_SCAN)
@@ -0,0 +1,50 @@
+"""Benchmarks of the coordinates of geometry definitions."""
+
+from pyresample import caching
+
+from .common import GEOSTATIONARY_SHAPES, SIZES, get_geostationary_area
+
+
+class AreaCoordinatesSuite(object):
+    """Lon/lats and cartesian coordinates of a geostationary full disk."""
+
+    params = SIZES
+    param_names = ['size']
+    timeout = 300
+
+    def setup(self, size):
+        self.area_def = get_geostationary_area(GEOSTATIONARY_SHAPES[size])
+        # Time the computation of the coordinates, not the cache
+        self.cache_size = caching.coordinate_cache.max_size
+        caching.coordinate_cache.max_size = 0
+        caching.coordinate_cache.clear()
+
+    def teardown(self, size):
+        caching.coordinate_cache.max_size = self.cache_size
+
+    def time_get_lonlats(self, size):
+        self.area_def.get_lonlats()
+
+    def peakmem_get_lonlats(self, size):
+        self.area_def.get_lonlats()
+
+    def time_get_lonlats_float32(self, size):
+        self.area_def.get_lonlats(dtype='float32')
+
+    def time_get_cartesian_coords(self, size):
+        self.area_def.get_cartesian_coords()
+
+
+class CachedAreaCoordinatesSuite(object):
+    """Lon/lats of a geostationary full disk served by the coordinate cache."""
+
+    params = SIZES
+    param_names = ['size']
+
+    def setup(self, size):
+        self.area_def = get_geostationary_area(GEOSTATIONARY_SHAPES[size])
+        caching.coordinate_cache.clear()
+        self.area_def.get_lonlats()
+
+    def time_get_lonlats(self, size):
+        self.area_def.get_lonlats()
@@ -0,0 +1,23 @@
+"""Benchmarks of the quick grid to grid resampling."""
+
+from pyresample import grid
+
+from .common import SIZES, get_source, get_target
+
+
+class GridSuite(object):
+    """Resampling of a geostationary full disk to an area."""
+
+    params = SIZES
+    param_names = ['size']
+    timeout = 300
+
+    def setup(self, size):
+        self.source_def, self.data = get_source('geostationary', size)
+        self.target_def = get_target(size)
+
+    def time_get_resampled_image(self, size):
+        grid.get_resampled_image(self.target_def, self.source_def, self.data)
+
+    def peakmem_get_resampled_image(self, size):
+        grid.get_resampled_image(self.target_def, self.source_def, self.data)
@@ -0,0 +1,82 @@
+"""Benchmarks of the kd-tree resampling."""
+
+from pyresample import kd_tree
+
+from .common import SIZES, SOURCES, get_radius, get_source, get_target
+
+
+class NearestSuite(object):
+    """Nearest neighbour resampling to an area."""
+
+    params = (SOURCES, SIZES)
+    param_names = ['source', 'size']
+    timeout = 300
+
+    def setup(self, source, size):
+        self.source_def, self.data = get_source(source, size)
+        self.target_def = get_target(size)
+        self.radius = get_radius(source, size)
+
+    def time_resample_nearest(self, source, size):
+        kd_tree.resample_nearest(self.source_def, self.data, self.target_def,
+                                 self.radius)
+
+    def peakmem_resample_nearest(self, source, size):
+        kd_tree.resample_nearest(self.source_def, self.data, self.target_def,
+                                 self.radius)
+
+    def time_get_neighbour_info(self, source, size):
+        kd_tree.get_neighbour_info(self.source_def, self.target_def,
+                                   self.radius, neighbours=1)
+
+
+class GaussSuite(object):
+    """Gaussian weighting of 8 neighbours to an area."""
+
+    params = (SOURCES, SIZES)
+    param_names = ['source', 'size']
+    timeout = 300
+
+    def setup(self, source, size):
+        self.source_def, self.data = get_source(source, size)
+        self.target_def = get_target(size)
+        self.radius = get_radius(source, size)
+        self.neighbour_info = kd_tree.get_neighbour_info(
+            self.source_def, self.target_def, self.radius, neighbours=8)
+
+    def time_resample_gauss(self, source, size):
+        kd_tree.resample_gauss(self.source_def, self.data, self.target_def,
+                               self.radius, sigmas=self.radius / 2)
+
+    def peakmem_resample_gauss(self, source, size):
+        kd_tree.resample_gauss(self.source_def, self.data, self.target_def,
+                               self.radius, sigmas=self.radius / 2)
+
+    def time_get_sample_from_neighbour_info(self, source, size):
+        kd_tree.get_sample_from_neighbour_info(
+            'custom', self.target_def.shape, self.data, *self.neighbour_info,
+            weight_funcs=lambda r: 1 / r ** 2)
+
+
+class ParallelQuerySuite(object):
+    """Neighbour info query with segments in threads sharing one kd-tree,
+    against the processes of the multiprocessing kd-tree."""
+
+    params = (['polar', 'geostationary'], SIZES, ['nthreads', 'nprocs'],
+              [1, 2, 4])
+    param_names = ['source', 'size', 'backend', 'workers']
+    timeout = 300
+
+    def setup(self, source, size, backend, workers):
+        self.source_def, self.data = get_source(source, size)
+        self.target_def = get_target(size)
+        self.radius = get_radius(source, size)
+        self.kwargs = {backend: workers, 'segments': 2 * workers}
+
+    def time_get_neighbour_info(self, source, size, backend, workers):
+        kd_tree.get_neighbour_info(self.source_def, self.target_def,
+                                   self.radius, neighbours=8, **self.kwargs)
+
+    def peakmem_get_neighbour_info(self, source, size, backend, workers):
+        kd_tree.get_neighbour_info(self.source_def, self.target_def,
+                                   self.radius, neighbours=8, **self.kwargs)
@@ -0,0 +1,37 @@
+"""Benchmarks of the projection of coordinate arrays."""
+
+import numpy as np
+
+from pyresample import _spatial_mp
+
+from .common import GEOSTATIONARY_SHAPES, SIZES, get_geostationary_area
+
+
+class ProjectionSuite(object):
+    """Inverse projection of the pixel coordinates of a geostationary full
+    disk, serial and with the worker pool."""
+
+    params = (SIZES, [1, 2, 4])
+    param_names = ['size', 'nprocs']
+    timeout = 300
+
+    def setup(self, size, nprocs):
+        area_def = get_geostationary_area(GEOSTATIONARY_SHAPES[size])
+        self.x, self.y = area_def.get_proj_coords()
+        if nprocs > 1:
+            self.proj = _spatial_mp.Proj_MP(**area_def.proj_dict)
+            # Start the workers outside of the timing
+            self.proj(self.x[:1], self.y[:1], inverse=True, nprocs=nprocs)
+        else:
+            self.proj = _spatial_mp.Proj(**area_def.proj_dict)
+        self.out = (np.empty(self.x.shape, dtype=np.float32),
+                    np.empty(self.x.shape, dtype=np.float32))
+
+    def time_inverse(self, size, nprocs):
+        self.proj(self.x, self.y, inverse=True, nprocs=nprocs)
+
+    def time_inverse_float32(self, size, nprocs):
+        self.proj(self.x, self.y, inverse=True, nprocs=nprocs, out=self.out)
+
+    def peakmem_inverse(self, size, nprocs):
+        self.proj(self.x, self.y, inverse=True, nprocs=nprocs)
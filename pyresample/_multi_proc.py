@@ -17,61 +17,42 @@
 
 from __future__ import absolute_import
 
+import atexit
 import ctypes
+import itertools
 import multiprocessing as mp
+import os
+import tempfile
+import threading
+import time
+import weakref
+from collections import OrderedDict, namedtuple
+from logging import getLogger
+from multiprocessing.pool import ThreadPool
 
 import numpy as np
 
+from . import instrumentation
 
-class Scheduler(object):
-
-    def __init__(self, ndata, nprocs, chunk=None, schedule='guided'):
-        if not schedule in ['guided', 'dynamic', 'static']:
-            raise ValueError('unknown scheduling strategy')
-        self._ndata = mp.RawValue(ctypes.c_int, ndata)
-        self._start = mp.RawValue(ctypes.c_int, 0)
-        self._lock = mp.Lock()
-        self._schedule = schedule
-        self._nprocs = nprocs
-        if schedule == 'guided' or schedule == 'dynamic':
-            min_chunk = ndata // (10 * nprocs)
-            if chunk:
-                min_chunk = chunk
-            min_chunk = max(min_chunk, 1)
-            self._chunk = min_chunk
-        elif schedule == 'static':
-            min_chunk = ndata // nprocs
-            if chunk:
-                min_chunk = max(chunk, min_chunk)
-            min_chunk = max(min_chunk, 1)
-            self._chunk = min_chunk
-
-    def __iter__(self):
-        while True:
-            self._lock.acquire()
-            ndata = self._ndata.value
-            nprocs = self._nprocs
-            start = self._start.value
-            if self._schedule == 'guided':
-                _chunk = ndata // nprocs
-                chunk = max(self._chunk, _chunk)
-            else:
-                chunk = self._chunk
-            if ndata:
-                if chunk > ndata:
-                    s0 = start
-                    s1 = start + ndata
-                    self._ndata.value = 0
-                else:
-                    s0 = start
-                    s1 = start + chunk
-                    self._ndata.value = ndata - chunk
-                    self._start.value = start + chunk
-                self._lock.release()
-                yield slice(s0, s1)
-            else:
-                self._lock.release()
-                return
+try:
+    import queue
+except ImportError:
+    # python 2
+    import Queue as queue
+
+try:
+    _timer = time.perf_counter
+except AttributeError:
+    # python 2
+    _timer = time.time
+
+try:
+    from multiprocessing import resource_tracker, shared_memory
+except ImportError:
+    # python < 3.8, shared arrays are backed by files
+    resource_tracker = shared_memory = None
+
+logger = getLogger(__name__)
 
 
 def shmem_as_ndarray(raw_array):
@@ -82,10 +63,12 @@ def shmem_as_ndarray(raw_array):
         ctypes.c_ubyte: np.uint8,
         ctypes.c_short: np.int16,
         ctypes.c_ushort: np.uint16,
-        ctypes.c_int: np.int32,
-        ctypes.c_uint: np.int32,
-        ctypes.c_long: np.int32,
-        ctypes.c_ulong: np.int32,
+        ctypes.c_int: np.intc,
+        ctypes.c_uint: np.uintc,
+        ctypes.c_long: np.int_,
+        ctypes.c_ulong: np.uint,
+        ctypes.c_longlong: np.longlong,
+        ctypes.c_ulonglong: np.ulonglong,
         ctypes.c_float: np.float32,
         ctypes.c_double: np.float64
     }
@@ -97,3 +80,522 @@ def shmem_as_ndarray(raw_array):
     # return np.ctypeslib.as_array(raw_array)
 
     return np.frombuffer(raw_array, dtype=dtype)
+
+
+#: Description of an array in shared memory, passed to the worker processes.
+#: `name` is the name of the shared memory segment, or the path of the file
+#: backing it.
+SharedArray = namedtuple('SharedArray', ['name', 'dtype', 'shape'])
+
+# Number of shared arrays and kd-trees every worker keeps attached
+WORKER_CACHE_SIZE = 16
+
+
+_buffer_count = itertools.count()
+# Buffers of the process, released at exit if still open
+_open_buffers = weakref.WeakSet()
+
+
+def _get_shared_dir():
+    """Get the directory to back shared arrays in, memory if possible"""
+    if os.path.isdir('/dev/shm'):
+        return '/dev/shm'
+    return tempfile.gettempdir()
+
+
+def _remove_file(name):
+    """Remove the file backing a shared buffer, logging failures"""
+    try:
+        os.remove(name)
+    except OSError as err:
+        logger.warning('Could not remove shared buffer file %s: %s', name,
+                       err)
+
+
+def _map_segment(name, capacity, create=False):
+    """Map the shared memory segment `name` as a uint8 array.
+
+    The segment is unmapped when the array, and all views of it, are gone.
+    """
+    segment = shared_memory.SharedMemory(name=name, create=create,
+                                         size=capacity)
+    array = np.ndarray((capacity, ), dtype=np.uint8, buffer=segment.buf)
+    weakref.finalize(array, segment.close)
+    return segment, array
+
+
+class SharedBuffer(object):
+    """Memory shared with the worker processes.
+
+    The buffer is a :mod:`multiprocessing.shared_memory` segment, or a
+    file in memory backed /dev/shm with python < 3.8. :meth:`close`
+    releases the segment. Arrays from the buffer stay valid after that,
+    the memory is freed when the last of them is gone. The file is removed
+    then too, once it is no longer mapped, except with python 2 which
+    removes it on :meth:`close`.
+
+    Parameters
+    ----------
+    capacity : int
+        Size of the buffer in bytes
+    """
+
+    def __init__(self, capacity):
+        capacity = max(int(capacity), 1)
+        self.capacity = capacity
+        if shared_memory is not None:
+            self._segment, self._mmap = _map_segment(None, capacity,
+                                                     create=True)
+            self.name = self._segment.name
+        else:
+            # Names are never reused by the process, so workers can key
+            # their mappings by name
+            prefix = 'pyresample-%d-%d-' % (os.getpid(), next(_buffer_count))
+            fd, self.name = tempfile.mkstemp(prefix=prefix,
+                                             dir=_get_shared_dir())
+            os.close(fd)
+            self._segment = None
+            self._mmap = np.memmap(self.name, dtype=np.uint8, mode='w+',
+                                   shape=(capacity, ))
+            # Not all systems can remove a mapped file. The mapping is
+            # closed before the finalizer of the mmap object is called
+            self._remove_on_close = not hasattr(weakref, 'finalize')
+            if not self._remove_on_close:
+                weakref.finalize(self._mmap._mmap, _remove_file, self.name)
+        _open_buffers.add(self)
+
+    def get_array(self, shape, dtype):
+        """Get an array of `shape` and `dtype` at the start of the buffer
+        and its :class:`SharedArray` description."""
+        dtype = np.dtype(dtype)
+        shape = tuple(int(dim) for dim in shape)
+        nbytes = int(np.prod(shape, dtype=np.int64)) * dtype.itemsize
+        if nbytes > self.capacity:
+            raise ValueError('Shared buffer too small')
+        array = self._mmap[:nbytes].view(dtype).reshape(shape)
+        return array, SharedArray(self.name, dtype.str, shape)
+
+    @property
+    def closed(self):
+        """Check if the buffer is released."""
+        return self._mmap is None
+
+    def close(self):
+        """Release the buffer. Arrays from it, also the ones of workers
+        still attached, keep their memory."""
+        if self.closed:
+            return
+        self._mmap = None
+        _open_buffers.discard(self)
+        if self._segment is not None:
+            try:
+                self._segment.unlink()
+            except OSError as err:
+                logger.warning('Could not unlink shared memory segment %s: '
+                               '%s', self.name, err)
+        elif self._remove_on_close:
+            _remove_file(self.name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def __del__(self):
+        if getattr(self, '_mmap', None) is not None:
+            self.close()
+
+
+def create_shared_array(shape, dtype):
+    """Create an array in shared memory.
+
+    Returns
+    -------
+    (array, shared, buffer) : tuple
+        The array, its :class:`SharedArray` description for the workers and
+        the :class:`SharedBuffer` to close when the workers are done with
+        the array
+    """
+    dtype = np.dtype(dtype)
+    buffer = SharedBuffer(int(np.prod(shape, dtype=np.int64)) *
+                          dtype.itemsize)
+    array, shared = buffer.get_array(shape, dtype)
+    return array, shared, buffer
+
+
+def close_shared_buffers():
+    """Release all shared buffers of the process still open."""
+    for buffer in list(_open_buffers):
+        buffer.close()
+
+
+def attach_shared_array(state, shared, cache=True):
+    """Get the array described by `shared` in a worker process.
+
+    With `cache` the mapping is kept in the worker `state`, so repeated jobs
+    on the same buffers do not map them again. Arrays used by a single job,
+    like results handed over to the caller, are not cached so their memory
+    is freed as soon as the caller is done with them.
+    """
+    arrays = state.setdefault('arrays', OrderedDict())
+    array = arrays.pop(shared, None)
+    if array is None:
+        dtype = np.dtype(shared.dtype)
+        nbytes = int(np.prod(shared.shape, dtype=np.int64)) * dtype.itemsize
+        if not nbytes:
+            array = np.empty(shared.shape, dtype=dtype)
+        elif shared_memory is not None:
+            array = _map_segment(shared.name, nbytes)[1]
+            array = array[:nbytes].view(dtype).reshape(shared.shape)
+        else:
+            array = np.memmap(shared.name, dtype=dtype, mode='r+',
+                              shape=shared.shape)
+    if cache:
+        arrays[shared] = array
+        while len(arrays) > WORKER_CACHE_SIZE:
+            arrays.popitem(last=False)
+    return array
+
+
+SCHEDULES = ('guided', 'dynamic', 'static')
+
+#: Work done by a worker for a job: the number of chunks and items it ran,
+#: how often it stole work from the other workers and its busy time in
+#: seconds
+WorkerStats = namedtuple('WorkerStats',
+                         ['worker', 'chunks', 'items', 'steals', 'busy'])
+
+
+def _get_min_chunk(ndata, nprocs, chunk, schedule):
+    """Get the smallest chunk of the schedule."""
+    if schedule not in SCHEDULES:
+        raise ValueError('unknown scheduling strategy')
+    if schedule == 'static':
+        return max(ndata // nprocs, chunk or 0, 1)
+    return max(chunk or ndata // (10 * nprocs), 1)
+
+
+def get_chunks(ndata, nprocs, chunk=None, schedule='guided'):
+    """Split `ndata` items in to (start, stop) chunks for `nprocs` workers.
+
+    'static' makes one chunk per worker, 'dynamic' chunks of `chunk` items,
+    a tenth of the share of a worker by default, and 'guided' chunks
+    getting smaller towards the end, down to `chunk` items.
+    """
+    min_chunk = _get_min_chunk(ndata, nprocs, chunk, schedule)
+    chunks = []
+    start = 0
+    while start < ndata:
+        if schedule == 'guided':
+            size = max(min_chunk, (ndata - start) // nprocs)
+        else:
+            size = min_chunk
+        chunks.append((start, min(start + size, ndata)))
+        start += size
+    return chunks
+
+
+def _claim(worker, ranges, locks, min_chunk, schedule):
+    """Take the next chunk from the front of the range of `worker`.
+
+    Returns
+    -------
+    data_slice : slice or None
+        The chunk, or None if the range is empty
+    """
+    with locks[worker]:
+        start, stop = ranges[2 * worker], ranges[2 * worker + 1]
+        if start >= stop:
+            return None
+        if schedule == 'static':
+            size = stop - start
+        elif schedule == 'guided':
+            size = min(max(min_chunk, (stop - start) // 2), stop - start)
+        else:
+            size = min(min_chunk, stop - start)
+        ranges[2 * worker] = start + size
+    return slice(int(start), int(start + size))
+
+
+def _steal(worker, ranges, locks, min_chunk):
+    """Move the back half of the largest range left to `worker`.
+
+    Only the lock of one worker is held at a time. The remaining ranges are
+    read without locks to choose the victim, and checked again under its
+    lock.
+
+    Returns
+    -------
+    stolen : bool
+        False if there is no work left
+    """
+    remaining = ranges[1::2] - ranges[0::2]
+    for victim in np.argsort(-remaining, kind='mergesort'):
+        if remaining[victim] <= 0:
+            break
+        if victim == worker:
+            continue
+        with locks[victim]:
+            start, stop = ranges[2 * victim], ranges[2 * victim + 1]
+            if start >= stop:
+                continue
+            if stop - start > min_chunk:
+                start += (stop - start) // 2
+            ranges[2 * victim + 1] = start
+        with locks[worker]:
+            ranges[2 * worker] = start
+            ranges[2 * worker + 1] = stop
+        return True
+    return False
+
+
+def _worker_loop(worker, tasks, results, ranges, locks):
+    """Run jobs until the sentinel None arrives.
+
+    A job starts with a contiguous range of the data for every worker. The
+    worker runs chunks from the front of its own range, and when it is done
+    steals the back half of the largest range left, so workers with cheap
+    chunks take over from the others without a central lock.
+
+    `state` lives as long as the worker, jobs keep their resident objects,
+    e.g. kd-trees or pyproj objects, there.
+    """
+    state = {}
+    ranges = shmem_as_ndarray(ranges)
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        job_id, func, args, min_chunk, schedule = task
+        chunks = items = steals = 0
+        busy = 0.0
+        errors = []
+        while True:
+            data_slice = _claim(worker, ranges, locks, min_chunk, schedule)
+            if data_slice is None:
+                if (schedule == 'static' or
+                        not _steal(worker, ranges, locks, min_chunk)):
+                    break
+                steals += 1
+                continue
+            start = _timer()
+            try:
+                func(state, data_slice, *args)
+            except Exception as err:
+                errors.append(str(err))
+            busy += _timer() - start
+            chunks += 1
+            items += data_slice.stop - data_slice.start
+        results.put((job_id, WorkerStats(worker, chunks, items, steals, busy),
+                     errors))
+
+
+class WorkerPool(object):
+    """Long-lived worker processes running parallel jobs in chunks.
+
+    The workers keep state between jobs, so e.g. a kd-tree or pyproj object
+    is only set up once per worker. Arrays are passed as
+    :class:`SharedArray` descriptions, and the pool keeps a named set of
+    shared buffers that are reused by later jobs.
+
+    The work of every job is balanced by stealing, see
+    :func:`_worker_loop`. The :class:`WorkerStats` of the workers are
+    returned by :meth:`run`, and reported to the
+    :mod:`pyresample.instrumentation` callbacks as stages
+    ``multi_proc.worker<n>`` with the busy time as duration.
+
+    Parameters
+    ----------
+    nprocs : int
+        Number of worker processes
+    """
+
+    def __init__(self, nprocs):
+        self.nprocs = nprocs
+        #: Lock to hold while filling the pool buffers and running a job
+        self.lock = threading.RLock()
+        self._tasks = [mp.Queue() for n in range(nprocs)]
+        self._results = mp.Queue()
+        # (start, stop) of the range left to every worker, each guarded by
+        # the lock of the worker
+        self._ranges = mp.RawArray(ctypes.c_longlong, 2 * nprocs)
+        self._locks = [mp.Lock() for n in range(nprocs)]
+        self._buffers = {}
+        self._job_id = 0
+        if resource_tracker is not None:
+            # Share the tracker of the segments with the workers, else each
+            # worker would remove the segments it used when it exits
+            resource_tracker.ensure_running()
+        self._workers = [mp.Process(target=_worker_loop,
+                                    args=(n, self._tasks[n], self._results,
+                                          self._ranges, self._locks))
+                         for n in range(nprocs)]
+        for worker in self._workers:
+            worker.daemon = True
+            worker.start()
+
+    @property
+    def pids(self):
+        """Process ids of the workers."""
+        return [worker.pid for worker in self._workers]
+
+    def is_alive(self):
+        """Check that all workers are running."""
+        return bool(self._workers) and all(worker.is_alive()
+                                           for worker in self._workers)
+
+    def get_array(self, name, shape, dtype):
+        """Get an array in the shared buffer `name`, growing it if needed.
+
+        The array is only valid until the buffer is used again, so hold
+        :attr:`lock` while using it.
+
+        Returns
+        -------
+        (array, shared) : tuple
+            The array and its :class:`SharedArray` description
+        """
+        nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        with self.lock:
+            buffer = self._buffers.get(name)
+            if buffer is None or buffer.capacity < nbytes:
+                if buffer is not None:
+                    buffer.close()
+                # Leave room to grow
+                buffer = SharedBuffer(nbytes + nbytes // 4)
+                self._buffers[name] = buffer
+            return buffer.get_array(shape, dtype)
+
+    def run(self, func, args, ndata, chunk=None, schedule='guided'):
+        """Run ``func(state, data_slice, *args)`` on chunks covering `ndata`
+        items and wait for all of them.
+
+        `func` must be a module level function and `args` picklable. Chunks
+        are at least `chunk` items, and their sizes follow the `schedule`
+        like in :func:`get_chunks`. With the 'static' schedule workers do
+        not steal.
+
+        Returns
+        -------
+        stats : list
+            :class:`WorkerStats` of every worker
+        """
+        min_chunk = _get_min_chunk(ndata, self.nprocs, chunk, schedule)
+        errors = []
+        stats = [WorkerStats(worker, 0, 0, 0, 0.0)
+                 for worker in range(self.nprocs)]
+        with self.lock, instrumentation.Stage('multi_proc.run', items=ndata):
+            if not self.is_alive():
+                raise RuntimeError('Worker pool is shut down')
+            if not ndata:
+                return stats
+            ranges = shmem_as_ndarray(self._ranges)
+            bounds = np.linspace(0, ndata, self.nprocs + 1).astype(np.int64)
+            ranges[0::2] = bounds[:-1]
+            ranges[1::2] = bounds[1:]
+            self._job_id += 1
+            job_id = self._job_id
+            for tasks in self._tasks:
+                tasks.put((job_id, func, args, min_chunk, schedule))
+            remaining = self.nprocs
+            try:
+                while remaining:
+                    try:
+                        result_id, worker_stats, worker_errors = \
+                            self._results.get(timeout=1)
+                    except queue.Empty:
+                        if not self.is_alive():
+                            raise RuntimeError('Worker process died')
+                        continue
+                    if result_id != job_id:
+                        continue
+                    remaining -= 1
+                    stats[worker_stats.worker] = worker_stats
+                    errors.extend(worker_errors)
+            except BaseException:
+                # Workers still running the job would use the ranges of the
+                # next one
+                self.shutdown()
+                raise
+        for worker_stats in stats:
+            instrumentation.report('multi_proc.worker%d' % worker_stats.worker,
+                                   worker_stats.busy,
+                                   chunks=worker_stats.chunks,
+                                   items=worker_stats.items,
+                                   steals=worker_stats.steals)
+        if errors:
+            raise RuntimeError('%d errors in worker processes. Last one '
+                               'reported:\n%s' % (len(errors), errors[-1]))
+        return stats
+
+    def shutdown(self):
+        """Stop the workers and release the shared buffers."""
+        with self.lock:
+            for worker, tasks in zip(self._workers, self._tasks):
+                if worker.is_alive():
+                    tasks.put(None)
+            for worker in self._workers:
+                worker.join(5)
+                if worker.is_alive():
+                    worker.terminate()
+                    worker.join()
+            self._workers = []
+            for buffer in self._buffers.values():
+                buffer.close()
+            self._buffers = {}
+
+
+# Pools of the process, by number of workers
+_pools = {}
+_thread_pools = {}
+_pool_lock = threading.Lock()
+
+
+def get_pool(nprocs):
+    """Get the worker pool of the process with `nprocs` workers.
+
+    The pool is created on first use and kept until :func:`shutdown_pool`,
+    or the exit of the process. Every number of workers gets its own pool,
+    so callers asking for other numbers, e.g. from other threads, never
+    shut down a pool in use.
+    """
+    with _pool_lock:
+        pool = _pools.get(nprocs)
+        if pool is None or not pool.is_alive():
+            if pool is not None:
+                pool.shutdown()
+            pool = _pools[nprocs] = WorkerPool(nprocs)
+        return pool
+
+
+def get_thread_pool(nprocs):
+    """Get the thread pool of the process with `nprocs` threads.
+
+    For jobs releasing the GIL, the threads share the memory of the caller
+    and need no copies. Like :func:`get_pool` there is one pool for every
+    number of threads, kept until :func:`shutdown_pool`.
+    """
+    with _pool_lock:
+        thread_pool = _thread_pools.get(nprocs)
+        if thread_pool is None:
+            thread_pool = _thread_pools[nprocs] = ThreadPool(nprocs)
+            thread_pool.nprocs = nprocs
+        return thread_pool
+
+
+def shutdown_pool():
+    """Stop the worker and thread pools of the process, if any."""
+    with _pool_lock:
+        for pool in _pools.values():
+            pool.shutdown()
+        _pools.clear()
+        for thread_pool in _thread_pools.values():
+            thread_pool.close()
+            thread_pool.join()
+        _thread_pools.clear()
+
+
+atexit.register(close_shared_buffers)
+atexit.register(shutdown_pool)
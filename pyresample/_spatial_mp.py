@@ -17,22 +17,33 @@
 
 from __future__ import absolute_import
 
-import ctypes
+import threading
+from collections import OrderedDict
+from distutils.version import LooseVersion
 
 import numpy as np
 import pyproj
-#import scipy.spatial as sp
-import multiprocessing as mp
 
 try:
     import numexpr as ne
 except ImportError:
     ne = None
 
-from ._multi_proc import shmem_as_ndarray, Scheduler
+from ._multi_proc import (WORKER_CACHE_SIZE, attach_shared_array,
+                          create_shared_array, get_chunks, get_pool,
+                          get_thread_pool)
 
 # Earth radius
 R = 6370997.0
+# Smallest number of points transformed by a thread
+MIN_TRANSFORM_CHUNK = 65536
+# pyproj releases the GIL while projecting arrays from version 2.2 on, so
+# threads can project in parallel
+PROJ_RELEASES_GIL = (LooseVersion(pyproj.__version__) >=
+                     LooseVersion('2.2'))
+
+# Projections of the threads of the thread pool
+_thread_state = threading.local()
 
 
 class cKDTree_MP(object):
@@ -51,18 +62,13 @@ class cKDTree_MP(object):
         '''
 
         self.n, self.m = data.shape
-        # Allocate shared memory for data
-        self.shmem_data = mp.RawArray(ctypes.c_double, self.n * self.m)
-
-        # View shared memory as ndarray, and copy over the data.
-        # The RawArray objects have information about the dtype and
-        # buffer size.
-        _data = shmem_as_ndarray(self.shmem_data).reshape((self.n, self.m))
-        _data[:,:] = data
-
-        # Initialize parent, we must do this last because
-        # cKDTree stores a reference to the data array. We pass in
-        # the copy in shared memory rather than the origial data.
+        # Copy the data to shared memory. The workers of the pool build
+        # their kd-tree from it on the first query and keep it for the
+        # following ones
+        _data, self._shared_data, self._data_buffer = \
+            create_shared_array((self.n, self.m), np.float64)
+        _data[:, :] = data
+
         self.leafsize = leafsize
         self._nprocs = nprocs
         self._chunk = chunk
@@ -71,217 +77,373 @@ class cKDTree_MP(object):
     def query(self, x, k=1, eps=0, p=2, distance_upper_bound=np.inf):
         '''
         Same as cKDTree.query except parallelized with multiple
-        processes and shared memory.        
+        processes and shared memory.
         '''
 
-        # allocate shared memory for x and result
         nx = x.shape[0]
-        shmem_x = mp.RawArray(ctypes.c_double, nx * self.m)
-        shmem_d = mp.RawArray(ctypes.c_double, nx * k)
-        shmem_i = mp.RawArray(ctypes.c_int, nx * k)
-
-        # view shared memory as ndarrays
-        _x = shmem_as_ndarray(shmem_x).reshape((nx, self.m))
-        if k == 1:
-            _d = shmem_as_ndarray(shmem_d)
-            _i = shmem_as_ndarray(shmem_i)
+        shape = (nx, ) if k == 1 else (nx, k)
+        # int32 indices are enough for all but the largest swaths
+        if self.n < np.iinfo(np.intc).max:
+            index_dtype = np.intc
         else:
-            _d = shmem_as_ndarray(shmem_d).reshape((nx, k))
-            _i = shmem_as_ndarray(shmem_i).reshape((nx, k))
-
-        # copy x to shared memory
-        _x[:] = x
-
-        # set up a scheduler to load balance the query
-        scheduler = Scheduler(nx, self._nprocs, chunk=self._chunk,
-                              schedule=self._schedule)
-
-        # query with multiple processes
-        query_args = [scheduler, self.shmem_data, self.n, self.m,
-                      self.leafsize, shmem_x, nx, shmem_d, shmem_i,
-                      k, eps, p, distance_upper_bound]
-
-        _run_jobs(_parallel_query, query_args, self._nprocs)
-        # return results (private memory)
-        return _d.copy(), _i.copy()
+            index_dtype = np.intp
+        pool = get_pool(self._nprocs)
+        with pool.lock:
+            # view the shared memory of the pool as ndarrays
+            _x, shared_x = pool.get_array('query_x', (nx, self.m),
+                                          np.float64)
+
+            # copy x to shared memory
+            _x[:] = x
+
+            # The workers write the results straight to the returned arrays
+            d, shared_d, d_buffer = create_shared_array(shape, np.float64)
+            i, shared_i, i_buffer = create_shared_array(shape, index_dtype)
+
+            # query with the worker processes
+            query_args = (self._shared_data, self.leafsize, shared_x,
+                          shared_d, shared_i, k, eps, p, distance_upper_bound)
+            with d_buffer, i_buffer:
+                pool.run(_parallel_query, query_args, nx, chunk=self._chunk,
+                         schedule=self._schedule)
+        return d, i
+
+
+def _get_proj_out(data1, out, dtype):
+    """Get the result arrays of a projection of `data1` shaped data."""
+    if out is None:
+        if dtype is None:
+            dtype = np.float64
+        return (np.empty(np.shape(data1), dtype=dtype),
+                np.empty(np.shape(data1), dtype=dtype))
+    res1, res2 = out
+    if res1.shape != np.shape(data1) or res2.shape != np.shape(data1):
+        raise ValueError('out must be of shape %s' % (np.shape(data1), ))
+    return res1, res2
 
 
 class Proj(pyproj.Proj):
 
     def __call__(self, data1, data2, inverse=False, radians=False,
-                 errcheck=False, nprocs=1):
+                 errcheck=False, nprocs=1, out=None, dtype=None):
+        if out is None and dtype is None:
+            if self.is_latlong():
+                return data1, data2
+            return super(Proj, self).__call__(data1, data2, inverse=inverse,
+                                              radians=radians,
+                                              errcheck=errcheck)
+
+        res1, res2 = _get_proj_out(data1, out, dtype)
         if self.is_latlong():
-            return data1, data2
-
-        return super(Proj, self).__call__(data1, data2, inverse=inverse,
-                                          radians=radians, errcheck=errcheck)
+            res1[...], res2[...] = data1, data2
+        else:
+            res1[...], res2[...] = super(Proj, self).__call__(
+                data1, data2, inverse=inverse, radians=radians,
+                errcheck=errcheck)
+        return res1, res2
 
 
 class Proj_MP(pyproj.Proj):
 
+    """Projection of coordinate arrays split in chunks over `nprocs` workers.
+
+    With pyproj releasing the GIL the chunks are projected by a pool of
+    threads working directly on the arrays, otherwise by the worker
+    processes of :func:`pyresample._multi_proc.get_pool` on copies in
+    shared memory. Both pools are kept for later calls, and every thread
+    or process sets up the projection only once.
+    """
+
     def __init__(self, *args, **kwargs):
         self._args = args
         self._kwargs = kwargs
 
     def __call__(self, data1, data2, inverse=False, radians=False,
-                 errcheck=False, nprocs=2, chunk=None, schedule='guided'):
+                 errcheck=False, nprocs=2, chunk=None, schedule='guided',
+                 out=None, dtype=None):
+        """Project `data1` and `data2`.
+
+        The results are float64 arrays of the same shape as the input,
+        unless another `dtype` is given, or written to the `out` tuple of
+        arrays.
+        """
         if self.is_latlong():
-            return data1, data2
-
-        grid_shape = data1.shape
-        n = data1.size
-
-        # Create shared memory
-        shmem_data1 = mp.RawArray(ctypes.c_double, n)
-        shmem_data2 = mp.RawArray(ctypes.c_double, n)
-        shmem_res1 = mp.RawArray(ctypes.c_double, n)
-        shmem_res2 = mp.RawArray(ctypes.c_double, n)
-
-        # view shared memory as ndarrays
-        _data1 = shmem_as_ndarray(shmem_data1)
-        _data2 = shmem_as_ndarray(shmem_data2)
-        _res1 = shmem_as_ndarray(shmem_res1)
-        _res2 = shmem_as_ndarray(shmem_res2)
+            if out is None and dtype is None:
+                return data1, data2
+            res1, res2 = _get_proj_out(data1, out, dtype)
+            res1[...], res2[...] = data1, data2
+            return res1, res2
+
+        data1 = np.asarray(data1)
+        data2 = np.asarray(data2)
+        proj_call_args = (self._args, self._kwargs, inverse, radians,
+                          errcheck)
+        if PROJ_RELEASES_GIL:
+            res1, res2 = _get_proj_out(data1, out, dtype)
+            _thread_proj(data1, data2, res1, res2, proj_call_args, nprocs,
+                         chunk, schedule)
+            return res1, res2
+        return _process_proj(data1, data2, out, dtype, proj_call_args,
+                             nprocs, chunk, schedule)
+
+
+def _thread_proj(data1, data2, res1, res2, proj_call_args, nprocs, chunk,
+                 schedule):
+    """Project chunks of the arrays in the thread pool."""
+    flat_data1 = data1.ravel()
+    flat_data2 = data2.ravel()
+    # Results are written straight to contiguous output arrays
+    flat_res1 = res1.ravel()
+    flat_res2 = res2.ravel()
+
+    def project(data_chunk):
+        data_slice = slice(*data_chunk)
+        proj_args, proj_kwargs, inverse, radians, errcheck = proj_call_args
+        projs = getattr(_thread_state, 'projs', None)
+        if projs is None:
+            projs = _thread_state.projs = OrderedDict()
+        proj = _get_resident_proj(projs, proj_args, proj_kwargs)
+        flat_res1[data_slice], flat_res2[data_slice] = proj(
+            flat_data1[data_slice], flat_data2[data_slice], inverse=inverse,
+            radians=radians, errcheck=errcheck)
+
+    chunks = get_chunks(data1.size, nprocs, chunk=chunk, schedule=schedule)
+    get_thread_pool(nprocs).map(project, chunks, chunksize=1)
+    if not np.may_share_memory(flat_res1, res1):
+        res1[...] = flat_res1.reshape(res1.shape)
+    if not np.may_share_memory(flat_res2, res2):
+        res2[...] = flat_res2.reshape(res2.shape)
+
+
+def _process_proj(data1, data2, out, dtype, proj_call_args, nprocs, chunk,
+                  schedule):
+    """Project chunks of the arrays with the worker processes."""
+    n = data1.size
+    in_dtype = np.float32 if data1.dtype == np.float32 else np.float64
+    pool = get_pool(nprocs)
+    with pool.lock:
+        # view the shared memory of the pool as ndarrays
+        (_data1, shared_data1), (_data2, shared_data2) = \
+            [pool.get_array(name, (n, ), in_dtype)
+             for name in ('proj_data1', 'proj_data2')]
 
         # copy input data to shared memory
         _data1[:] = data1.ravel()
         _data2[:] = data2.ravel()
 
-        # set up a scheduler to load balance the query
-        scheduler = Scheduler(n, nprocs, chunk=chunk, schedule=schedule)
-
-        # Projection with multiple processes
-        proj_call_args = [scheduler, shmem_data1, shmem_data2, shmem_res1,
-                          shmem_res2, self._args, self._kwargs, inverse,
-                          radians, errcheck]
-
-        _run_jobs(_parallel_proj, proj_call_args, nprocs)
-        return _res1.copy().reshape(grid_shape), _res2.copy().reshape(grid_shape)
+        if out is None:
+            # The workers write the results straight to the returned arrays
+            res_dtype = np.float64 if dtype is None else dtype
+            _res1, shared_res1, buffer1 = create_shared_array((n, ),
+                                                              res_dtype)
+            _res2, shared_res2, buffer2 = create_shared_array((n, ),
+                                                              res_dtype)
+        else:
+            res1, res2 = _get_proj_out(data1, out, dtype)
+            (_res1, shared_res1), (_res2, shared_res2) = \
+                [pool.get_array(name, (n, ), res.dtype)
+                 for name, res in (('proj_res1', res1), ('proj_res2', res2))]
+            buffer1 = buffer2 = None
+
+        # Projection with the worker processes
+        try:
+            pool.run(_parallel_proj,
+                     (shared_data1, shared_data2, shared_res1, shared_res2) +
+                     proj_call_args, n, chunk=chunk, schedule=schedule)
+        finally:
+            if out is None:
+                buffer1.close()
+                buffer2.close()
+        if out is None:
+            return _res1.reshape(data1.shape), _res2.reshape(data1.shape)
+        res1[...] = _res1.reshape(res1.shape)
+        res2[...] = _res2.reshape(res2.shape)
+        return res1, res2
+
+
+def _get_resident_proj(projs, proj_args, proj_kwargs):
+    """Get the pyproj object from the `projs` cache of a worker, or set it
+    up on the first use of the projection."""
+    key = repr((proj_args, sorted(proj_kwargs.items())))
+    proj = projs.pop(key, None)
+    if proj is None:
+        proj = pyproj.Proj(*proj_args, **proj_kwargs)
+    projs[key] = proj
+    while len(projs) > WORKER_CACHE_SIZE:
+        projs.popitem(last=False)
+    return proj
 
 
 class Cartesian(object):
 
-    def __init__(self, *args, **kwargs):
-        pass
+    """Transform lon/lats to cartesian coordinates on the sphere.
 
-    def transform_lonlats(self, lons, lats):
+    With `nprocs` > 1 the transform is split in to chunks run by threads,
+    numpy releases the GIL in the trigonometric functions. numexpr, when
+    available, evaluates the whole transform with its own threads.
+    """
 
-        coords = np.zeros((lons.size, 3), dtype=lons.dtype)
-        deg2rad = lons.dtype.type(np.pi / 180)
-        if ne:
-            coords[:, 0] = ne.evaluate("R*cos(lats*deg2rad)*cos(lons*deg2rad)")
-            coords[:, 1] = ne.evaluate("R*cos(lats*deg2rad)*sin(lons*deg2rad)")
-            coords[:, 2] = ne.evaluate("R*sin(lats*deg2rad)")
-        else:
-            coords[:, 0] = R * np.cos(lats * deg2rad) * np.cos(lons * deg2rad)
-            coords[:, 1] = R * np.cos(lats * deg2rad) * np.sin(lons * deg2rad)
-            coords[:, 2] = R * np.sin(lats * deg2rad)
+    def __init__(self, nprocs=1):
+        self.nprocs = nprocs
+
+    def transform_lonlats(self, lons, lats, out=None, dtype=None):
+        """Get the (n, 3) cartesian coordinates of flat `lons` and `lats`.
+
+        Parameters
+        ----------
+        lons, lats : numpy array
+            Longitudes and latitudes in degrees
+        out : numpy array, optional
+            (n, 3) array to write the coordinates to
+        dtype : numpy dtype, optional
+            Type of the coordinates, if `out` is not given. Defaults to the
+            type of `lons`, or float64 for integer lon/lats
+
+        Returns
+        -------
+        coords : numpy array
+            `out` if given
+        """
+
+        lons = np.asarray(lons)
+        lats = np.asarray(lats)
+        if out is None:
+            if dtype is None:
+                dtype = lons.dtype
+                if not np.issubdtype(dtype, np.floating):
+                    dtype = np.float64
+            out = np.empty((lons.size, 3), dtype=dtype)
+        elif out.shape != (lons.size, 3):
+            raise ValueError('out must be of shape (%d, 3)' % lons.size)
+        if lats.size != lons.size:
+            raise ValueError('lons and lats must be of the same size')
+
+        lons = lons.ravel()
+        lats = lats.ravel()
+        nchunks = min(self.nprocs, lons.size // MIN_TRANSFORM_CHUNK)
+        if ne is not None or nchunks < 2:
+            _transform_lonlats(lons, lats, out)
+            return out
+
+        bounds = np.linspace(0, lons.size, nchunks + 1).astype(int)
+        threads = [threading.Thread(target=_transform_lonlats,
+                                    args=(lons[start:stop], lats[start:stop],
+                                          out[start:stop]))
+                   for start, stop in zip(bounds[1:-1], bounds[2:])]
+        for thread in threads:
+            thread.start()
+        # The first chunk is done by the calling thread
+        _transform_lonlats(lons[:bounds[1]], lats[:bounds[1]],
+                           out[:bounds[1]])
+        for thread in threads:
+            thread.join()
+        return out
+
+    def transform_lonlat_vectors(self, lons, lats, rows, cols, dtype=None):
+        """Get the (n, 3) cartesian coordinates of the grid points
+        (lons[cols], lats[rows]) of separable lon/lat vectors.
+
+        The trigonometric functions are only evaluated for the vectors.
+        """
+
+        if dtype is None:
+            dtype = np.result_type(lons, lats)
+            if not np.issubdtype(dtype, np.floating):
+                dtype = np.float64
+        dtype = np.dtype(dtype)
+        deg2rad = dtype.type(np.pi / 180)
+        radius = dtype.type(R)
+        lons_rad = np.multiply(lons, deg2rad, dtype=dtype)
+        lats_rad = np.multiply(lats, deg2rad, dtype=dtype)
+
+        coords = np.empty((np.size(rows), 3), dtype=dtype)
+        cos_lats = (radius * np.cos(lats_rad))[rows]
+        np.multiply(np.cos(lons_rad)[cols], cos_lats, out=coords[:, 0])
+        np.multiply(np.sin(lons_rad)[cols], cos_lats, out=coords[:, 1])
+        coords[:, 2] = (radius * np.sin(lats_rad))[rows]
         return coords
 
-Cartesian_MP = Cartesian
 
+def _transform_lonlats(lons, lats, out):
+    """Write the cartesian coordinates of `lons` and `lats` to `out`.
 
-def _run_jobs(target, args, nprocs):
-    """Run process pool
+    The trigonometric functions are only evaluated once per point.
     """
 
-    # return status in shared memory
-    # access to these values are serialized automatically
-    ierr = mp.Value(ctypes.c_int, 0)
-    err_msg = mp.Array(ctypes.c_char, 1024)
-
-    args.extend((ierr, err_msg))
-
-    pool = [mp.Process(target=target, args=args) for n in range(nprocs)]
-    for p in pool:
-        p.start()
-    for p in pool:
-        p.join()
-    if ierr.value != 0:
-        raise RuntimeError('%d errors in worker processes. Last one reported:\n%s' %
-                           (ierr.value, err_msg.value.decode()))
-
-# This is executed in an external process:
-
-
-def _parallel_query(scheduler,  # scheduler for load balancing
-                    # data needed to reconstruct the kd-tree
-                    data, ndata, ndim, leafsize,
-                    x, nx, d, i,  # query data and results
-                    k, eps, p, dub,  # auxillary query parameters
-                    ierr, err_msg):  # return values (0 on success)
-
-    try:
-        # View shared memory as ndarrays.
-        _data = shmem_as_ndarray(data).reshape((ndata, ndim))
-        _x = shmem_as_ndarray(x).reshape((nx, ndim))
-        if k == 1:
-            _d = shmem_as_ndarray(d)
-            _i = shmem_as_ndarray(i)
-        else:
-            _d = shmem_as_ndarray(d).reshape((nx, k))
-            _i = shmem_as_ndarray(i).reshape((nx, k))
+    dtype = out.dtype.type
+    deg2rad = dtype(np.pi / 180)
+    radius = dtype(R)
+    if ne is not None:
+        lons = lons.astype(out.dtype, copy=False)
+        lats = lats.astype(out.dtype, copy=False)
+        cos_lats = ne.evaluate('radius * cos(lats * deg2rad)')
+        ne.evaluate('cos_lats * cos(lons * deg2rad)', out=out[:, 0])
+        ne.evaluate('cos_lats * sin(lons * deg2rad)', out=out[:, 1])
+        ne.evaluate('radius * sin(lats * deg2rad)', out=out[:, 2])
+        return
+
+    lats_rad = np.multiply(lats, deg2rad, dtype=out.dtype)
+    np.sin(lats_rad, out=out[:, 2])
+    out[:, 2] *= radius
+    # Reuse the radian latitudes for radius * cos(lat)
+    cos_lats = np.cos(lats_rad, out=lats_rad)
+    cos_lats *= radius
+    lons_rad = np.multiply(lons, deg2rad, dtype=out.dtype)
+    np.cos(lons_rad, out=out[:, 0])
+    out[:, 0] *= cos_lats
+    np.sin(lons_rad, out=out[:, 1])
+    out[:, 1] *= cos_lats
+
+
+Cartesian_MP = Cartesian
 
-        # Reconstruct the kd-tree from the data.
-        import scipy.spatial as sp
-        kdtree = sp.cKDTree(_data, leafsize=leafsize)
-
-        # Query for nearest neighbours, using slice ranges,
-        # from the load balancer.
-        for s in scheduler:
-            if k == 1:
-                _d[s], _i[s] = kdtree.query(_x[s,:], k=1, eps=eps, p=p,\
-                                            distance_upper_bound=dub)
-            else:
-                _d[s,:], _i[s,:] = kdtree.query(_x[s,:], k=k, eps=eps, p=p,\
-                                                distance_upper_bound=dub)
-    # An error occured, increment the return value ierr.
-    # Access to ierr is serialized by multiprocessing.
-    except Exception as e:
-        ierr.value += 1
-        err_msg.value = str(e).encode()
-
-
-def _parallel_proj(scheduler, data1, data2, res1, res2, proj_args, proj_kwargs,
-                   inverse, radians, errcheck, ierr, err_msg):
-    try:
-        # View shared memory as ndarrays.
-        _data1 = shmem_as_ndarray(data1)
-        _data2 = shmem_as_ndarray(data2)
-        _res1 = shmem_as_ndarray(res1)
-        _res2 = shmem_as_ndarray(res2)
-
-        # Initialise pyproj
-        proj = pyproj.Proj(*proj_args, **proj_kwargs)
 
-        # Reproject data segment
-        for s in scheduler:
-            _res1[s], _res2[s] = proj(_data1[s], _data2[s], inverse=inverse,
-                                      radians=radians, errcheck=errcheck)
-
-    # An error occured, increment the return value ierr.
-    # Access to ierr is serialized by multiprocessing.
-    except Exception as e:
-        ierr.value += 1
-        err_msg.value = str(e).encode()
-
-
-def _parallel_transform(scheduler, lons, lats, n, coords, ierr, err_msg):
-    try:
-        # View shared memory as ndarrays.
-        _lons = shmem_as_ndarray(lons)
-        _lats = shmem_as_ndarray(lats)
-        _coords = shmem_as_ndarray(coords).reshape((n, 3))
-
-        # Transform to cartesian coordinates
-        for s in scheduler:
-            _coords[s, 0] = R * \
-                np.cos(np.radians(_lats[s])) * np.cos(np.radians(_lons[s]))
-            _coords[s, 1] = R * \
-                np.cos(np.radians(_lats[s])) * np.sin(np.radians(_lons[s]))
-            _coords[s, 2] = R * np.sin(np.radians(_lats[s]))
-    # An error occured, increment the return value ierr.
-    # Access to ierr is serialized by multiprocessing.
-    except Exception as e:
-        ierr.value += 1
-        err_msg.value = str(e).encode()
+# These are executed in the worker processes of the pool, with the state
+# kept by the worker between jobs:
+
+
+def _parallel_query(state, data_slice,
+                    data, leafsize,  # data needed to build the kd-tree
+                    x, d, i,  # query data and results
+                    k, eps, p, dub):  # auxillary query parameters
+
+    # Build the kd-tree only on the first query of the data
+    trees = state.setdefault('trees', OrderedDict())
+    key = (data, leafsize)
+    kdtree = trees.pop(key, None)
+    if kdtree is None:
+        import scipy.spatial as sp
+        # Only the tree keeps the data mapped
+        kdtree = sp.cKDTree(attach_shared_array(state, data, cache=False),
+                            leafsize=leafsize)
+    trees[key] = kdtree
+    while len(trees) > 2:
+        trees.popitem(last=False)
+
+    # View shared memory as ndarrays.
+    _x = attach_shared_array(state, x)
+    _d = attach_shared_array(state, d, cache=False)
+    _i = attach_shared_array(state, i, cache=False)
+
+    # Query for nearest neighbours in the slice range from the pool
+    _d[data_slice], _i[data_slice] = kdtree.query(_x[data_slice], k=k,
+                                                  eps=eps, p=p,
+                                                  distance_upper_bound=dub)
+
+
+def _parallel_proj(state, data_slice, data1, data2, res1, res2, proj_args,
+                   proj_kwargs, inverse, radians, errcheck):
+    # View shared memory as ndarrays.
+    _data1 = attach_shared_array(state, data1)
+    _data2 = attach_shared_array(state, data2)
+    _res1 = attach_shared_array(state, res1, cache=False)
+    _res2 = attach_shared_array(state, res2, cache=False)
+
+    # Initialise pyproj only on the first use of the projection
+    proj = _get_resident_proj(state.setdefault('projs', OrderedDict()),
+                              proj_args, proj_kwargs)
+
+    # Reproject data segment
+    _res1[data_slice], _res2[data_slice] = proj(
+        _data1[data_slice], _data2[data_slice], inverse=inverse,
+        radians=radians, errcheck=errcheck)
@@ -32,7 +32,7 @@ import numpy as np
 from pyproj import Proj
 import warnings
 
-from pyresample import kd_tree
+from pyresample import instrumentation, kd_tree
 
 
 def resample_bilinear(data, source_geo_def, target_area_def, radius=50e3,
@@ -107,6 +107,13 @@ def resample_bilinear(data, source_geo_def, target_area_def, radius=50e3,
     return result
 
 
+def _count_output(result):
+    """Get the counts of a stage returning the output first"""
+    return {'output': np.size(result[0] if isinstance(result, tuple)
+                              else result)}
+
+
+@instrumentation.timed('bilinear.get_sample', counts=_count_output)
 def get_sample_from_bil_info(data, t__, s__, input_idxs, idx_arr,
                              output_shape=None):
     """Resample data using bilinear interpolation.
@@ -171,6 +178,7 @@ def get_sample_from_bil_info(data, t__, s__, input_idxs, idx_arr,
     return result
 
 
+@instrumentation.timed('bilinear.get_bil_info', counts=_count_output)
 def get_bil_info(source_geo_def, target_area_def, radius=50e3, neighbours=32,
                  nprocs=1, masked=False, reduce_data=True, segments=None,
                  epsilon=0):
@@ -227,10 +235,14 @@ def get_bil_info(source_geo_def, target_area_def, radius=50e3, neighbours=32,
                                        nprocs=nprocs, reduce_data=reduce_data,
                                        segments=segments, epsilon=epsilon)
 
-    del output_idxs, dists
+    del dists
 
     # Reduce index reference
     input_size = input_idxs.sum()
+    if not output_idxs.all():
+        # Output locations outside the source footprint have no neighbours
+        idx_ref = _expand_output_index(output_idxs, idx_ref, input_size)
+    del output_idxs
     index_mask = (idx_ref == input_size)
     idx_ref = np.where(index_mask, 0, idx_ref)
 
@@ -243,12 +255,14 @@ def get_bil_info(source_geo_def, target_area_def, radius=50e3, neighbours=32,
     # Get input x/y coordinates
     in_x, in_y = _get_input_xy(source_geo_def, proj, input_idxs, idx_ref)
 
-    # Get the four closest corner points around each output location
-    pt_1, pt_2, pt_3, pt_4, idx_ref = \
-        _get_bounding_corners(in_x, in_y, out_x, out_y, neighbours, idx_ref)
+    with instrumentation.Stage('bilinear.solve', output=out_x.size):
+        # Get the four closest corner points around each output location
+        pt_1, pt_2, pt_3, pt_4, idx_ref = \
+            _get_bounding_corners(in_x, in_y, out_x, out_y, neighbours,
+                                  idx_ref)
 
-    # Calculate vertical and horizontal fractional distances t and s
-    t__, s__ = _get_ts(pt_1, pt_2, pt_3, pt_4, out_x, out_y)
+        # Calculate vertical and horizontal fractional distances t and s
+        t__, s__ = _get_ts(pt_1, pt_2, pt_3, pt_4, out_x, out_y)
 
     # Mask NaN values
     if masked:
@@ -429,6 +443,17 @@ def _get_corner(stride, valid, in_x, in_y, idx_ref):
     return x__, y__, idx
 
 
+def _expand_output_index(output_idxs, idx_ref, input_size):
+    """Expand neighbour index reference of the valid output locations to
+    all output locations, marking the rest with *input_size*"""
+
+    full_idx_ref = np.full((output_idxs.size, ) + idx_ref.shape[1:],
+                           input_size, dtype=idx_ref.dtype)
+    full_idx_ref[output_idxs] = idx_ref
+
+    return full_idx_ref
+
+
 def _get_bounding_corners(in_x, in_y, out_x, out_y, neighbours, idx_ref):
     """Get four closest locations from (in_x, in_y) so that they form a
     bounding rectangle around the requested location given by (out_x,
@@ -509,6 +534,9 @@ def _solve_quadratic(a__, b__, c__, min_val=0.0, max_val=1.0):
 
 def _get_output_xy(target_area_def, proj):
     """Get x/y coordinates of the target grid."""
+    if getattr(target_area_def, 'is_rectilinear', False):
+        return _get_output_xy_vectors(target_area_def, proj)
+
     # Read output coordinates
     out_lons, out_lats = target_area_def.get_lonlats()
 
@@ -525,6 +553,26 @@ def _get_output_xy(target_area_def, proj):
     return out_x, out_y
 
 
+def _get_output_xy_vectors(target_area_def, proj):
+    """Get x/y coordinates of a rectilinear target grid by projecting only
+    the longitudes of the columns and the latitudes of the rows."""
+    out_lons, out_lats = target_area_def.get_lonlat_vectors()
+    lons_invalid = (out_lons < -180.) | (out_lons > 180.)
+    lats_invalid = (out_lats < -90.) | (out_lats > 90.)
+
+    # x only depends on the longitude and y on the latitude
+    x_vector = proj(out_lons, np.zeros_like(out_lons))[0]
+    y_vector = proj(np.zeros_like(out_lats), out_lats)[1]
+    # Invalid coordinates project like the NaNs of _mask_coordinates()
+    invalid_x, invalid_y = proj(np.array([np.nan]), np.array([np.nan]))
+
+    invalid = lats_invalid[:, np.newaxis] | lons_invalid[np.newaxis, :]
+    out_x = np.where(invalid, invalid_x[0], x_vector[np.newaxis, :])
+    out_y = np.where(invalid, invalid_y[0], y_vector[:, np.newaxis])
+
+    return out_x.ravel(), out_y.ravel()
+
+
 def _get_input_xy(source_geo_def, proj, input_idxs, idx_ref):
     """Get x/y coordinates for the input area and reduce the data."""
     in_lons, in_lats = source_geo_def.get_lonlats()
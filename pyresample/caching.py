@@ -0,0 +1,336 @@
+# pyresample, Resampling of remote sensing image data in python
+#
+# Copyright (C) 2018  Pytroll developers
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Caching of resampling information between calls and processes."""
+
+from __future__ import absolute_import
+
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict, namedtuple
+from logging import getLogger
+
+import numpy as np
+
+from pyresample.utils import PackedMask
+
+logger = getLogger(__name__)
+
+#: Default size in bytes of the coordinate cache, off unless configured
+COORDINATE_CACHE_SIZE = int(os.getenv('PYRESAMPLE_COORDINATE_CACHE_SIZE', 0))
+
+CacheStats = namedtuple('CacheStats', ['hits', 'misses', 'evictions',
+                                       'entries', 'size', 'max_size'])
+
+
+class NeighbourInfoCache(object):
+    """Directory based cache of kd-tree neighbour info.
+
+    Every cache entry is a sub-directory of `cache_dir` holding the
+    `valid_input_index`, `valid_output_index`, `index_array` and
+    `distance_array` arrays as ``.npy`` files, and the unpacked size of
+    bit-packed masks. Entries are loaded memory mapped, so a cache hit only
+    costs the time needed to open the files.
+
+    Parameters
+    ----------
+    cache_dir : str
+        Directory to store the cached neighbour info in. Created if it does
+        not exist.
+    max_size : int or None, optional
+        Maximum total size of the cache in bytes. When exceeded, the least
+        recently used entries are removed. If None the cache is unbounded.
+    mmap_mode : {None, 'r', 'r+', 'c'}, optional
+        Memory mapping mode used when loading cached arrays. If None the
+        arrays are read in to memory.
+    """
+
+    names = ('valid_input_index', 'valid_output_index',
+             'index_array', 'distance_array')
+
+    def __init__(self, cache_dir, max_size=None, mmap_mode='r'):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.mmap_mode = mmap_mode
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+
+    @staticmethod
+    def get_key(source_geo_def, target_geo_def, radius_of_influence,
+                neighbours, epsilon, reduce_data, precision=None,
+                compact=False, distance_precision=None,
+                reduce_footprint=False, projection_search=False):
+        """Get the cache key for a neighbour info query.
+
+        Returns None if one of the geometry definitions can not be hashed,
+        in which case the query can not be cached.
+        """
+        the_hash = hashlib.sha1()
+        try:
+            the_hash = source_geo_def.update_hash(the_hash)
+            the_hash.update(b'|')
+            the_hash = target_geo_def.update_hash(the_hash)
+        except AttributeError:
+            return None
+        params = (float(radius_of_influence), int(neighbours), float(epsilon),
+                  bool(reduce_data))
+        if precision is not None:
+            params += (np.dtype(precision).name, )
+        if compact or distance_precision is not None:
+            params += (bool(compact), str(distance_precision))
+        if reduce_footprint:
+            params += ('reduce_footprint', )
+        if projection_search:
+            params += ('projection_search', )
+        the_hash.update(repr(params).encode('utf-8'))
+        return the_hash.hexdigest()
+
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def load(self, key):
+        """Load the neighbour info stored under `key`.
+
+        Returns None if there is no such entry.
+        """
+        entry_dir = self._entry_dir(key)
+        try:
+            neighbour_info = tuple(self._load_array(entry_dir, name)
+                                   for name in self.names)
+        except (IOError, OSError, ValueError):
+            return None
+        # Mark the entry as recently used
+        try:
+            os.utime(entry_dir, None)
+        except OSError:
+            pass
+        logger.debug("Loaded neighbour info from cache: %s", entry_dir)
+        return neighbour_info
+
+    def _load_array(self, entry_dir, name):
+        """Load an array of an entry, masks stored bit-packed as
+        :class:`~pyresample.utils.PackedMask`."""
+        arr = np.load(os.path.join(entry_dir, name + '.npy'),
+                      mmap_mode=self.mmap_mode)
+        size_file = os.path.join(entry_dir, name + '.mask_size.npy')
+        if os.path.exists(size_file):
+            return PackedMask(arr, np.load(size_file))
+        if name in self.names[:2] and arr.dtype == np.uint8:
+            # Bit-packed by an older version, without the size
+            raise ValueError('Packed mask without size: %s' % name)
+        return arr
+
+    def store(self, key, neighbour_info):
+        """Store `neighbour_info` under `key`.
+
+        The entry is written to a temporary directory first and moved in
+        place afterwards, so concurrent readers never see partial entries.
+        """
+        tmp_dir = tempfile.mkdtemp(prefix='.' + key, dir=self.cache_dir)
+        try:
+            for name, arr in zip(self.names, neighbour_info):
+                np.save(os.path.join(tmp_dir, name + '.npy'), np.asarray(arr))
+                if isinstance(arr, PackedMask):
+                    np.save(os.path.join(tmp_dir, name + '.mask_size.npy'),
+                            np.array(arr.mask_size))
+            os.rename(tmp_dir, self._entry_dir(key))
+        except OSError:
+            # Entry created by someone else in the meantime
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        else:
+            logger.debug("Stored neighbour info in cache: %s",
+                         self._entry_dir(key))
+        if self.max_size is not None:
+            self.evict(self.max_size, keep=key)
+
+    def _entries(self):
+        """Get (mtime, size, key) of all entries, oldest first."""
+        entries = []
+        for key in os.listdir(self.cache_dir):
+            entry_dir = self._entry_dir(key)
+            if key.startswith('.') or not os.path.isdir(entry_dir):
+                continue
+            try:
+                size = sum(os.path.getsize(os.path.join(entry_dir, fname))
+                           for fname in os.listdir(entry_dir))
+                mtime = os.path.getmtime(entry_dir)
+            except OSError:
+                continue
+            entries.append((mtime, size, key))
+        return sorted(entries)
+
+    @property
+    def size(self):
+        """Total size of the cache entries in bytes."""
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self, max_size, keep=None):
+        """Remove least recently used entries until the cache fits `max_size`.
+
+        The entry named `keep` is never removed.
+        """
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, key in entries:
+            if total <= max_size:
+                break
+            if key == keep:
+                continue
+            shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+            logger.debug("Evicted neighbour info from cache: %s", key)
+            total -= size
+
+    def clear(self):
+        """Remove all entries from the cache."""
+        self.evict(0)
+
+
+class CoordinateCache(object):
+    """In-memory least recently used cache of geometry coordinates.
+
+    Entries are tuples of arrays, e.g. lons and lats, stored under a key
+    starting with the hash of the geometry they belong to. The cache is
+    shared by all geometries with the same hash, so a freshly loaded area
+    finds the coordinates computed for an equal one. Callers get copies of
+    the cached arrays, so modifying them does not affect the cache. All
+    methods are thread safe.
+
+    Parameters
+    ----------
+    max_size : int, optional
+        Maximum total size of the cached arrays in bytes. Entries larger
+        than this are not cached. Zero disables the cache. Defaults to the
+        PYRESAMPLE_COORDINATE_CACHE_SIZE environment variable, or zero.
+    """
+
+    def __init__(self, max_size=COORDINATE_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._pinned = set()
+        self._size = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, data_slice=None):
+        """Get copies of the arrays cached under `key`.
+
+        If `key` is not cached but `data_slice` is given, the entry of the
+        full geometry is sliced instead, i.e. the one whose key has None as
+        last element. Returns None if neither is cached.
+        """
+        with self._lock:
+            if key in self._entries:
+                data_slice = None
+            elif data_slice is not None:
+                key = key[:-1] + (None, )
+            arrays = self._entries.pop(key, None)
+            if arrays is None:
+                self._misses += 1
+                return None
+            # Mark the entry as recently used
+            self._entries[key] = arrays
+            self._hits += 1
+        if data_slice is not None:
+            arrays = tuple(arr[data_slice] for arr in arrays)
+        return tuple(np.array(arr) for arr in arrays)
+
+    def put(self, key, arrays):
+        """Cache `arrays` under `key`, evicting least recently used entries
+        that are not pinned."""
+        size = sum(arr.nbytes for arr in arrays)
+        if size > self.max_size:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._size -= sum(arr.nbytes for arr in
+                                  self._entries.pop(key))
+            self._entries[key] = tuple(arrays)
+            self._size += size
+            self._evict(self.max_size)
+
+    def _evict(self, max_size):
+        for key in list(self._entries):
+            if self._size <= max_size:
+                break
+            if key[0] in self._pinned:
+                continue
+            self._size -= sum(arr.nbytes for arr in self._entries.pop(key))
+            self._evictions += 1
+            logger.debug("Evicted coordinates from cache: %s", key)
+
+    def pin(self, geo_def):
+        """Never evict the coordinates of `geo_def`.
+
+        Pinned coordinates still count towards `max_size`, and entries that
+        do not fit are not cached.
+        """
+        with self._lock:
+            self._pinned.add(geo_def.update_hash().hexdigest())
+
+    def unpin(self, geo_def):
+        """Allow the coordinates of `geo_def` to be evicted again."""
+        with self._lock:
+            self._pinned.discard(geo_def.update_hash().hexdigest())
+            self._evict(self.max_size)
+
+    def stats(self):
+        """Get the hits, misses and evictions so far, and the number of
+        entries and size of the cache."""
+        with self._lock:
+            return CacheStats(self._hits, self._misses, self._evictions,
+                              len(self._entries), self._size, self.max_size)
+
+    def clear(self):
+        """Remove all entries, including the pinned ones, and reset the
+        statistics."""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+            self._hits = 0
+            self._misses = 0
+            self._evictions = 0
+
+
+def get_slice_key(data_slice):
+    """Get a hashable key for `data_slice`.
+
+    Returns None for the full slice and False if the slice can not be used
+    as key, e.g. index arrays.
+    """
+    if data_slice is None:
+        return None
+    if isinstance(data_slice, slice):
+        if data_slice == slice(None):
+            return None
+        return (data_slice.start, data_slice.stop, data_slice.step)
+    if isinstance(data_slice, (int, np.integer)):
+        return int(data_slice)
+    if isinstance(data_slice, tuple):
+        key = tuple((None, None, None) if get_slice_key(item) is None
+                    else get_slice_key(item) for item in data_slice)
+        if any(item is False for item in key):
+            return False
+        return key
+    return False
+
+
+#: Coordinate cache shared by all geometry definitions in the process
+coordinate_cache = CoordinateCache()
@@ -233,6 +233,109 @@ def get_valid_index_from_lonlat_boundaries(boundary_lons, boundary_lats, lons, l
     return valid_index
 
 
+def get_valid_index_from_lonlat_edges(edge_lons, edge_lats, lons, lats,
+                                      radius_of_influence):
+    """Calculates relevant data indices using coarse data reduction by
+    comparison with the edges of a swath footprint
+
+    The footprint is bounded by the latitude range and the shortest
+    longitude arc of its edges, buffered by the radius of influence and the
+    spacing of the edge points. A footprint around a pole is bounded by
+    latitude only. Unlike the grid boundary reductions the orientation of
+    the edges does not matter
+
+    Parameters
+    ----------
+    edge_lons : numpy array or list of numpy arrays
+        Lons of the footprint edges, in order along the boundary
+    edge_lats : numpy array or list of numpy arrays
+        Lats of the footprint edges, in order along the boundary
+    lons : numpy array
+        Lons to reduce
+    lats : numpy array
+        Lats to reduce
+    radius_of_influence : float
+        Cut off distance in meters
+
+    Returns
+    -------
+    valid_index : numpy array
+        Boolean array of same shape as lons and lats indicating relevant
+        indices
+    """
+
+    if isinstance(edge_lons, (list, tuple)):
+        edge_lons = np.ma.concatenate(edge_lons)
+        edge_lats = np.ma.concatenate(edge_lats)
+    edge_lons = np.ma.filled(np.ma.asarray(edge_lons, dtype=np.float64),
+                             np.nan).ravel()
+    edge_lats = np.ma.filled(np.ma.asarray(edge_lats, dtype=np.float64),
+                             np.nan).ravel()
+    lons = np.asanyarray(lons)
+    lats = np.asanyarray(lats)
+
+    with np.errstate(invalid='ignore'):
+        legal_edges = ((edge_lons >= -180) & (edge_lons <= 180) &
+                       (edge_lats >= -90) & (edge_lats <= 90)).all()
+    if edge_lons.size < 2 or not legal_edges:
+        # Interior points may lie beyond the valid edge points
+        return np.ones(lons.shape, dtype=np.bool)
+
+    # The true edge lies between the edge points, widen the buffer by the
+    # largest step along the edge
+    edge_lons_rad = np.radians(edge_lons)
+    edge_lats_rad = np.radians(edge_lats)
+    edge_coords = np.column_stack((np.cos(edge_lats_rad) *
+                                   np.cos(edge_lons_rad),
+                                   np.cos(edge_lats_rad) *
+                                   np.sin(edge_lons_rad),
+                                   np.sin(edge_lats_rad)))
+    steps = np.diff(np.vstack((edge_coords, edge_coords[:1])), axis=0)
+    max_step = np.sqrt((steps ** 2).sum(axis=1)).max() * R
+    buffer_deg = np.degrees((float(radius_of_influence) + max_step) / R)
+
+    lat_min_buffered = edge_lats.min() - buffer_deg
+    lat_max_buffered = edge_lats.max() + buffer_deg
+
+    # Winding number of the closed edge around the poles
+    deltas = np.diff(np.append(edge_lons, edge_lons[0]))
+    angle_sum = ((deltas + 180) % 360 - 180).sum()
+    windings = int(round(angle_sum / 360.0))
+
+    with np.errstate(invalid='ignore'):
+        if windings == 0:
+            valid_index = (lats >= lat_min_buffered) & \
+                (lats <= lat_max_buffered)
+        elif abs(windings) == 1:
+            # Covers a pole
+            if edge_lats.mean() > 0:
+                valid_index = (lats >= lat_min_buffered)
+            else:
+                valid_index = (lats <= lat_max_buffered)
+            return valid_index
+        else:
+            # Covers both poles don't reduce
+            return np.ones(lons.shape, dtype=np.bool)
+
+        # A footprint not covering a pole only reaches the longitudes of its
+        # edge, the shortest arc holding them is outside the largest gap
+        max_lat = max(abs(lat_min_buffered), abs(lat_max_buffered))
+        if max_lat >= 90:
+            return valid_index
+        lon_buffer = buffer_deg / np.cos(np.radians(max_lat))
+        sorted_lons = np.sort(edge_lons)
+        gaps = np.diff(np.append(sorted_lons, sorted_lons[0] + 360))
+        gap_index = gaps.argmax()
+        arc_length = 360 - gaps[gap_index] + 2 * lon_buffer
+        if arc_length >= 360:
+            return valid_index
+        arc_start = sorted_lons[(gap_index + 1) % sorted_lons.size] - \
+            lon_buffer
+        valid_index &= ((lons - arc_start) % 360 <= arc_length)
+
+    return valid_index
+
+
 def _get_valid_index(lons_side1, lons_side2, lons_side3, lons_side4,
                      lats_side1, lats_side2, lats_side3, lats_side4,
                      lons, lats, radius_of_influence):
@@ -69,6 +69,7 @@ corresponding modules.
 
 import logging
 import numpy as np
+from pyresample import instrumentation
 from pyresample.ewa import _ll2cr, _fornav
 
 LOG = logging.getLogger(__name__)
@@ -123,8 +124,10 @@ def ll2cr(swath_def, area_def, fill=np.nan, copy=True):
     h = area_def.y_size
     ox = area_def.area_extent[0] + cw / 2.
     oy = area_def.area_extent[3] + ch / 2.
-    swath_points_in_grid = _ll2cr.ll2cr_static(lons, lats, fill,
-                                               p, cw, ch, w, h, ox, oy)
+    with instrumentation.Stage('ewa.ll2cr', input=lons.size) as stage:
+        swath_points_in_grid = _ll2cr.ll2cr_static(lons, lats, fill,
+                                                   p, cw, ch, w, h, ox, oy)
+        stage.count(valid_input=swath_points_in_grid)
     return swath_points_in_grid, lons, lats
 
 
@@ -244,14 +247,17 @@ def fornav(cols, rows, area_def, data_in,
     # otherwise, use the entire swath as one "scanline"
     rows_per_scan = rows_per_scan or data_in[0].shape[0]
 
-    results = _fornav.fornav_wrapper(cols, rows, data_in, out,
-                                     np.nan, np.nan, rows_per_scan,
-                                     weight_count=weight_count,
-                                     weight_min=weight_min,
-                                     weight_distance_max=weight_distance_max,
-                                     weight_delta_max=weight_delta_max,
-                                     weight_sum_min=weight_sum_min,
-                                     maximum_weight_mode=maximum_weight_mode)
+    with instrumentation.Stage('ewa.fornav', input=cols.size,
+                               output=sum(out_arr.size for out_arr in out)) \
+            as stage:
+        results = _fornav.fornav_wrapper(
+            cols, rows, data_in, out, np.nan, np.nan, rows_per_scan,
+            weight_count=weight_count, weight_min=weight_min,
+            weight_distance_max=weight_distance_max,
+            weight_delta_max=weight_delta_max,
+            weight_sum_min=weight_sum_min,
+            maximum_weight_mode=maximum_weight_mode)
+        stage.count(valid_output=int(sum(results)))
 
     def _mask_helper(data, fill):
         if np.isnan(fill):
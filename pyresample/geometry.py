@@ -31,7 +31,7 @@ import numpy as np
 import yaml
 from pyproj import Geod
 
-from pyresample import CHUNK_SIZE, utils
+from pyresample import CHUNK_SIZE, caching, utils
 from pyresample._spatial_mp import Cartesian, Cartesian_MP, Proj, Proj_MP
 from pyresample.boundary import AreaDefBoundary, Boundary, SimpleBoundary
 
@@ -42,6 +42,10 @@ except ImportError:
 
 logger = getLogger(__name__)
 
+#: Cylindrical projections, where longitudes only depend on x and latitudes
+#: only on y
+RECTILINEAR_PROJECTIONS = ('latlong', 'longlat', 'latlon', 'lonlat', 'eqc')
+
 
 class DimensionError(ValueError):
     pass
@@ -185,6 +189,11 @@ class BaseDefinition(object):
             raise ValueError('lon/lat values are not defined')
         return self.lons[row, col], self.lats[row, col]
 
+    def _get_coordinate_cache_key(self, kind, data_slice=None, dtype=None):
+        """Get the key of the coordinates in the shared coordinate cache, or
+        None if they are not cached"""
+        return None
+
     def get_lonlats(self, data_slice=None, **kwargs):
         """Base method for lon lat retrieval with slicing"""
 
@@ -257,6 +266,13 @@ class BaseDefinition(object):
                 # Use full slice
                 data_slice = slice(None)
 
+            cache_key = self._get_coordinate_cache_key('cartesian',
+                                                       data_slice)
+            if cache_key is not None:
+                cached = caching.coordinate_cache.get(cache_key, data_slice)
+                if cached is not None:
+                    return cached[0]
+
             lons, lats = self.get_lonlats(nprocs=nprocs, data_slice=data_slice)
 
             if nprocs > 1:
@@ -264,16 +280,21 @@ class BaseDefinition(object):
             else:
                 cartesian = Cartesian()
 
-            cartesian_coords = cartesian.transform_lonlats(np.ravel(lons),
-                                                           np.ravel(lats))
-
-            if isinstance(lons, np.ndarray) and lons.ndim > 1:
-                # Reshape to correct shape
-                cartesian_coords = cartesian_coords.reshape(lons.shape[0],
-                                                            lons.shape[1], 3)
+            lons = np.asanyarray(lons)
+            lats = np.asanyarray(lats)
+            dtype = lons.dtype
+            if not np.issubdtype(dtype, np.floating):
+                dtype = np.float64
+            # Transform straight in to the array of the correct shape
+            cartesian_coords = np.empty(lons.shape + (3, ), dtype=dtype)
+            cartesian.transform_lonlats(lons, lats,
+                                        out=cartesian_coords.reshape(-1, 3))
 
             if cache and data_slice is None:
                 self.cartesian_coords = cartesian_coords
+            if cache_key is not None:
+                caching.coordinate_cache.put(cache_key,
+                                             (cartesian_coords.copy(), ))
         else:
             # Coordinates are cached
             if data_slice is None:
@@ -989,6 +1010,17 @@ class AreaDefinition(BaseDefinition):
         the_hash.update(np.array(self.area_extent))
         return the_hash
 
+    def _get_coordinate_cache_key(self, kind, data_slice=None, dtype=None):
+        """Get the key of the coordinates in the shared coordinate cache, or
+        None if they are not cached"""
+        slice_key = caching.get_slice_key(data_slice)
+        if slice_key is False or caching.coordinate_cache.max_size <= 0:
+            return None
+        if dtype is None:
+            dtype = self.dtype
+        return (self.update_hash().hexdigest(), kind, float(self.rotation),
+                np.dtype(dtype).name, slice_key)
+
     def colrow2lonlat(self, cols, rows):
         """
         Return longitudes and latitudes for the given image columns
@@ -1120,6 +1152,50 @@ class AreaDefinition(BaseDefinition):
         lon, lat = self.get_lonlats(nprocs=None, data_slice=(row, col))
         return np.asscalar(lon), np.asscalar(lat)
 
+    @property
+    def is_rectilinear(self):
+        """Check if the longitudes only vary along the columns and the
+        latitudes only along the rows of the area.
+
+        This is the case for unrotated `latlong` and `eqc` areas.
+        """
+        if self.rotation != 0:
+            return False
+        proj_dict = self.proj_dict
+        if proj_dict.get('proj') not in RECTILINEAR_PROJECTIONS:
+            return False
+        # Oblique and swapped axes
+        return not any(key in proj_dict for key in ('o_proj', 'o_lat_p',
+                                                    'o_lon_p', 'axis'))
+
+    def get_lonlat_vectors(self, dtype=None):
+        """Get the longitudes of the columns and latitudes of the rows of a
+        rectilinear area.
+
+        Only the x_size + y_size coordinates are projected.
+        :meth:`get_lonlats` with `broadcast=True` returns broadcast views of
+        these vectors.
+
+        Returns
+        -------
+        (lons, lats) : tuple of numpy arrays
+            1-D arrays of x_size longitudes and y_size latitudes
+        """
+        if not self.is_rectilinear:
+            raise ValueError('Longitudes and latitudes of area %s are not '
+                             'separable' % self.area_id)
+        if dtype is None:
+            dtype = self.dtype
+
+        target_x = np.arange(self.x_size, dtype=dtype) * self.pixel_size_x +\
+            self.top_left_extent[0] + self.pixel_size_x / 2
+        target_y = np.arange(self.y_size, dtype=dtype) * -self.pixel_size_y +\
+            self.top_left_extent[1] - self.pixel_size_y / 2
+        proj = Proj(**self.proj_dict)
+        lons = proj(target_x, np.zeros_like(target_x), inverse=True)[0]
+        lats = proj(np.zeros_like(target_y), target_y, inverse=True)[1]
+        return (np.asarray(lons, dtype=dtype), np.asarray(lats, dtype=dtype))
+
     def get_proj_vectors_dask(self, chunks=CHUNK_SIZE, dtype=None):
         import dask.array as da
         if dtype is None:
@@ -1275,7 +1351,8 @@ class AreaDefinition(BaseDefinition):
 
         return res[:, :, 0], res[:, :, 1]
 
-    def get_lonlats(self, nprocs=None, data_slice=None, cache=False, dtype=None):
+    def get_lonlats(self, nprocs=None, data_slice=None, cache=False, dtype=None,
+                    broadcast=False):
         """Return lon and lat arrays of area.
 
         Parameters
@@ -1287,6 +1364,11 @@ class AreaDefinition(BaseDefinition):
             Calculate only coordinates for specified slice
         cache : bool, optional
             Store result the result. Requires data_slice to be None
+        broadcast : bool, optional
+            For rectilinear areas, see :attr:`is_rectilinear`, return
+            read-only broadcast views of the 1-D :meth:`get_lonlat_vectors`
+            instead of full grids. The views are never stored or cached.
+            Ignored for other areas
 
         Returns
         -------
@@ -1297,8 +1379,29 @@ class AreaDefinition(BaseDefinition):
         if dtype is None:
             dtype = self.dtype
 
-        if self.lons is None or self.lats is None:
-            # Data is not cached
+        if (broadcast and (self.lons is None or self.lats is None) and
+                self.is_rectilinear):
+            lons, lats = self.get_lonlat_vectors(dtype=dtype)
+            shape = (self.y_size, self.x_size)
+            lons = np.broadcast_to(lons, shape)
+            lats = np.broadcast_to(lats[:, np.newaxis], shape)
+            if data_slice is not None:
+                # Basic indexing of the broadcast arrays still gives views
+                lons = lons[data_slice]
+                lats = lats[data_slice]
+        elif self.lons is None or self.lats is None:
+            # Data is not cached on the instance
+            cache_key = self._get_coordinate_cache_key('lonlats', data_slice,
+                                                       dtype)
+            if cache_key is not None:
+                cached = caching.coordinate_cache.get(cache_key, data_slice)
+                if cached is not None:
+                    lons, lats = cached
+                    if cache and data_slice is None:
+                        self.lons = lons
+                        self.lats = lats
+                    return lons, lats
+
             if nprocs is None:
                 nprocs = self.nprocs
 
@@ -1314,14 +1417,15 @@ class AreaDefinition(BaseDefinition):
 
             # Get corresponding longitude and latitude values
             lons, lats = target_proj(target_x, target_y, inverse=True,
-                                     nprocs=nprocs)
-            lons = np.asanyarray(lons, dtype=dtype)
-            lats = np.asanyarray(lats, dtype=dtype)
+                                     nprocs=nprocs, dtype=dtype)
 
             if cache and data_slice is None:
                 # Cache the result if requested
                 self.lons = lons
                 self.lats = lats
+            if cache_key is not None:
+                caching.coordinate_cache.put(cache_key,
+                                             (lons.copy(), lats.copy()))
 
             # Free memory
             del (target_x)
@@ -1638,6 +1742,25 @@ def _get_slice(segments, shape):
             end_idx = min(start_idx + slice_length, size)
 
 
+def _get_lonlat_vectors(lons, lats):
+    """Get the 1-D longitude and latitude vectors of `lons` and `lats` grids
+    broadcast from them, as returned by :meth:`AreaDefinition.get_lonlats`
+    of rectilinear areas with `broadcast=True`.
+
+    Returns
+    -------
+    (lons, lats) : tuple of numpy arrays or None
+        None if the grids are not broadcast from vectors
+    """
+    if (isinstance(lons, np.ndarray) and isinstance(lats, np.ndarray) and
+            not isinstance(lons, np.ma.MaskedArray) and
+            not isinstance(lats, np.ma.MaskedArray) and
+            lons.ndim == 2 and lats.ndim == 2 and
+            lons.strides[0] == 0 and lats.strides[1] == 0):
+        return lons[0], lats[:, 0]
+    return None
+
+
 def _flatten_cartesian_coords(cartesian_coords):
     """Flatten array to (n, 3) shape"""
 
@@ -22,7 +22,7 @@ from __future__ import absolute_import
 
 import numpy as np
 
-from pyresample import geometry, _spatial_mp
+from pyresample import geometry, utils, _spatial_mp
 
 try:
     range = xrange
@@ -114,6 +114,31 @@ def get_linesample(lons, lats, source_area_def, nprocs=1):
         Arrays for resampling area by array indexing
     """
 
+    source_pixel_y, source_pixel_x = _get_linesample(lons, lats,
+                                                     source_area_def,
+                                                     nprocs=nprocs)
+    shape = np.broadcast(source_pixel_y, source_pixel_x).shape
+    if source_pixel_y.shape != shape:
+        source_pixel_y = np.broadcast_to(source_pixel_y, shape)
+        source_pixel_x = np.broadcast_to(source_pixel_x, shape)
+    return source_pixel_y, source_pixel_x
+
+
+def _get_linesample(lons, lats, source_area_def, nprocs=1):
+    """Like :func:`get_linesample`, but for lon/lat grids broadcast from
+    vectors and a rectilinear source area only the vectors are projected.
+    The row indices are then a column and the col indices a row vector."""
+
+    lonlat_vectors = None
+    if source_area_def.is_rectilinear:
+        lonlat_vectors = geometry._get_lonlat_vectors(lons, lats)
+    if lonlat_vectors is not None:
+        # x only depends on the longitudes and y on the latitudes
+        lons = lonlat_vectors[0][np.newaxis, :]
+        lats = lonlat_vectors[1][:, np.newaxis]
+        lons, lats = (np.concatenate((lons.ravel(), np.zeros(lats.size))),
+                      np.concatenate((np.zeros(lons.size), lats.ravel())))
+
     # Proj.4 definition of source area projection
     if nprocs > 1:
         source_proj = _spatial_mp.Proj_MP(**source_area_def.proj_dict)
@@ -122,6 +147,10 @@ def get_linesample(lons, lats, source_area_def, nprocs=1):
 
     # get cartesian projection values from longitude and latitude
     source_x, source_y = source_proj(lons, lats, nprocs=nprocs)
+    if lonlat_vectors is not None:
+        ncols = lonlat_vectors[0].size
+        source_x = source_x[np.newaxis, :ncols]
+        source_y = source_y[ncols:, np.newaxis]
 
     # Find corresponding pixels (element by element conversion of ndarrays)
     source_pixel_x = (source_area_def.pixel_offset_x +
@@ -161,9 +190,9 @@ def get_image_from_lonlats(lons, lats, source_area_def, source_image_data,
         Resampled image data
     """
 
-    source_pixel_y, source_pixel_x = get_linesample(lons, lats,
-                                                    source_area_def,
-                                                    nprocs=nprocs)
+    source_pixel_y, source_pixel_x = _get_linesample(lons, lats,
+                                                     source_area_def,
+                                                     nprocs=nprocs)
 
     # Return target image
     return get_image_from_linesample(source_pixel_y, source_pixel_x,
@@ -171,7 +200,8 @@ def get_image_from_lonlats(lons, lats, source_area_def, source_image_data,
 
 
 def get_resampled_image(target_area_def, source_area_def, source_image_data,
-                        fill_value=0, nprocs=1, segments=None):
+                        fill_value=0, nprocs=1, segments=None,
+                        max_memory=None):
     """Resamples image using nearest neighbour method in cartesian 
     projection coordinate systems.
 
@@ -191,7 +221,13 @@ def get_resampled_image(target_area_def, source_area_def, source_image_data,
         Number of processor cores to be used
     segments : {int, None} optional
         Number of segments to use when resampling.
-        If set to None an estimate will be calculated. 
+        If set to None an estimate will be calculated: the least number
+        of segments keeping the estimated peak memory within `max_memory`
+        if given, see :func:`estimate_resampled_image_memory`
+    max_memory : int, optional
+        Memory budget in bytes used to choose the number of segments,
+        e.g. a fraction of :func:`~pyresample.utils.get_available_memory`.
+        By default segments of at most 500 rows are used
 
     Returns
     -------
@@ -210,12 +246,13 @@ def get_resampled_image(target_area_def, source_area_def, source_image_data,
 
     # Calculate number of segments if needed
     if segments is None:
-        rows = target_area_def.y_size
-        cut_off = 500
-        if rows > cut_off:
-            segments = int(rows / cut_off)
-        else:
-            segments = 1
+        segments = estimate_resampled_image_memory(
+            target_area_def, source_area_def, source_image_data,
+            max_memory=max_memory).segments
+
+    # Only the lon/lat vectors of rectilinear areas are projected to a
+    # rectilinear source area
+    broadcast = source_area_def.is_rectilinear
 
     if segments > 1:
         # Iterate through segments
@@ -224,7 +261,7 @@ def get_resampled_image(target_area_def, source_area_def, source_image_data,
 
             # Select data from segment with slice
             lons, lats = target_area_def.get_lonlats(
-                nprocs=nprocs, data_slice=target_slice)
+                nprocs=nprocs, data_slice=target_slice, broadcast=broadcast)
 
             # Calculate partial result
             next_result = get_image_from_lonlats(lons, lats, source_area_def,
@@ -245,7 +282,81 @@ def get_resampled_image(target_area_def, source_area_def, source_image_data,
         return result
     else:
         # Get lon lat arrays of target area
-        lons, lats = target_area_def.get_lonlats(nprocs)
+        lons, lats = target_area_def.get_lonlats(nprocs, broadcast=broadcast)
         # Get target image
         return get_image_from_lonlats(lons, lats, source_area_def,
                                       source_image_data, fill_value, nprocs)
+
+
+def estimate_resampled_image_memory(target_area_def, source_area_def,
+                                    source_image_data, segments=None,
+                                    max_memory=None):
+    """Estimate the peak memory of :func:`get_resampled_image`
+
+    Dry run of :func:`get_resampled_image` choosing the number of
+    segments without resampling.
+
+    Parameters
+    ----------
+    target_area_def : object
+        Target definition as AreaDefinition object
+    source_area_def : object
+        Source definition as AreaDefinition object
+    source_image_data : numpy array
+        Source image data, only its shape and dtype are used
+    segments : {int, None} optional
+        Number of segments to estimate for. If set to None the least
+        number of segments within `max_memory` is chosen
+    max_memory : int, optional
+        Memory budget in bytes. By default segments of at most 500 rows
+        are used
+
+    Returns
+    -------
+    plan : :class:`~pyresample.utils.SegmentPlan`
+        Number of segments and estimated peak memory in bytes
+    """
+
+    def peak_memory(segments):
+        return _get_resampled_image_peak_memory(target_area_def,
+                                                source_image_data, segments)
+
+    rows = target_area_def.y_size
+    if segments is not None:
+        return utils.SegmentPlan(segments, peak_memory(segments), None)
+    if max_memory is None:
+        cut_off = 500
+        if rows > cut_off:
+            segments = int(rows / cut_off)
+        else:
+            segments = 1
+        return utils.SegmentPlan(segments, peak_memory(segments), None)
+    return utils.plan_segments(peak_memory, rows, int(max_memory))
+
+
+def _get_resampled_image_peak_memory(target_area_def, source_image_data,
+                                     segments):
+    """Estimated peak memory in bytes of resampling an image"""
+
+    channels = int(np.prod(source_image_data.shape[2:]))
+    item_size = np.dtype(source_image_data.dtype).itemsize
+    # The per pixel sizes are tracemalloc peaks of the stages of
+    # get_resampled_image. Projecting the target grid to lons and lats
+    # peaks at 56 bytes with the x/y coordinates and the copies pyproj
+    # makes of them. Projecting the float64 lons and lats on to the source
+    # needs 36 bytes on top of them
+    coords_memory = 56
+    # Sampling holds the lons and lats and the int32 pixel indices (24
+    # bytes), a valid mask and an int64 fill term (9 bytes), and per
+    # channel the sampled and the filled image and the sum filling them
+    sample_memory = 33 + channels * (2 * item_size + max(item_size, 8))
+    pixel_memory = max(coords_memory, sample_memory)
+    if segments <= 1:
+        return target_area_def.size * pixel_memory
+
+    rows = target_area_def.y_size
+    segment_rows = int(np.ceil(float(rows) / segments))
+    # Stacking the segments copies the result
+    output_memory = 2 * target_area_def.size * channels * item_size
+    return (output_memory +
+            segment_rows * target_area_def.x_size * pixel_memory)
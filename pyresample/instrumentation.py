@@ -0,0 +1,177 @@
+# pyresample, Resampling of remote sensing image data in python
+#
+# Copyright (C) 2018  Pytroll developers
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Timing and counters of the resampling stages.
+
+The stages of the resampling pipelines, e.g. reducing the input data,
+building and querying the kd-tree or sampling the data, report their wall
+time and point counts to the registered callbacks. Without callbacks a stage
+only checks the registry, so the instrumentation can be left on.
+
+Records are delivered from the thread running the stage, and every callback
+gets the records of all threads.
+"""
+
+from __future__ import absolute_import
+
+import functools
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+try:
+    _timer = time.perf_counter
+except AttributeError:
+    # python 2
+    _timer = time.time
+
+StageRecord = namedtuple('StageRecord', ['stage', 'duration', 'counts'])
+StageSummary = namedtuple('StageSummary', ['calls', 'duration', 'counts'])
+
+_callbacks = ()
+_lock = threading.Lock()
+
+
+def add_callback(callback):
+    """Call `callback` with a :class:`StageRecord` every time a stage ends."""
+    global _callbacks
+    with _lock:
+        _callbacks = _callbacks + (callback, )
+
+
+def remove_callback(callback):
+    """Stop calling `callback`."""
+    global _callbacks
+    with _lock:
+        callbacks = list(_callbacks)
+        callbacks.remove(callback)
+        _callbacks = tuple(callbacks)
+
+
+def is_enabled():
+    """Check if any callbacks are registered."""
+    return bool(_callbacks)
+
+
+class Stage(object):
+    """Context manager timing a stage and reporting it to the callbacks.
+
+    Counts are given as keyword arguments, or added with :meth:`count`
+    inside the block. Counts that are expensive to get should only be
+    computed if :attr:`enabled`. Stages ending with an exception are not
+    reported.
+    """
+
+    __slots__ = ('name', 'counts', 'enabled', '_start')
+
+    def __init__(self, name, **counts):
+        self.name = name
+        self.counts = counts
+        self.enabled = bool(_callbacks)
+        self._start = None
+
+    def count(self, **counts):
+        """Add or replace counts of the stage."""
+        self.counts.update(counts)
+
+    def __enter__(self):
+        if self.enabled:
+            self._start = _timer()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.enabled and exc_type is None:
+            record = StageRecord(self.name, _timer() - self._start,
+                                 self.counts)
+            for callback in _callbacks:
+                callback(record)
+        return False
+
+
+def report(name, duration, **counts):
+    """Report a stage timed elsewhere, e.g. in a worker process."""
+    if _callbacks:
+        record = StageRecord(name, duration, counts)
+        for callback in _callbacks:
+            callback(record)
+
+
+def timed(name, counts=None):
+    """Decorator reporting every call of a function as stage `name`.
+
+    If given, `counts` is called with the result of the function and returns
+    the counts of the stage as a dict.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _callbacks:
+                return func(*args, **kwargs)
+            with Stage(name) as stage:
+                result = func(*args, **kwargs)
+                if counts is not None:
+                    stage.count(**counts(result))
+            return result
+        return wrapper
+    return decorator
+
+
+class Recorder(object):
+    """Collect the records of the stages ending while it is active.
+
+    Use as a context manager, or register it with :func:`add_callback`.
+
+    Example
+    -------
+    >>> with Recorder() as recorder:  # doctest: +SKIP
+    ...     result = kd_tree.resample_nearest(swath_def, data, area_def, 50000)
+    >>> recorder.summary()['kd_tree.query'].duration  # doctest: +SKIP
+    """
+
+    def __init__(self):
+        self.records = []
+
+    def __call__(self, record):
+        self.records.append(record)
+
+    def __enter__(self):
+        add_callback(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        remove_callback(self)
+        return False
+
+    def summary(self):
+        """Get the number of calls, total duration and summed counts of every
+        stage, in order of the first record of each stage.
+
+        Returns
+        -------
+        summary : OrderedDict
+            :class:`StageSummary` by stage name
+        """
+        summary = OrderedDict()
+        for record in self.records:
+            calls, duration, counts = summary.get(record.stage,
+                                                  (0, 0.0, {}))
+            counts = dict(counts)
+            for key, value in record.counts.items():
+                counts[key] = counts.get(key, 0) + value
+            summary[record.stage] = StageSummary(calls + 1,
+                                                 duration + record.duration,
+                                                 counts)
+        return summary
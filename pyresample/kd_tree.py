@@ -20,14 +20,21 @@ supported"""
 
 from __future__ import absolute_import
 
+import hashlib
 import sys
+import tempfile
+import threading
 import types
 import warnings
+from collections import OrderedDict, deque
+from functools import partial
 from logging import getLogger
+from multiprocessing.pool import ThreadPool
 
 import numpy as np
 from pykdtree.kdtree import KDTree
-from pyresample import _spatial_mp, data_reduce, geometry
+from pyresample import (_spatial_mp, caching, data_reduce, geometry,
+                        instrumentation, utils)
 from pyresample import CHUNK_SIZE
 
 logger = getLogger(__name__)
@@ -57,7 +64,10 @@ def resample_nearest(source_geo_def,
                      fill_value=0,
                      reduce_data=True,
                      nprocs=1,
-                     segments=None):
+                     segments=None,
+                     cache_dir=None,
+                     precision=None,
+                     projection_search=False):
     """Resamples data using kd-tree nearest neighbour approach
 
     Parameters
@@ -86,6 +96,16 @@ def resample_nearest(source_geo_def,
     segments : int or None
         Number of segments to use when resampling.
         If set to None an estimate will be calculated
+    cache_dir : str or NeighbourInfoCache, optional
+        Directory (or :class:`~pyresample.caching.NeighbourInfoCache`)
+        to store the neighbour info in and reuse it from on later calls
+        with the same geometries and parameters
+    precision : {None, 'float32', 'float64'}, optional
+        Floating point type used for the kd-tree search, see
+        :func:`get_neighbour_info`
+    projection_search : bool, optional
+        Find the pixels of an unrotated area source by projection instead
+        of with a kd-tree, see :func:`get_neighbour_info`
 
     Returns
     -------
@@ -96,13 +116,15 @@ def resample_nearest(source_geo_def,
     return _resample(source_geo_def, data, target_geo_def, 'nn',
                      radius_of_influence, neighbours=1,
                      epsilon=epsilon, fill_value=fill_value,
-                     reduce_data=reduce_data, nprocs=nprocs, segments=segments)
+                     reduce_data=reduce_data, nprocs=nprocs, segments=segments,
+                     cache_dir=cache_dir, precision=precision,
+                     projection_search=projection_search)
 
 
 def resample_gauss(source_geo_def, data, target_geo_def,
                    radius_of_influence, sigmas, neighbours=8, epsilon=0,
                    fill_value=0, reduce_data=True, nprocs=1, segments=None,
-                   with_uncert=False):
+                   with_uncert=False, cache_dir=None, precision=None):
     """Resamples data using kd-tree gaussian weighting neighbour approach.
 
     Parameters
@@ -139,6 +161,13 @@ def resample_gauss(source_geo_def, data, target_geo_def,
         If set to None an estimate will be calculated
     with_uncert : bool, optional
         Calculate uncertainty estimates
+    cache_dir : str or NeighbourInfoCache, optional
+        Directory (or :class:`~pyresample.caching.NeighbourInfoCache`)
+        to store the neighbour info in and reuse it from on later calls
+        with the same geometries and parameters
+    precision : {None, 'float32', 'float64'}, optional
+        Floating point type used for the kd-tree search and the weighting,
+        see :func:`get_neighbour_info`
 
     Returns
     -------
@@ -150,39 +179,20 @@ def resample_gauss(source_geo_def, data, target_geo_def,
         Counts of number of source values used in weighting per pixel
 
     """
-    def gauss(sigma):
-        # Return gauss function object
-        return lambda r: np.exp(-r ** 2 / float(sigma) ** 2)
-
-    # Build correct sigma argument
-    is_multi_channel = False
-    try:
-        sigmas.__iter__()
-        sigma_list = sigmas
-        is_multi_channel = True
-    except AttributeError:
-        sigma_list = [sigmas]
-
-    for sigma in sigma_list:
-        if not isinstance(sigma, (long, int, float)):
-            raise TypeError('sigma must be number')
-
-    # Get gauss function objects
-    if is_multi_channel:
-        weight_funcs = list(map(gauss, sigma_list))
-    else:
-        weight_funcs = gauss(sigmas)
+    weight_funcs = _get_gauss_weight_funcs(sigmas)
 
     return _resample(source_geo_def, data, target_geo_def, 'custom',
                      radius_of_influence, neighbours=neighbours,
                      epsilon=epsilon, weight_funcs=weight_funcs, fill_value=fill_value,
-                     reduce_data=reduce_data, nprocs=nprocs, segments=segments, with_uncert=with_uncert)
+                     reduce_data=reduce_data, nprocs=nprocs, segments=segments, with_uncert=with_uncert,
+                     cache_dir=cache_dir, precision=precision)
 
 
 def resample_custom(source_geo_def, data, target_geo_def,
                     radius_of_influence, weight_funcs, neighbours=8,
                     epsilon=0, fill_value=0, reduce_data=True, nprocs=1,
-                    segments=None, with_uncert=False):
+                    segments=None, with_uncert=False, cache_dir=None,
+                    precision=None):
     """Resamples data using kd-tree custom radial weighting neighbour approach
 
     Parameters
@@ -218,6 +228,15 @@ def resample_custom(source_geo_def, data, target_geo_def,
     segments : {int, None}
         Number of segments to use when resampling.
         If set to None an estimate will be calculated
+    with_uncert : bool, optional
+        Calculate uncertainty estimates
+    cache_dir : str or NeighbourInfoCache, optional
+        Directory (or :class:`~pyresample.caching.NeighbourInfoCache`)
+        to store the neighbour info in and reuse it from on later calls
+        with the same geometries and parameters
+    precision : {None, 'float32', 'float64'}, optional
+        Floating point type used for the kd-tree search and the weighting,
+        see :func:`get_neighbour_info`
 
     Returns
     -------
@@ -229,6 +248,170 @@ def resample_custom(source_geo_def, data, target_geo_def,
         Counts of number of source values used in weighting per pixel
     """
 
+    _check_weight_funcs(weight_funcs)
+
+    return _resample(source_geo_def, data, target_geo_def, 'custom',
+                     radius_of_influence, neighbours=neighbours,
+                     epsilon=epsilon, weight_funcs=weight_funcs,
+                     fill_value=fill_value, reduce_data=reduce_data,
+                     nprocs=nprocs, segments=segments, with_uncert=with_uncert,
+                     cache_dir=cache_dir, precision=precision)
+
+
+def resample_batch(source_geo_def, datasets, target_geo_def,
+                   radius_of_influence, resample_type='nn', sigmas=None,
+                   weight_funcs=None, neighbours=8, epsilon=0, fill_value=0,
+                   reduce_data=True, nprocs=1, segments=None,
+                   with_uncert=False, cache_dir=None, precision=None):
+    """Resamples several datasets sharing one source geometry
+
+    The neighbour info is calculated once and reused for all datasets, so
+    the cost of building and querying the kd-tree is shared between them.
+
+    Parameters
+    ----------
+    source_geo_def : object
+        Geometry definition of source
+    datasets : list or dict of numpy arrays
+        Datasets to resample. Each dataset may have its own dtype and
+        mask, and is either a single channel or (source_geo_def.shape, k)
+        array of k channels of datapoints
+    target_geo_def : object
+        Geometry definition of target
+    radius_of_influence : float
+        Cut off distance in meters
+    resample_type : {'nn', 'gauss', 'custom'}, optional
+        'nn': Use nearest neighbour resampling
+        'gauss': Use gaussian weighting with `sigmas`
+        'custom': Use weighting with `weight_funcs`
+    sigmas : list of floats or float, optional
+        Sigmas to use for 'gauss' resampling, see :func:`resample_gauss`.
+        Applied to every dataset
+    weight_funcs : list of function objects or function object, optional
+        Weight functions to use for 'custom' resampling, see
+        :func:`resample_custom`. Applied to every dataset
+    neighbours : int, optional
+        The number of neigbours to consider for each grid point.
+        Ignored for 'nn' resampling
+    epsilon : float, optional
+        Allowed uncertainty in meters. Increasing uncertainty
+        reduces execution time
+    fill_value : int or None, optional
+            Set undetermined pixels to this value.
+            If fill_value is None masked arrays are returned
+            with undetermined pixels masked
+    reduce_data : bool, optional
+        Perform initial coarse reduction of source dataset in order
+        to reduce execution time
+    nprocs : int, optional
+        Number of processor cores to be used
+    segments : int or None
+        Number of segments to use when resampling.
+        If set to None an estimate will be calculated
+    with_uncert : bool, optional
+        Calculate uncertainty estimates. Only for weighted resampling
+    cache_dir : str or NeighbourInfoCache, optional
+        Directory (or :class:`~pyresample.caching.NeighbourInfoCache`)
+        to store the neighbour info in and reuse it from on later calls
+        with the same geometries and parameters
+    precision : {None, 'float32', 'float64'}, optional
+        Floating point type used for the kd-tree search and the weighting,
+        see :func:`get_neighbour_info`
+
+    Returns
+    -------
+    results : list or OrderedDict
+        The resampled datasets, in the same order as `datasets`, or, for
+        a dict (or dict subclass) of datasets, an OrderedDict with the
+        same keys. With `with_uncert` each item is a
+        (data, stddev, counts) tuple
+    """
+
+    if resample_type == 'nn':
+        neighbours = 1
+        if with_uncert:
+            raise ValueError('Uncertainties can only be calculated for '
+                             'weighted resampling')
+    elif resample_type == 'gauss':
+        if sigmas is None:
+            raise ValueError('sigmas must be supplied when using '
+                             'gauss resampling')
+        weight_funcs = _get_gauss_weight_funcs(sigmas)
+        resample_type = 'custom'
+    elif resample_type == 'custom':
+        if weight_funcs is None:
+            raise ValueError('weight_funcs must be supplied when using '
+                             'custom resampling')
+        _check_weight_funcs(weight_funcs)
+    else:
+        raise TypeError('Invalid resampling type: %s' % resample_type)
+
+    if isinstance(datasets, dict):
+        keys = list(datasets.keys())
+        arrays = [datasets[key] for key in keys]
+    else:
+        keys = None
+        arrays = list(datasets)
+
+    valid_input_index, valid_output_index, index_array, distance_array = \
+        get_neighbour_info(source_geo_def,
+                           target_geo_def,
+                           radius_of_influence,
+                           neighbours=neighbours,
+                           epsilon=epsilon,
+                           reduce_data=reduce_data,
+                           nprocs=nprocs,
+                           segments=segments,
+                           cache_dir=cache_dir,
+                           precision=precision)
+
+    results = [get_sample_from_neighbour_info(resample_type,
+                                              target_geo_def.shape,
+                                              data, valid_input_index,
+                                              valid_output_index,
+                                              index_array,
+                                              distance_array=distance_array,
+                                              weight_funcs=weight_funcs,
+                                              fill_value=fill_value,
+                                              with_uncert=with_uncert,
+                                              precision=precision)
+               for data in arrays]
+
+    if keys is not None:
+        return OrderedDict(zip(keys, results))
+    return results
+
+
+def _get_gauss_weight_funcs(sigmas):
+    """Get gauss weight function objects for one or a list of sigmas"""
+
+    def gauss(sigma):
+        # Return gauss function object
+        return lambda r: np.exp(-r ** 2 / float(sigma) ** 2)
+
+    # Build correct sigma argument
+    is_multi_channel = False
+    try:
+        sigmas.__iter__()
+        sigma_list = sigmas
+        is_multi_channel = True
+    except AttributeError:
+        sigma_list = [sigmas]
+
+    for sigma in sigma_list:
+        if not isinstance(sigma, (long, int, float)):
+            raise TypeError('sigma must be number')
+
+    # Get gauss function objects
+    if is_multi_channel:
+        return list(map(gauss, sigma_list))
+    else:
+        return gauss(sigmas)
+
+
+def _check_weight_funcs(weight_funcs):
+    """Check that weight_funcs is a function object or a list of them"""
+
     if not isinstance(weight_funcs, (list, tuple)):
         if not isinstance(weight_funcs, types.FunctionType):
             raise TypeError('weight_func must be function object')
@@ -237,16 +420,11 @@ def resample_custom(source_geo_def, data, target_geo_def,
             if not isinstance(weight_func, types.FunctionType):
                 raise TypeError('weight_func must be function object')
 
-    return _resample(source_geo_def, data, target_geo_def, 'custom',
-                     radius_of_influence, neighbours=neighbours,
-                     epsilon=epsilon, weight_funcs=weight_funcs,
-                     fill_value=fill_value, reduce_data=reduce_data,
-                     nprocs=nprocs, segments=segments, with_uncert=with_uncert)
-
 
 def _resample(source_geo_def, data, target_geo_def, resample_type,
               radius_of_influence, neighbours=8, epsilon=0, weight_funcs=None,
-              fill_value=0, reduce_data=True, nprocs=1, segments=None, with_uncert=False):
+              fill_value=0, reduce_data=True, nprocs=1, segments=None, with_uncert=False,
+              cache_dir=None, precision=None, projection_search=False):
     """Resamples swath using kd-tree approach"""
 
     valid_input_index, valid_output_index, index_array, distance_array = \
@@ -257,7 +435,10 @@ def _resample(source_geo_def, data, target_geo_def, resample_type,
                            epsilon=epsilon,
                            reduce_data=reduce_data,
                            nprocs=nprocs,
-                           segments=segments)
+                           segments=segments,
+                           cache_dir=cache_dir,
+                           precision=precision,
+                           projection_search=projection_search)
 
     return get_sample_from_neighbour_info(resample_type,
                                           target_geo_def.shape,
@@ -267,12 +448,24 @@ def _resample(source_geo_def, data, target_geo_def, resample_type,
                                           distance_array=distance_array,
                                           weight_funcs=weight_funcs,
                                           fill_value=fill_value,
-                                          with_uncert=with_uncert)
+                                          with_uncert=with_uncert,
+                                          precision=precision)
+
+
+def _count_neighbour_info(neighbour_info):
+    """Get the counts of the neighbour info stage"""
+    return {'valid_output': len(neighbour_info[2])}
 
 
+@instrumentation.timed('kd_tree.get_neighbour_info',
+                       counts=_count_neighbour_info)
 def get_neighbour_info(source_geo_def, target_geo_def, radius_of_influence,
                        neighbours=8, epsilon=0, reduce_data=True,
-                       nprocs=1, segments=None):
+                       nprocs=1, segments=None, cache_dir=None,
+                       scratch_dir=None, nthreads=1, precision=None,
+                       compact=False, distance_precision=None,
+                       max_memory=None, projection_search=False,
+                       reduce_footprint=False):
     """Returns neighbour info
 
     Parameters
@@ -295,7 +488,54 @@ def get_neighbour_info(source_geo_def, target_geo_def, radius_of_influence,
         Number of processor cores to be used
     segments : int or None
         Number of segments to use when resampling.
-        If set to None an estimate will be calculated
+        If set to None an estimate will be calculated: the least number
+        of segments keeping the estimated peak memory within `max_memory`
+        if given, see :func:`estimate_neighbour_info_memory`
+    cache_dir : str or NeighbourInfoCache, optional
+        Directory (or :class:`~pyresample.caching.NeighbourInfoCache`)
+        to store the neighbour info in and reuse it from on later calls
+        with the same geometries and parameters
+    scratch_dir : str, optional
+        When resampling in segments, assemble the index and distance
+        arrays in memory mapped files in this directory instead of in
+        memory
+    nthreads : int, optional
+        Number of threads querying segments concurrently. All threads
+        share the same kd-tree, as opposed to the processes used with
+        `nprocs`. At least `nthreads` segments are used, and at most
+        `nthreads` segment results are held at once
+    precision : {None, 'float32', 'float64'}, optional
+        Floating point type of the cartesian coordinates, the kd-tree and
+        the returned distances. 'float32' halves the memory needed, which
+        can change the chosen neighbour where distances are nearly equal.
+        Defaults to the data type of the source geometry
+    compact : bool, optional
+        Store the indices in the smallest unsigned integer type able to
+        hold them, and bit-pack `valid_input_index` and
+        `valid_output_index` in to :class:`~pyresample.utils.PackedMask`
+        arrays. :func:`get_sample_from_neighbour_info` and
+        :func:`get_resample_matrix` unpack them transparently
+    distance_precision : {None, 'float16', 'float32', 'float64'}, optional
+        Floating point type of the returned distances. 'float16' is
+        only allowed for a `radius_of_influence` it can represent.
+        Defaults to the type given by `precision`
+    max_memory : int, optional
+        Memory budget in bytes used to choose the number of segments,
+        e.g. a fraction of :func:`~pyresample.utils.get_available_memory`.
+        By default segments of at most 3e6 target pixels are used
+    projection_search : bool, optional
+        For the nearest neighbour of an unrotated AreaDefinition source,
+        project the target coordinates to the source area and take the
+        closest of the containing pixel and its neighbours instead of
+        searching a kd-tree. Faster for large sources, but where the pixels
+        are strongly distorted the closest pixel can lie outside of these
+    reduce_footprint : bool, optional
+        With `reduce_data`, skip the target pixels of a grid outside the
+        latitude band and longitude arc around the edges of a 2D swath
+        source, see
+        :func:`~pyresample.data_reduce.get_valid_index_from_lonlat_edges`.
+        These pixels are then not valid in the returned
+        `valid_output_index`
 
     Returns
     -------
@@ -308,71 +548,148 @@ def get_neighbour_info(source_geo_def, target_geo_def, radius_of_influence,
         warnings.warn('Searching for %s neighbours in %s data points' %
                       (neighbours, source_geo_def.size))
 
-    if segments is None:
-        cut_off = 3000000
-        if target_geo_def.size > cut_off:
-            segments = int(target_geo_def.size / cut_off)
-        else:
-            segments = 1
+    dtype = _get_precision_dtype(precision)
+    distance_dtype = _get_distance_dtype(distance_precision,
+                                         radius_of_influence)
 
-    # Find reduced input coordinate set
-    valid_input_index, source_lons, source_lats = _get_valid_input_index(source_geo_def, target_geo_def,
-                                                                         reduce_data,
-                                                                         radius_of_influence,
-                                                                         nprocs=nprocs)
+    cache_key = None
+    if cache_dir is not None:
+        if isinstance(cache_dir, caching.NeighbourInfoCache):
+            cache = cache_dir
+        else:
+            cache = caching.NeighbourInfoCache(cache_dir)
+        cache_key = cache.get_key(source_geo_def, target_geo_def,
+                                  radius_of_influence, neighbours,
+                                  epsilon, reduce_data, precision=dtype,
+                                  compact=compact,
+                                  distance_precision=distance_dtype,
+                                  reduce_footprint=reduce_footprint,
+                                  projection_search=projection_search)
+        if cache_key is not None:
+            neighbour_info = cache.load(cache_key)
+            if neighbour_info is not None:
+                return neighbour_info
+
+    segments = estimate_neighbour_info_memory(
+        source_geo_def, target_geo_def, neighbours=neighbours,
+        nprocs=nprocs, segments=segments, nthreads=nthreads,
+        precision=dtype, max_memory=max_memory).segments
+
+    if (projection_search and neighbours == 1 and
+            isinstance(source_geo_def, geometry.AreaDefinition) and
+            source_geo_def.rotation == 0):
+        # The nearest source pixel is found by projection, no kd-tree needed
+        valid_input_index = np.ones(source_geo_def.size, dtype=np.bool)
+
+        def query(target_slice):
+            # Query on slice of target coordinates
+            return _query_area_source(source_geo_def, target_geo_def,
+                                      radius_of_influence, target_slice,
+                                      nprocs=nprocs, dtype=dtype)
+    else:
+        # Find reduced input coordinate set
+        with instrumentation.Stage('kd_tree.reduce_input') as stage:
+            valid_input_index, source_lons, source_lats = _get_valid_input_index(source_geo_def, target_geo_def,
+                                                                                 reduce_data,
+                                                                                 radius_of_influence,
+                                                                                 nprocs=nprocs)
+            if stage.enabled:
+                stage.count(input=valid_input_index.size,
+                            valid_input=int(valid_input_index.sum()))
 
-    # Create kd-tree
-    try:
-        resample_kdtree = _create_resample_kdtree(source_lons, source_lats,
-                                                  valid_input_index,
-                                                  nprocs=nprocs)
-    except EmptyResult:
-        # Handle if all input data is reduced away
-        valid_output_index, index_array, distance_array = \
-            _create_empty_info(source_geo_def, target_geo_def, neighbours)
-        return (valid_input_index, valid_output_index, index_array,
-                distance_array)
+        # Create kd-tree
+        try:
+            with instrumentation.Stage('kd_tree.build_kdtree') as stage:
+                resample_kdtree = _create_resample_kdtree(source_lons, source_lats,
+                                                          valid_input_index,
+                                                          nprocs=nprocs, dtype=dtype)
+                if stage.enabled:
+                    stage.count(valid_input=int(valid_input_index.sum()))
+        except EmptyResult:
+            # Handle if all input data is reduced away
+            valid_output_index, index_array, distance_array = \
+                _create_empty_info(source_geo_def, target_geo_def, neighbours,
+                                   dtype=dtype)
+            neighbour_info = _compact_neighbour_info(
+                valid_input_index, valid_output_index, index_array,
+                distance_array, compact, distance_dtype)
+            if cache_key is not None:
+                cache.store(cache_key, neighbour_info)
+            return neighbour_info
+
+        def query(target_slice):
+            # Query on slice of target coordinates
+            return _query_resample_kdtree(resample_kdtree, source_geo_def,
+                                          target_geo_def,
+                                          radius_of_influence, target_slice,
+                                          neighbours=neighbours,
+                                          epsilon=epsilon,
+                                          reduce_data=reduce_data,
+                                          nprocs=nprocs, dtype=dtype,
+                                          reduce_footprint=reduce_footprint)
+
+    def query_segment(target_slice):
+        # Every segment is reported as one query stage
+        with instrumentation.Stage('kd_tree.query') as stage:
+            segment_info = query(target_slice)
+            if stage.enabled:
+                stage.count(output=segment_info[0].size,
+                            valid_output=int(segment_info[0].sum()))
+        return segment_info
 
     if segments > 1:
-        # Iterate through segments
-        for i, target_slice in enumerate(geometry._get_slice(segments,
-                                                             target_geo_def.shape)):
+        # Output arrays are allocated once, when the dtypes are known from
+        # the first segment, and each segment is written in to its slice
+        valid_output_index = np.zeros(target_geo_def.size, dtype=np.bool)
+        index_array = None
+        distance_array = None
+        voi_offset = 0
+        ia_offset = 0
+
+        target_slices = geometry._get_slice(segments, target_geo_def.shape)
+        if nthreads > 1:
+            # Segments are queried concurrently against the same kd-tree
+            # and delivered in order
+            pool = ThreadPool(nthreads)
+            segment_results = _imap_bounded(pool, query_segment,
+                                            target_slices, nthreads)
+        else:
+            pool = None
+            segment_results = (query_segment(target_slice)
+                               for target_slice in target_slices)
 
-            # Query on slice of target coordinates
-            next_voi, next_ia, next_da = \
-                _query_resample_kdtree(resample_kdtree, source_geo_def,
-                                       target_geo_def,
-                                       radius_of_influence, target_slice,
-                                       neighbours=neighbours,
-                                       epsilon=epsilon,
-                                       reduce_data=reduce_data,
-                                       nprocs=nprocs)
-
-            # Build result iteratively
-            if i == 0:
-                # First iteration
-                valid_output_index = next_voi
-                index_array = next_ia
-                distance_array = next_da
-            else:
-                valid_output_index = np.append(valid_output_index, next_voi)
-                if neighbours > 1:
-                    index_array = np.row_stack((index_array, next_ia))
-                    distance_array = np.row_stack((distance_array, next_da))
-                else:
-                    index_array = np.append(index_array, next_ia)
-                    distance_array = np.append(distance_array, next_da)
+        # Iterate through segments
+        try:
+            for next_voi, next_ia, next_da in segment_results:
+                if index_array is None:
+                    # First iteration
+                    array_shape = (target_geo_def.size,) + next_ia.shape[1:]
+                    index_array = _create_output_array(array_shape, next_ia.dtype,
+                                                       scratch_dir)
+                    distance_array = _create_output_array(array_shape,
+                                                          next_da.dtype,
+                                                          scratch_dir)
+
+                # Insert the segment result
+                valid_output_index[voi_offset:voi_offset + next_voi.size] = \
+                    next_voi
+                voi_offset += next_voi.size
+                index_array[ia_offset:ia_offset + len(next_ia)] = next_ia
+                distance_array[ia_offset:ia_offset + len(next_da)] = next_da
+                ia_offset += len(next_ia)
+                del next_voi, next_ia, next_da
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+
+        # Only valid output pixels have neighbour info
+        index_array = _shrink_output_array(index_array, ia_offset)
+        distance_array = _shrink_output_array(distance_array, ia_offset)
     else:
-        # Query kd-tree with full target coordinate set
-        full_slice = slice(None)
+        # Query with full target coordinate set
         valid_output_index, index_array, distance_array = \
-            _query_resample_kdtree(resample_kdtree, source_geo_def,
-                                   target_geo_def,
-                                   radius_of_influence, full_slice,
-                                   neighbours=neighbours,
-                                   epsilon=epsilon,
-                                   reduce_data=reduce_data,
-                                   nprocs=nprocs)
+            query_segment(slice(None))
 
     # Check if number of neighbours is potentially too low
     if neighbours > 1:
@@ -381,9 +698,160 @@ def get_neighbour_info(source_geo_def, target_geo_def, radius_of_influence,
                            'within %s m for some data points') %
                           (neighbours, radius_of_influence))
 
+    neighbour_info = _compact_neighbour_info(
+        valid_input_index, valid_output_index, index_array, distance_array,
+        compact, distance_dtype)
+    if cache_key is not None:
+        cache.store(cache_key, neighbour_info)
+    return neighbour_info
+
+
+def _imap_bounded(pool, func, iterable, max_pending):
+    """Like :meth:`multiprocessing.pool.Pool.imap`, but with at most
+    `max_pending` results submitted and not yet consumed"""
+
+    pending = deque()
+    try:
+        for item in iterable:
+            if len(pending) >= max_pending:
+                yield pending.popleft().get()
+            pending.append(pool.apply_async(func, (item,)))
+        while pending:
+            yield pending.popleft().get()
+    finally:
+        # Drop the references to results not consumed
+        pending.clear()
+
+
+def estimate_neighbour_info_memory(source_geo_def, target_geo_def,
+                                   neighbours=8, nprocs=1, segments=None,
+                                   nthreads=1, precision=None,
+                                   max_memory=None):
+    """Estimate the peak memory of :func:`get_neighbour_info`
+
+    Dry run of :func:`get_neighbour_info` choosing the number of segments
+    without searching for neighbours. The estimate assumes no source or
+    target pixels are reduced away, so it is an upper bound for most
+    geometries.
+
+    Parameters
+    ----------
+    source_geo_def : object
+        Geometry definition of source
+    target_geo_def : object
+        Geometry definition of target
+    neighbours : int, optional
+        The number of neigbours to consider for each grid point
+    nprocs : int, optional
+        Number of processor cores to be used
+    segments : int or None
+        Number of segments to estimate for. If set to None the least
+        number of segments within `max_memory` is chosen
+    nthreads : int, optional
+        Number of threads querying segments concurrently. At least
+        `nthreads` segments are used
+    precision : {None, 'float32', 'float64'}, optional
+        Floating point type of the coordinates and distances
+    max_memory : int, optional
+        Memory budget in bytes. By default segments of at most 3e6 target
+        pixels are used
+
+    Returns
+    -------
+    plan : :class:`~pyresample.utils.SegmentPlan`
+        Number of segments and estimated peak memory in bytes
+    """
+
+    def peak_memory(segments):
+        return _get_neighbour_info_peak_memory(source_geo_def, target_geo_def,
+                                               neighbours, segments, dtype,
+                                               nprocs, nthreads)
+
+    dtype = _get_precision_dtype(precision)
+    rows = target_geo_def.shape[0]
+    if segments is not None:
+        # Give every thread at least one segment to query
+        segments = max(segments, nthreads)
+        return utils.SegmentPlan(segments, peak_memory(segments), None)
+    if max_memory is None:
+        cut_off = 3000000
+        if target_geo_def.size > cut_off:
+            segments = int(target_geo_def.size / cut_off)
+        else:
+            segments = 1
+        # Give every thread at least one segment to query
+        segments = max(segments, nthreads)
+        return utils.SegmentPlan(segments, peak_memory(segments), None)
+    return utils.plan_segments(peak_memory, rows, int(max_memory),
+                               min_segments=nthreads)
+
+
+def _get_neighbour_info_peak_memory(source_geo_def, target_geo_def,
+                                    neighbours, segments, dtype=None,
+                                    nprocs=1, nthreads=1):
+    """Estimated peak memory in bytes of a neighbour info query"""
+
+    if dtype is None:
+        dtype = getattr(source_geo_def, 'dtype', np.float64)
+    coord_size = np.dtype(dtype).itemsize
+    # pykdtree returns uint32 indices, the multiprocessing kd-tree intp
+    index_size = 4 if nprocs == 1 else np.dtype(np.intp).itemsize
+
+    # The per point sizes follow the arrays allocated, and were checked
+    # against tracemalloc peaks. Held by the source: the cartesian
+    # coordinates, the valid mask and the uint32 point indices the kd-tree
+    # allocates itself
+    source_memory = source_geo_def.size * (3 * coord_size + 5)
+    if not isinstance(source_geo_def, geometry.CoordinateDefinition):
+        # Lons and lats of areas are computed, not stored
+        source_memory += source_geo_def.size * 2 * np.dtype(
+            getattr(source_geo_def, 'dtype', np.float64)).itemsize
+    # Per target pixel: the lons, lats and cartesian coordinates and the
+    # valid mask. Per neighbour the query returns the indices and the
+    # distances, which pykdtree computes from squared distances, and masks
+    # the neighbours beyond the radius
+    pixel_memory = 5 * coord_size + 1 + neighbours * (index_size +
+                                                      2 * coord_size + 1)
+    if segments <= 1:
+        return source_memory + target_geo_def.size * pixel_memory
+
+    rows = target_geo_def.shape[0]
+    cols = target_geo_def.size // rows
+    segment_rows = int(np.ceil(float(rows) / segments))
+    # The result arrays are assembled from the segments
+    output_memory = target_geo_def.size * (1 + neighbours * (index_size +
+                                                             coord_size))
+    concurrent_segments = min(nthreads, segments)
+    return (source_memory + output_memory +
+            concurrent_segments * segment_rows * cols * pixel_memory)
+
+
+def _compact_neighbour_info(valid_input_index, valid_output_index,
+                            index_array, distance_array, compact=False,
+                            distance_dtype=None):
+    """Downcast indices and distances and bit-pack the masks if asked for"""
+
+    if distance_dtype is not None:
+        distance_array = distance_array.astype(distance_dtype, copy=False)
+    if compact:
+        # The fill index is the number of valid input pixels
+        index_array = utils._downcast_index_array(
+            index_array, valid_input_index.sum(),
+            dtypes=(np.uint8, np.uint16, np.uint32, np.uint64))
+        valid_input_index = utils.PackedMask.pack(valid_input_index)
+        valid_output_index = utils.PackedMask.pack(valid_output_index)
     return valid_input_index, valid_output_index, index_array, distance_array
 
 
+def _unpack_mask(mask):
+    """Unpack a :class:`~pyresample.utils.PackedMask`, other masks are
+    taken as boolean arrays"""
+
+    if isinstance(mask, utils.PackedMask):
+        return mask.unpack()
+    return np.asanyarray(mask).astype(np.bool, copy=False)
+
+
 def _get_valid_input_index(source_geo_def,
                            target_geo_def,
                            reduce_data,
@@ -433,10 +901,11 @@ def _get_valid_input_index(source_geo_def,
 
 
 def _get_valid_output_index(source_geo_def, target_geo_def, target_lons,
-                            target_lats, reduce_data, radius_of_influence):
+                            target_lats, reduce_data, radius_of_influence,
+                            reduce_footprint=False):
     """Find indices of reduced output data"""
 
-    valid_output_index = np.ones(target_lons.size, dtype=np.bool)
+    valid_output_index = np.ones(target_lons.shape, dtype=np.bool)
 
     if reduce_data:
         if isinstance(source_geo_def, (geometry.GridDefinition,
@@ -452,6 +921,21 @@ def _get_valid_output_index(source_geo_def, target_geo_def, target_lons,
                     target_lats,
                     radius_of_influence)
             valid_output_index = valid_output_index.astype(np.bool)
+        elif reduce_footprint and \
+                isinstance(source_geo_def, geometry.CoordinateDefinition) and \
+                source_geo_def.ndim == 2 and \
+                isinstance(target_geo_def, (geometry.GridDefinition,
+                                            geometry.AreaDefinition)):
+            # Resampling from swath to grid, skip the target pixels outside
+            # the swath footprint
+            edge_lons, edge_lats = source_geo_def.get_bbox_lonlats()
+            valid_output_index = \
+                data_reduce.get_valid_index_from_lonlat_edges(
+                    edge_lons,
+                    edge_lats,
+                    target_lons,
+                    target_lats,
+                    radius_of_influence)
 
     # Remove illegal values
     valid_out = ((target_lons >= -180) & (target_lons <= 180) &
@@ -462,13 +946,14 @@ def _get_valid_output_index(source_geo_def, target_geo_def, target_lons,
     if isinstance(valid_output_index, np.ma.MaskedArray):
         valid_output_index = valid_output_index.filled(False)
 
-    return valid_output_index
+    return valid_output_index.ravel()
 
 
 def _create_resample_kdtree(source_lons,
                             source_lats,
                             valid_input_index,
-                            nprocs=1):
+                            nprocs=1,
+                            dtype=None):
     """Set up kd tree on input"""
     """
     if not isinstance(source_geo_def, geometry.BaseDefinition):
@@ -489,7 +974,8 @@ def _create_resample_kdtree(source_lons,
         cartesian = _spatial_mp.Cartesian()
 
     input_coords = cartesian.transform_lonlats(source_lons_valid,
-                                               source_lats_valid)
+                                               source_lats_valid,
+                                               dtype=dtype)
 
     if input_coords.size == 0:
         raise EmptyResult('No valid data points in input data')
@@ -511,7 +997,9 @@ def _query_resample_kdtree(resample_kdtree,
                            neighbours=8,
                            epsilon=0,
                            reduce_data=True,
-                           nprocs=1):
+                           nprocs=1,
+                           dtype=None,
+                           reduce_footprint=False):
     """Query kd-tree on slice of target coordinates"""
 
     # Check validity of input
@@ -525,16 +1013,28 @@ def _query_resample_kdtree(resample_kdtree,
         raise TypeError('epsilon must be number')
 
     # Get sliced target coordinates
+    coords_dtype = source_geo_def.dtype if dtype is None else dtype
+    kwargs = {}
+    if getattr(target_geo_def, 'is_rectilinear', False):
+        # Keep the grids broadcast from the lon/lat vectors unexpanded
+        kwargs['broadcast'] = True
     target_lons, target_lats = target_geo_def.get_lonlats(nprocs=nprocs,
-                                                          data_slice=data_slice, dtype=source_geo_def.dtype)
+                                                          data_slice=data_slice, dtype=coords_dtype,
+                                                          **kwargs)
+
+    lonlat_vectors = geometry._get_lonlat_vectors(target_lons, target_lats)
+    if lonlat_vectors is None:
+        target_lons = target_lons.ravel()
+        target_lats = target_lats.ravel()
 
     # Find indiced of reduced target coordinates
     valid_output_index = _get_valid_output_index(source_geo_def,
                                                  target_geo_def,
-                                                 target_lons.ravel(),
-                                                 target_lats.ravel(),
+                                                 target_lons,
+                                                 target_lats,
                                                  reduce_data,
-                                                 radius_of_influence)
+                                                 radius_of_influence,
+                                                 reduce_footprint=reduce_footprint)
 
     # Get cartesian target coordinates and select reduced set
     if nprocs > 1:
@@ -542,50 +1042,223 @@ def _query_resample_kdtree(resample_kdtree,
     else:
         cartesian = _spatial_mp.Cartesian()
 
-    target_lons_valid = target_lons.ravel()[valid_output_index]
-    target_lats_valid = target_lats.ravel()[valid_output_index]
-
-    output_coords = cartesian.transform_lonlats(target_lons_valid,
-                                                target_lats_valid)
-
     # pykdtree requires query points have same data type as kdtree.
     try:
         dt = resample_kdtree.data.dtype
     except AttributeError:
         # use a sensible default
         dt = np.dtype('d')
-    output_coords = np.asarray(output_coords, dtype=dt)
+    if lonlat_vectors is not None:
+        # Only the trigonometry of the vectors is needed
+        rows, cols = np.divmod(np.flatnonzero(valid_output_index),
+                               lonlat_vectors[0].size)
+        output_coords = cartesian.transform_lonlat_vectors(
+            lonlat_vectors[0], lonlat_vectors[1], rows, cols, dtype=dt)
+        del rows, cols
+    else:
+        output_coords = cartesian.transform_lonlats(
+            target_lons[valid_output_index], target_lats[valid_output_index],
+            dtype=dt)
 
     # Query kd-tree
     distance_array, index_array = resample_kdtree.query(output_coords,
                                                         k=neighbours,
                                                         eps=epsilon,
                                                         distance_upper_bound=radius_of_influence)
+    if dtype is not None:
+        # The multiprocessing kd-tree always returns double distances
+        distance_array = distance_array.astype(dtype, copy=False)
+
+    return valid_output_index, index_array, distance_array
+
+
+def _query_area_source(source_geo_def, target_geo_def, radius_of_influence,
+                       data_slice, nprocs=1, dtype=None):
+    """Find the nearest pixel of an area source on slice of target coordinates
+
+    Replaces the kd-tree query for nearest neighbour resampling from an
+    unrotated AreaDefinition. As in :func:`pyresample.grid.get_linesample`
+    the target coordinates are projected to the source projection and the
+    containing source pixel is found by arithmetic. Coordinates outside the
+    source area take the closest edge pixel. The pixel with the closest
+    centre in cartesian coordinates among this pixel and its eight
+    neighbours is taken, and like in the kd-tree query it is discarded if
+    farther away than `radius_of_influence`.
+    """
+
+    if not isinstance(target_geo_def, geometry.BaseDefinition):
+        raise TypeError('target_geo_def must be of geometry type')
+    elif not isinstance(radius_of_influence, (long, int, float)):
+        raise TypeError('radius_of_influence must be number')
+
+    # Get sliced target coordinates
+    coords_dtype = source_geo_def.dtype if dtype is None else dtype
+    target_lons, target_lats = target_geo_def.get_lonlats(nprocs=nprocs,
+                                                          data_slice=data_slice, dtype=coords_dtype)
+    target_lons = target_lons.ravel()
+    target_lats = target_lats.ravel()
+    valid_output_index = ((target_lons >= -180) & (target_lons <= 180) &
+                          (target_lats <= 90) & (target_lats >= -90))
+    target_lons = target_lons[valid_output_index].astype(np.float64)
+    target_lats = target_lats[valid_output_index].astype(np.float64)
+
+    # Proj.4 definition of source area projection
+    if nprocs > 1:
+        source_proj = _spatial_mp.Proj_MP(**source_geo_def.proj_dict)
+        cartesian = _spatial_mp.Cartesian_MP(nprocs)
+    else:
+        source_proj = _spatial_mp.Proj(**source_geo_def.proj_dict)
+        cartesian = _spatial_mp.Cartesian()
+
+    lons = target_lons
+    if source_proj.is_latlong():
+        # Wrap the longitudes in to the extent of the source area
+        x_min = source_geo_def.area_extent[0]
+        lons = (target_lons - x_min) % 360 + x_min
+    source_x, source_y = source_proj(lons, target_lats, nprocs=nprocs)
+    del lons
+
+    # Find the containing source pixels, or the closest edge pixels
+    cols = np.floor(source_geo_def.pixel_offset_x +
+                    source_x / source_geo_def.pixel_size_x)
+    rows = np.floor(source_geo_def.pixel_offset_y -
+                    source_y / source_geo_def.pixel_size_y)
+    del source_x, source_y
+    is_projected = np.isfinite(cols) & np.isfinite(rows)
+    cols = np.clip(np.where(is_projected, cols, 0), 0,
+                   source_geo_def.x_size - 1).astype(np.intp)
+    rows = np.clip(np.where(is_projected, rows, 0), 0,
+                   source_geo_def.y_size - 1).astype(np.intp)
+
+    # The closest pixel centre is searched among the containing pixel and
+    # its eight neighbours, which covers the pixel cells being skewed by
+    # the projection
+    offsets = [(row_offset, col_offset) for row_offset in (-1, 0, 1)
+               for col_offset in (-1, 0, 1)]
+
+    def get_pixel_index(rows, cols, row_offset, col_offset):
+        return (np.clip(rows + row_offset, 0, source_geo_def.y_size - 1) *
+                source_geo_def.x_size +
+                np.clip(cols + col_offset, 0, source_geo_def.x_size - 1))
+
+    # Neighbouring targets share pixels, get the centre of every pixel once
+    pixel_rows, pixel_cols = np.divmod(
+        np.unique(rows * source_geo_def.x_size + cols), source_geo_def.x_size)
+    pixel_index = np.unique(np.concatenate([
+        get_pixel_index(pixel_rows, pixel_cols, row_offset, col_offset)
+        for row_offset, col_offset in offsets]))
+    del pixel_rows, pixel_cols
+    pixel_coords = _get_centre_coords(source_geo_def, source_proj, cartesian,
+                                      pixel_index, nprocs=nprocs)
+
+    target_coords = cartesian.transform_lonlats(target_lons, target_lats)
+    distance_array = np.full(target_lons.shape, np.inf)
+    found_index = rows * source_geo_def.x_size + cols
+    for row_offset, col_offset in offsets:
+        next_index = get_pixel_index(rows, cols, row_offset, col_offset)
+        centre_coords = pixel_coords[np.searchsorted(pixel_index,
+                                                     next_index)]
+        centre_coords -= target_coords
+        next_distance = np.sqrt((centre_coords ** 2).sum(axis=1))
+        del centre_coords
+        # Pixels outside the projection domain have NaN distances and are
+        # never found
+        with np.errstate(invalid='ignore'):
+            is_closer = next_distance < distance_array
+        distance_array[is_closer] = next_distance[is_closer]
+        found_index[is_closer] = next_index[is_closer]
+    del target_coords, pixel_coords, pixel_index
+
+    # Discard neighbours outside the radius of influence
+    with np.errstate(invalid='ignore'):
+        is_found = is_projected & (distance_array < radius_of_influence)
+    if source_geo_def.size <= np.iinfo(np.uint32).max:
+        # Same index type as the kd-tree
+        index_dtype = np.uint32
+    else:
+        index_dtype = np.intp
+    index_array = np.where(is_found, found_index,
+                           source_geo_def.size).astype(index_dtype)
+    distance_array = np.where(is_found, distance_array, np.inf)
+    distance_array = distance_array.astype(coords_dtype, copy=False)
 
     return valid_output_index, index_array, distance_array
 
 
-def _create_empty_info(source_geo_def, target_geo_def, neighbours):
+def _get_centre_coords(source_geo_def, source_proj, cartesian, pixel_index,
+                       nprocs=1):
+    """Cartesian coordinates of the centres of area pixels
+
+    Pixels outside the projection domain get NaN coordinates.
+    """
+
+    rows, cols = np.divmod(pixel_index, source_geo_def.x_size)
+    centre_x = (source_geo_def.area_extent[0] +
+                (cols + 0.5) * source_geo_def.pixel_size_x)
+    centre_y = (source_geo_def.area_extent[3] -
+                (rows + 0.5) * source_geo_def.pixel_size_y)
+    lons, lats = source_proj(centre_x, centre_y, inverse=True, nprocs=nprocs)
+    with np.errstate(invalid='ignore'):
+        is_valid = (np.abs(lons) <= 180) & (np.abs(lats) <= 90)
+    coords = cartesian.transform_lonlats(lons, lats)
+    coords[~is_valid] = np.nan
+    return coords
+
+
+def _create_output_array(shape, dtype, scratch_dir=None):
+    """Allocate an output array, memory mapped if `scratch_dir` is given"""
+
+    if scratch_dir is None:
+        return np.empty(shape, dtype=dtype)
+    # The file is removed when closed, the memory map keeps the data alive
+    with tempfile.TemporaryFile(dir=scratch_dir) as scratch_file:
+        return np.memmap(scratch_file, dtype=dtype, mode='w+', shape=shape)
+
+
+def _shrink_output_array(arr, length):
+    """Shrink the first dimension of `arr` to `length` without copying"""
+
+    if length == arr.shape[0]:
+        return arr
+    if isinstance(arr, np.memmap) or not arr.flags.owndata:
+        return arr[:length]
+    # Reallocates in place, the array is not referenced anywhere else
+    arr.resize((length,) + arr.shape[1:], refcheck=False)
+    return arr
+
+
+def _create_empty_info(source_geo_def, target_geo_def, neighbours,
+                       dtype=None):
     """Creates dummy info for empty result set"""
 
     valid_output_index = np.ones(target_geo_def.size, dtype=np.bool)
     if neighbours > 1:
         index_array = (np.ones((target_geo_def.size, neighbours),
                                dtype=np.int32) * source_geo_def.size)
-        distance_array = np.ones((target_geo_def.size, neighbours))
+        distance_array = np.ones((target_geo_def.size, neighbours),
+                                 dtype=dtype)
     else:
         index_array = (np.ones(target_geo_def.size, dtype=np.int32) *
                        source_geo_def.size)
-        distance_array = np.ones(target_geo_def.size)
+        distance_array = np.ones(target_geo_def.size, dtype=dtype)
 
     return valid_output_index, index_array, distance_array
 
 
+def _count_sample(result):
+    """Get the counts of the sampling stage"""
+    if isinstance(result, tuple):
+        # Result with uncertainties
+        result = result[0]
+    return {'output': np.size(result)}
+
+
+@instrumentation.timed('kd_tree.get_sample', counts=_count_sample)
 def get_sample_from_neighbour_info(resample_type, output_shape, data,
                                    valid_input_index, valid_output_index,
                                    index_array, distance_array=None,
                                    weight_funcs=None, fill_value=0,
-                                   with_uncert=False):
+                                   with_uncert=False, precision=None):
     """Resamples swath based on neighbour info
 
     Parameters
@@ -616,6 +1289,12 @@ def get_sample_from_neighbour_info(resample_type, output_shape, data,
         Set undetermined pixels to this value.
         If fill_value is None a masked array is returned
         with undetermined pixels masked
+    with_uncert : bool, optional
+        Calculate uncertainty estimates
+    precision : {None, 'float32', 'float64'}, optional
+        Floating point type used for weights and accumulation in
+        'custom' resampling. 'float32' halves the memory needed and is
+        faster, at the cost of accuracy. Defaults to 'float64'
 
     Returns
     -------
@@ -623,6 +1302,9 @@ def get_sample_from_neighbour_info(resample_type, output_shape, data,
         Source data resampled to target geometry
     """
 
+    valid_input_index = _unpack_mask(valid_input_index)
+    valid_output_index = _unpack_mask(valid_output_index)
+
     if data.ndim > 2 and data.shape[0] * data.shape[1] == valid_input_index.size:
         data = data.reshape(data.shape[0] * data.shape[1], data.shape[2])
     elif data.shape[0] != valid_input_index.size:
@@ -669,6 +1351,8 @@ def get_sample_from_neighbour_info(resample_type, output_shape, data,
     if resample_type not in valid_types:
         raise TypeError('Invalid resampling type: %s' % resample_type)
 
+    accumulation_dtype = _get_precision_dtype(precision, np.float64)
+
     if resample_type == 'custom' and weight_funcs is None:
         raise ValueError('weight_funcs must be supplied when using '
                          'custom resampling')
@@ -717,6 +1401,10 @@ def get_sample_from_neighbour_info(resample_type, output_shape, data,
     if fill_value is None:
         use_masked_fill_value = True
         fill_value = _get_fill_mask_value(new_data.dtype)
+        if resample_type == 'custom' and precision is not None:
+            # Make sure the fill value is representable in the result
+            fill_value = min(fill_value,
+                             _get_fill_mask_value(accumulation_dtype))
 
     # Resample based on kd-tree query result
     if resample_type == 'nn' or neighbours == 1:
@@ -726,113 +1414,10 @@ def get_sample_from_neighbour_info(resample_type, output_shape, data,
         result = new_data[new_index_array].copy()
         result[index_mask] = fill_value
     else:
-        # Calculate result using weighting.
-        # Note: the code below has low readability in order
-        #       to avoid looping over numpy arrays
-
-        # Get neighbours and masks of valid indices
-        ch_neighbour_list = []
-        index_mask_list = []
-        for i in range(neighbours):  # Iterate over number of neighbours
-            # Make working copy neighbour index and
-            # set out of bounds indices to zero
-            index_ni = index_array[:, i].copy()
-            index_mask_ni = (index_ni == input_size)
-            index_ni[index_mask_ni] = 0
-
-            # Get channel data for the corresponing indices
-            ch_ni = new_data[index_ni]
-            ch_neighbour_list.append(ch_ni)
-            index_mask_list.append(index_mask_ni)
-
-        # Calculate weights
-        weight_list = []
-        for i in range(neighbours):  # Iterate over number of neighbours
-            # Make working copy of neighbour distances and
-            # set out of bounds distance to 1 in order to avoid numerical Inf
-            distance = distance_array[:, i].copy()
-            distance[index_mask_list[i]] = 1
-
-            if new_data.ndim > 1:  # More than one channel in data set.
-                # Calculate weights for each channel
-                weights = []
-                num_weights = valid_output_index.sum()
-                num_channels = new_data.shape[1]
-                for j in range(num_channels):
-                    calc_weight = weight_funcs[j](distance)
-                    # Turn a scalar weight into a numpy array
-                    # (no effect if calc_weight already is an array)
-                    expanded_calc_weight = np.ones(num_weights) * calc_weight
-                    weights.append(expanded_calc_weight)
-
-                # Collect weights for all channels for neighbour number
-                weight_list.append(np.column_stack(weights))
-            else:  # Only one channel
-                weights = weight_funcs(distance)
-                weight_list.append(weights)
-
-        result = 0
-        norm = 0
-        count = 0
-        norm_sqr = 0
-        stddev = 0
-
-        # Calculate result
-        for i in range(neighbours):  # Iterate over number of neighbours
-            # Find invalid indices to be masked of from calculation
-            if new_data.ndim > 1:  # More than one channel in data set.
-                inv_index_mask = np.expand_dims(
-                    np.invert(index_mask_list[i]), axis=1)
-            else:  # Only one channel
-                inv_index_mask = np.invert(index_mask_list[i])
-
-            # Aggregate result and norm
-            weights_tmp = inv_index_mask * weight_list[i]
-            result += weights_tmp * ch_neighbour_list[i]
-            norm += weights_tmp
-
-        # Normalize result and set fillvalue
-        result_valid_index = (norm > 0)
-        result[result_valid_index] /= norm[result_valid_index]
-
-        if with_uncert:  # Calculate uncertainties
-            # 2. pass to calculate standard deviation
-            for i in range(neighbours):  # Iterate over number of neighbours
-                # Find invalid indices to be masked of from calculation
-                if new_data.ndim > 1:  # More than one channel in data set.
-                    inv_index_mask = np.expand_dims(
-                        np.invert(index_mask_list[i]), axis=1)
-                else:  # Only one channel
-                    inv_index_mask = np.invert(index_mask_list[i])
-
-                # Aggregate stddev information
-                weights_tmp = inv_index_mask * weight_list[i]
-                count += inv_index_mask
-                norm_sqr += weights_tmp ** 2
-                values = inv_index_mask * ch_neighbour_list[i]
-                stddev += weights_tmp * (values - result) ** 2
-
-            # Calculate final stddev
-            new_valid_index = (count > 1)
-            if stddev.ndim >= 2:
-                # If given more than 1 input data array
-                new_valid_index = new_valid_index[:, 0]
-                for i in range(stddev.shape[-1]):
-                    v1 = norm[new_valid_index, i]
-                    v2 = norm_sqr[new_valid_index, i]
-                    stddev[new_valid_index, i] = np.sqrt(
-                        (v1 / (v1 ** 2 - v2)) * stddev[new_valid_index, i])
-                    stddev[~new_valid_index, i] = np.NaN
-            else:
-                # If given single input data array
-                v1 = norm[new_valid_index]
-                v2 = norm_sqr[new_valid_index]
-                stddev[new_valid_index] = np.sqrt(
-                    (v1 / (v1 ** 2 - v2)) * stddev[new_valid_index])
-                stddev[~new_valid_index] = np.NaN
-
-        # Add fill values
-        result[np.invert(result_valid_index)] = fill_value
+        # Calculate result using weighting
+        result, stddev, count = _get_weighted_sample(
+            new_data, index_array, distance_array, input_size, weight_funcs,
+            fill_value, accumulation_dtype, with_uncert)
 
     # Create full result
     if new_data.ndim > 1:  # More than one channel
@@ -840,13 +1425,21 @@ def get_sample_from_neighbour_info(resample_type, output_shape, data,
     else:  # One channel
         output_raw_shape = output_size
 
-    full_result = np.ones(output_raw_shape) * fill_value
+    if conserve_input_data_type:
+        # Floating point data is kept exactly in its own type
+        if np.issubdtype(input_data_type, np.floating):
+            full_dtype = input_data_type
+        else:
+            full_dtype = np.float64
+    else:
+        full_dtype = accumulation_dtype
+    full_result = np.full(output_raw_shape, fill_value, dtype=full_dtype)
     full_result[valid_output_index] = result
     result = full_result
 
     if with_uncert:  # Add fill values for uncertainty
-        full_stddev = np.ones(output_raw_shape) * np.nan
-        full_count = np.zeros(output_raw_shape)
+        full_stddev = np.full(output_raw_shape, np.nan, dtype=stddev.dtype)
+        full_count = np.zeros(output_raw_shape, dtype=count.dtype)
         full_stddev[valid_output_index] = stddev
         full_count[valid_output_index] = count
         stddev = full_stddev
@@ -886,6 +1479,461 @@ def get_sample_from_neighbour_info(resample_type, output_shape, data,
         return result
 
 
+def _get_weighted_sample(new_data, index_array, distance_array, input_size,
+                         weight_funcs, fill_value, dtype, with_uncert):
+    """Weighted average of the neighbours of each valid output pixel
+
+    The weights of all neighbours are computed once as an (N, k) array,
+    or (N, k, channels) if the channels have different weight functions,
+    and the neighbour values are gathered in a single indexing operation.
+    """
+
+    is_multi_channel = (new_data.ndim > 1)
+
+    # Out of bounds neighbours are taken from index 0 with zero weight
+    index_mask = (index_array == input_size)
+    new_index_array = np.where(index_mask, 0, index_array)
+
+    # Set out of bounds distance to 1 in order to avoid numerical Inf
+    distance = np.where(index_mask, 1, distance_array).astype(dtype, copy=False)
+
+    # Calculate weights, once per distinct weight function
+    if not is_multi_channel:
+        weight_funcs = [weight_funcs]
+    distinct_funcs = []
+    for weight_func in weight_funcs:
+        if weight_func not in distinct_funcs:
+            distinct_funcs.append(weight_func)
+    if len(distinct_funcs) == 1:
+        weights = np.empty(distance.shape, dtype=dtype)
+        weights[:] = distinct_funcs[0](distance)
+        weights[index_mask] = 0
+    else:
+        weights = np.empty(distance.shape + (len(weight_funcs),), dtype=dtype)
+        for weight_func in distinct_funcs:
+            channel_weights = weight_func(distance)
+            for j, channel_func in enumerate(weight_funcs):
+                if channel_func is weight_func:
+                    weights[:, :, j] = channel_weights
+        weights[index_mask] = 0
+
+    stddev = count = None
+    if with_uncert:
+        result, norm, stddev, count = _get_weighted_stats(
+            new_data.astype(dtype, copy=False), new_index_array, index_mask,
+            weights)
+    else:
+        # Get data of all neighbours, (N, k[, channels])
+        ch_neighbours = new_data.astype(dtype, copy=False)[new_index_array]
+
+        # Aggregate result and norm, summing the products without
+        # temporaries
+        weights_subscripts = 'nkc' if weights.ndim == 3 else 'nk'
+        data_subscripts = 'nkc' if is_multi_channel else 'nk'
+        result_subscripts = 'nc' if is_multi_channel else 'n'
+        norm = weights.sum(axis=1)
+        result = np.einsum(weights_subscripts + ',' + data_subscripts + '->' +
+                           result_subscripts, weights, ch_neighbours)
+        if is_multi_channel and norm.ndim == 1:
+            norm = norm[:, np.newaxis]
+        np.divide(result, norm, out=result, where=(norm > 0))
+    result_valid_index = (norm > 0)
+
+    # Add fill values
+    np.copyto(result, fill_value, casting='unsafe',
+              where=np.invert(result_valid_index))
+
+    return result, stddev, count
+
+
+def _get_weighted_stats(data, index_array, index_mask, weights):
+    """Weighted mean, standard deviation and count in a single pass
+
+    The weighted sums of the neighbour values and of their squares are
+    accumulated together. The values are shifted by the nearest neighbour
+    of each pixel first, which keeps the variance numerically stable.
+    """
+
+    # Get data of all neighbours, (N, k[, channels])
+    ch_neighbours = data[index_array]
+    ch_neighbours -= ch_neighbours[:, :1].copy()
+
+    if weights.ndim == 3:
+        operands = 'nkc,nkc->nc'
+    else:
+        operands = 'nk,nk...->n...'
+    norm = weights.sum(axis=1)
+    norm_sqr = np.einsum(operands, weights, weights)
+    sum_dev = np.einsum(operands, weights, ch_neighbours)
+    ch_neighbours **= 2
+    sum_sq_dev = np.einsum(operands, weights, ch_neighbours)
+    if data.ndim > 1 and norm.ndim == 1:
+        norm = norm[:, np.newaxis]
+        norm_sqr = norm_sqr[:, np.newaxis]
+
+    # Mean and sum of squared deviations from the mean
+    np.divide(sum_dev, norm, out=sum_dev, where=(norm > 0))
+    sum_sq_dev -= sum_dev ** 2 * norm
+    np.maximum(sum_sq_dev, 0, out=sum_sq_dev)
+    mean = sum_dev
+    mean += data[index_array[:, 0]]
+
+    neighbours = index_mask.shape[1]
+    count = np.invert(index_mask).sum(axis=1,
+                                      dtype=np.min_scalar_type(neighbours))
+    if data.ndim > 1:
+        count = count[:, np.newaxis]
+
+    # Calculate final stddev, only defined for more than one neighbour
+    with np.errstate(divide='ignore', invalid='ignore'):
+        stddev = np.sqrt((norm / (norm ** 2 - norm_sqr)) * sum_sq_dev)
+    stddev[np.broadcast_to(count <= 1, stddev.shape)] = np.NaN
+
+    return mean, norm, stddev, count
+
+
+def get_resample_matrix(resample_type, valid_input_index, valid_output_index,
+                        index_array, distance_array=None, weight_funcs=None,
+                        precision=None):
+    """Get the resampling as a sparse matrix based on neighbour info
+
+    The matrix has one row per target pixel and one column per source
+    pixel, so resampling a dataset becomes a single sparse matrix product,
+    see :func:`get_sample_from_resample_matrix`. The matrix can be stored
+    with :func:`scipy.sparse.save_npz` and reused between runs.
+
+    Parameters
+    ----------
+    resample_type : {'nn', 'custom'}
+        'nn': Use nearest neighbour resampling
+        'custom': Resample based on weight_funcs
+    valid_input_index : numpy array
+        valid_input_index from get_neighbour_info
+    valid_output_index : numpy array
+        valid_output_index from get_neighbour_info
+    index_array : numpy array
+        index_array from get_neighbour_info
+    distance_array : numpy array, optional
+        distance_array from get_neighbour_info
+        Not needed for 'nn' resample type
+    weight_funcs : function object, optional
+        Weight function f(dist) used for all channels. Must be supplied
+        when using 'custom' resample type
+    precision : {None, 'float32', 'float64'}, optional
+        Floating point type of the matrix. Defaults to 'float64'
+
+    Returns
+    -------
+    matrix : scipy.sparse.csr_matrix
+        (target_size, source_size) matrix of normalised weights
+    """
+
+    from scipy.sparse import csr_matrix
+
+    valid_types = ('nn', 'custom')
+    if resample_type not in valid_types:
+        raise TypeError('Invalid resampling type: %s' % resample_type)
+
+    dtype = _get_precision_dtype(precision, np.float64)
+    valid_input_index = _unpack_mask(valid_input_index)
+    valid_output_index = _unpack_mask(valid_output_index)
+
+    if index_array.ndim == 1:
+        index_array = index_array[:, np.newaxis]
+        if distance_array is not None:
+            distance_array = distance_array.reshape(index_array.shape)
+    elif resample_type == 'nn':
+        raise ValueError('index_array contains more neighbours than '
+                         'just the nearest')
+
+    input_indices = np.flatnonzero(valid_input_index)
+    output_indices = np.flatnonzero(valid_output_index)
+    input_size = input_indices.size
+    index_mask = (index_array == input_size)
+
+    if resample_type == 'nn' or index_array.shape[1] == 1:
+        weights = np.invert(index_mask).astype(dtype)
+    else:
+        if weight_funcs is None:
+            raise ValueError('weight_funcs must be supplied when using '
+                             'custom resampling')
+        if isinstance(weight_funcs, (list, tuple)):
+            if any(weight_func is not weight_funcs[0]
+                   for weight_func in weight_funcs):
+                raise ValueError('A resample matrix can only be built for '
+                                 'a single weight function')
+            weight_funcs = weight_funcs[0]
+        # Set out of bounds distance to 1 in order to avoid numerical Inf
+        distance = np.where(index_mask, 1, distance_array).astype(dtype)
+        weights = np.empty(distance.shape, dtype=dtype)
+        weights[:] = weight_funcs(distance)
+        weights[index_mask] = 0
+        norm = weights.sum(axis=1)
+        np.divide(weights, norm[:, np.newaxis], out=weights,
+                  where=(norm > 0)[:, np.newaxis])
+
+    keep = (weights != 0)
+    rows = np.broadcast_to(output_indices[:, np.newaxis], keep.shape)[keep]
+    cols = input_indices[index_array[keep]]
+    return csr_matrix((weights[keep], (rows, cols)),
+                      shape=(valid_output_index.size, valid_input_index.size))
+
+
+def get_sample_from_resample_matrix(matrix, output_shape, data, fill_value=0):
+    """Resamples data with a matrix from :func:`get_resample_matrix`
+
+    Parameters
+    ----------
+    matrix : scipy.sparse matrix
+        Resample matrix from get_resample_matrix
+    output_shape : (int, int)
+        Shape of output as (rows, cols)
+    data : numpy array
+        1d array of single channel data points or
+        (source_size, k) array of k channels of datapoints
+    fill_value : int or None, optional
+        Set undetermined pixels to this value.
+        If fill_value is None a masked array is returned
+        with undetermined pixels masked
+
+    Returns
+    -------
+    result : numpy array
+        Source data resampled to target geometry. If the matrix only
+        selects source pixels, as for nearest neighbour resampling, the
+        data type of the input is kept
+    """
+
+    source_size = matrix.shape[1]
+    if data.ndim > 2 and data.shape[0] * data.shape[1] == source_size:
+        data = data.reshape(data.shape[0] * data.shape[1], data.shape[2])
+    elif data.shape[0] != source_size:
+        data = data.ravel()
+
+    if data.shape[0] != source_size:
+        raise ValueError('Mismatch between resample matrix and dataset')
+
+    if not isinstance(fill_value, (long, int, float)) and fill_value is not None:
+        raise TypeError('fill_value must be number or None')
+
+    output_shape = tuple(output_shape)
+    if data.ndim > 1:
+        output_shape += (data.shape[1],)
+
+    result = matrix.dot(np.ma.getdata(data))
+    is_selection = (matrix.nnz == np.count_nonzero(np.diff(matrix.indptr)) and
+                    np.all(matrix.data == 1))
+    if is_selection:
+        # Nearest neighbour resampling should conserve data type
+        result = result.astype(data.dtype)
+
+    invalid_index = (np.diff(matrix.indptr) == 0)
+    if data.ndim > 1:
+        invalid_index = np.broadcast_to(invalid_index[:, np.newaxis],
+                                        result.shape)
+    result[invalid_index] = 0 if fill_value is None else fill_value
+
+    mask = None
+    if np.ma.is_masked(data):
+        # All pixels affected by masked pixels are masked out
+        data_mask = np.ma.getmaskarray(data).astype(matrix.dtype)
+        mask = (matrix.dot(data_mask) != 0)
+    if fill_value is None:
+        mask = invalid_index if mask is None else (mask | invalid_index)
+    if mask is not None:
+        result = np.ma.array(result, mask=mask)
+
+    return result.reshape(output_shape)
+
+
+class IncrementalResampler(object):
+    """Resamples a swath block by block while it is being received
+
+    The `neighbours` nearest source pixels of every target pixel found so
+    far are kept together with their distances. Every new block of
+    scanlines gets its own kd-tree, which is only queried for the target
+    pixels close enough to the block to be affected, and the result is
+    merged with the stored neighbours. Once all blocks have been added the
+    result is the same as resampling the complete swath at once.
+
+    Parameters
+    ----------
+    target_geo_def : object
+        Geometry definition of target
+    radius_of_influence : float
+        Cut off distance in meters
+    neighbours : int, optional
+        The number of neigbours to consider for each grid point
+    epsilon : float, optional
+        Allowed uncertainty in meters. Increasing uncertainty
+        reduces execution time
+    nprocs : int, optional
+        Number of processor cores to be used for the target coordinates
+    """
+
+    def __init__(self, target_geo_def, radius_of_influence, neighbours=1,
+                 epsilon=0, nprocs=1):
+        if not isinstance(target_geo_def, geometry.BaseDefinition):
+            raise TypeError('target_geo_def must be of geometry type')
+        elif not isinstance(radius_of_influence, (long, int, float)):
+            raise TypeError('radius_of_influence must be number')
+        elif not isinstance(neighbours, int):
+            raise TypeError('neighbours must be integer')
+
+        self.target_geo_def = target_geo_def
+        self.radius_of_influence = radius_of_influence
+        self.neighbours = neighbours
+        self.epsilon = epsilon
+
+        target_lons, target_lats = target_geo_def.get_lonlats(nprocs=nprocs)
+        target_lons = np.asanyarray(target_lons).ravel()
+        target_lats = np.asanyarray(target_lats).ravel()
+        self.valid_output_index = _get_valid_output_index(
+            None, target_geo_def, target_lons, target_lats, False,
+            radius_of_influence)
+        self._target_index = np.flatnonzero(self.valid_output_index)
+        self._target_coords = _spatial_mp.Cartesian().transform_lonlats(
+            target_lons[self.valid_output_index],
+            target_lats[self.valid_output_index], dtype=np.float64)
+
+        self.distance_array = np.full((self._target_index.size, neighbours),
+                                      np.inf)
+        self._values = None
+        self._mask = None
+
+    def add_block(self, source_geo_def, data):
+        """Add a block of source data and update the affected target pixels
+
+        Parameters
+        ----------
+        source_geo_def : object
+            Geometry definition of the new block of scanlines
+        data : numpy array
+            Data of the block, single channel or (source_geo_def.shape, k)
+            array of k channels. The dtype and number of channels must be
+            the same for all blocks
+
+        Returns
+        -------
+        index : numpy array
+            Flat indices of the target pixels updated by the block
+        """
+
+        valid_input_index, source_lons, source_lats = \
+            _get_valid_input_index(source_geo_def, self.target_geo_def,
+                                   False, self.radius_of_influence)
+
+        if data.ndim > 2 and data.shape[0] * data.shape[1] == valid_input_index.size:
+            data = data.reshape(data.shape[0] * data.shape[1], data.shape[2])
+        elif data.shape[0] != valid_input_index.size:
+            data = data.ravel()
+
+        if valid_input_index.size != data.shape[0]:
+            raise ValueError('Mismatch between geometry and dataset')
+
+        if self._values is None:
+            self._values = np.zeros(self.distance_array.shape + data.shape[1:],
+                                    dtype=data.dtype)
+        elif self._values.shape[2:] != data.shape[1:]:
+            raise ValueError('Number of channels differs from the '
+                             'previous blocks')
+        if np.ma.is_masked(data) and self._mask is None:
+            self._mask = np.zeros(self._values.shape, dtype=np.bool)
+
+        source_coords = _spatial_mp.Cartesian().transform_lonlats(
+            source_lons[valid_input_index], source_lats[valid_input_index])
+        if source_coords.size == 0:
+            return self._target_index[:0]
+
+        # Only target pixels inside the bounding box of the block can be
+        # affected by it
+        lower = source_coords.min(axis=0) - self.radius_of_influence
+        upper = source_coords.max(axis=0) + self.radius_of_influence
+        affected = np.flatnonzero(np.all((self._target_coords >= lower) &
+                                         (self._target_coords <= upper),
+                                         axis=1))
+        if affected.size == 0:
+            return self._target_index[:0]
+
+        resample_kdtree = KDTree(np.asarray(source_coords, dtype=np.float64))
+        distance_array, index_array = resample_kdtree.query(
+            self._target_coords[affected], k=self.neighbours,
+            eps=self.epsilon, distance_upper_bound=self.radius_of_influence)
+        distance_array = distance_array.reshape(affected.size, self.neighbours)
+        index_array = index_array.reshape(affected.size, self.neighbours)
+        index_mask = (index_array == source_coords.shape[0])
+        index_array[index_mask] = 0
+        distance_array[index_mask] = np.inf
+
+        # Merge the new neighbours with the stored ones, keeping the nearest
+        distances = np.hstack((self.distance_array[affected], distance_array))
+        order = np.argsort(distances, axis=1, kind='mergesort')
+        order = order[:, :self.neighbours]
+        rows = np.arange(affected.size)[:, np.newaxis]
+        self.distance_array[affected] = distances[rows, order]
+
+        new_data = data[valid_input_index]
+        values = np.concatenate((self._values[affected],
+                                 np.ma.getdata(new_data)[index_array]), axis=1)
+        self._values[affected] = values[rows, order]
+        if self._mask is not None:
+            mask = np.concatenate((self._mask[affected],
+                                   np.ma.getmaskarray(new_data)[index_array]),
+                                  axis=1)
+            self._mask[affected] = mask[rows, order]
+
+        updated = np.any(order >= self.neighbours, axis=1)
+        return self._target_index[affected[updated]]
+
+    def get_sample(self, weight_funcs=None, fill_value=0, with_uncert=False):
+        """Get the resampled data of the blocks added so far
+
+        Parameters
+        ----------
+        weight_funcs : list of function objects or function object, optional
+            Weight functions f(dist) used for the weighting of each
+            channel, see :func:`resample_custom`. Must be supplied when
+            more than one neighbour is used
+        fill_value : int or None, optional
+            Set undetermined pixels to this value.
+            If fill_value is None a masked array is returned
+            with undetermined pixels masked
+        with_uncert : bool, optional
+            Calculate uncertainty estimates
+
+        Returns
+        -------
+        result : numpy array
+            Source data resampled to target geometry
+        """
+
+        if self._values is None:
+            raise EmptyResult('No data blocks have been added')
+
+        neighbours_size = self.distance_array.size
+        data = self._values.reshape((neighbours_size, ) +
+                                    self._values.shape[2:])
+        if self._mask is not None:
+            data = np.ma.array(data, mask=self._mask.reshape(data.shape))
+        index_array = np.arange(neighbours_size).reshape(
+            self.distance_array.shape)
+        index_array[np.isinf(self.distance_array)] = neighbours_size
+        distance_array = self.distance_array
+        if self.neighbours == 1:
+            resample_type = 'nn'
+            index_array = index_array.ravel()
+            distance_array = distance_array.ravel()
+        else:
+            resample_type = 'custom'
+
+        return get_sample_from_neighbour_info(
+            resample_type, self.target_geo_def.shape, data,
+            np.ones(neighbours_size, dtype=np.bool), self.valid_output_index,
+            index_array, distance_array=distance_array,
+            weight_funcs=weight_funcs, fill_value=fill_value,
+            with_uncert=with_uncert)
+
+
 def lonlat2xyz(lons, lats):
 
     R = 6370997.0
@@ -907,6 +1955,34 @@ def query_no_distance(target_lons, target_lats, valid_output_index,
           for `da.atop` arguments to work.
 
     """
+    res_ia, _ = _query_chunk(target_lons, target_lats, valid_output_index,
+                             mask, valid_input_index, neighbours, epsilon,
+                             radius, kdtree)
+    return res_ia
+
+
+def query_with_distance(target_lons, target_lats, valid_output_index,
+                        mask=None, valid_input_index=None,
+                        neighbours=None, epsilon=None, radius=None,
+                        kdtree=None):
+    """Query the kdtree, returning both indices and distances.
+
+    The indices and distances are stacked along a last axis of size 2, as
+    `da.atop` can only return a single array.
+
+    NOTE: Dask array arguments must always come before other keyword arguments
+          for `da.atop` arguments to work.
+
+    """
+    res_ia, res_da = _query_chunk(target_lons, target_lats,
+                                  valid_output_index, mask, valid_input_index,
+                                  neighbours, epsilon, radius, kdtree)
+    return np.stack((res_ia, res_da), axis=-1)
+
+
+def _query_chunk(target_lons, target_lats, valid_output_index, mask,
+                 valid_input_index, neighbours, epsilon, radius, kdtree):
+    """Query the kdtree for a chunk of target coordinates."""
     voi = valid_output_index
     shape = voi.shape + (neighbours,)
     voir = voi.ravel()
@@ -916,8 +1992,10 @@ def query_no_distance(target_lons, target_lats, valid_output_index,
     target_lats_valid = target_lats.ravel()[voir]
 
     coords = lonlat2xyz(target_lons_valid, target_lats_valid)
+    # pykdtree requires query points have same data type as kdtree.
+    coords = coords.compute().astype(kdtree.data.dtype, copy=False)
     distance_array, index_array = kdtree.query(
-        coords.compute(),
+        coords,
         k=neighbours,
         eps=epsilon,
         distance_upper_bound=radius,
@@ -925,6 +2003,7 @@ def query_no_distance(target_lons, target_lats, valid_output_index,
 
     if index_array.ndim == 1:
         index_array = index_array[:, None]
+        distance_array = distance_array[:, None]
 
     # KDTree query returns out-of-bounds neighbors as `len(arr)`
     # which is an invalid index, we mask those out so -1 represents
@@ -934,20 +2013,30 @@ def query_no_distance(target_lons, target_lats, valid_output_index,
     # there are as many Trues in voi as rows in index_array
     good_pixels = index_array < kdtree.n
     res_ia = np.empty(shape, dtype=np.int)
+    res_da = np.empty(shape, dtype=distance_array.dtype)
     mask = np.zeros(shape, dtype=np.bool)
     mask[voi, :] = good_pixels
     res_ia[mask] = index_array[good_pixels]
     res_ia[~mask] = -1
-    return res_ia
+    res_da[mask] = distance_array[good_pixels]
+    res_da[~mask] = np.inf
+    return res_ia, res_da
 
 
 class XArrayResamplerNN(object):
+    # Delayed kd-trees shared between instances, keyed by the source geometry
+    _kdtree_cache = OrderedDict()
+    _kdtree_cache_lock = threading.Lock()
+    #: Number of source geometries to keep kd-trees for
+    kdtree_cache_size = 4
+
     def __init__(self,
                  source_geo_def,
                  target_geo_def,
                  radius_of_influence,
                  neighbours=1,
-                 epsilon=0):
+                 epsilon=0,
+                 precision=None):
         """
 
         Parameters
@@ -960,10 +2049,15 @@ class XArrayResamplerNN(object):
             Cut off distance in meters
         neighbours : int, optional
             The number of neigbours to consider for each grid point.
-            Default 1. Currently 1 is the only supported number.
+            Default 1. More neighbours require weight functions when
+            getting the sample.
         epsilon : float, optional
             Allowed uncertainty in meters. Increasing uncertainty
             reduces execution time
+        precision : {None, 'float32', 'float64'}, optional
+            Floating point type of the cartesian coordinates and the
+            kd-tree. 'float32' halves the memory needed. Defaults to
+            'float64'
 
         """
         if DataArray is None:
@@ -974,28 +2068,78 @@ class XArrayResamplerNN(object):
         self.index_array = None
         self.distance_array = None
         self.delayed_kdtree = None
+        self._kdtree_chunks = None
+        self._source_ranges = {}
         self.neighbours = neighbours
         self.epsilon = epsilon
+        self.precision = _get_precision_dtype(precision, np.float64)
         self.source_geo_def = source_geo_def
         self.target_geo_def = target_geo_def
         self.radius_of_influence = radius_of_influence
         assert (self.target_geo_def.ndim == 2), \
             "Target area definition must be 2 dimensions"
 
-    def _create_resample_kdtree(self, chunks=CHUNK_SIZE):
-        """Set up kd tree on input"""
+    def _create_resample_kdtree(self, chunks=CHUNK_SIZE, name=None):
+        """Set up kd tree on input, with dask key `name` if given"""
         source_lons, source_lats = self.source_geo_def.get_lonlats_dask(
             chunks=chunks)
+        source_lons = source_lons.astype(self.precision, copy=False)
+        source_lats = source_lats.astype(self.precision, copy=False)
         valid_input_idx = ((source_lons >= -180) & (source_lons <= 180) &
                            (source_lats <= 90) & (source_lats >= -90))
         input_coords = lonlat2xyz(source_lons, source_lats)
         input_coords = input_coords[valid_input_idx.ravel(), :]
 
         # Build kd-tree on input
-        input_coords = input_coords.astype(np.float)
-        delayed_kdtree = dask.delayed(KDTree, pure=True)(input_coords)
+        input_coords = input_coords.astype(self.precision, copy=False)
+        delayed_kdtree = dask.delayed(KDTree, pure=True)(input_coords,
+                                                         dask_key_name=name)
         return valid_input_idx, delayed_kdtree
 
+    def _get_kdtree_key(self, chunks):
+        """Get the key of the kd-tree in the cache, None if not cacheable."""
+        the_hash = hashlib.sha1()
+        try:
+            the_hash = self.source_geo_def.update_hash(the_hash)
+        except AttributeError:
+            return None
+        the_hash.update(repr((chunks, self.precision.name)).encode('utf-8'))
+        return the_hash.hexdigest()
+
+    def _get_resample_kdtree(self, chunks=CHUNK_SIZE):
+        """Get the kd-tree on input, setting it up only once.
+
+        The delayed kd-tree is kept and reused for later queries with other
+        masks, by this and by other resamplers with the same source
+        geometry. Its dask key is derived from the hash of the source
+        geometry, so queries computed together build the tree only once.
+        Nothing is computed here.
+        """
+        if self.delayed_kdtree is not None and self._kdtree_chunks == chunks:
+            return self.valid_input_index, self.delayed_kdtree
+
+        cache = XArrayResamplerNN._kdtree_cache
+        key = self._get_kdtree_key(chunks)
+        with XArrayResamplerNN._kdtree_cache_lock:
+            # Mark as recently used
+            kdtree_info = cache.pop(key, None)
+            if kdtree_info is None:
+                name = None if key is None else 'resample-kdtree-' + key
+                kdtree_info = self._create_resample_kdtree(chunks=chunks,
+                                                           name=name)
+            if key is not None:
+                cache[key] = kdtree_info
+                while len(cache) > self.kdtree_cache_size:
+                    cache.popitem(last=False)
+        self._kdtree_chunks = chunks
+        return kdtree_info
+
+    @classmethod
+    def clear_kdtree_cache(cls):
+        """Release the kd-trees shared between resamplers."""
+        with cls._kdtree_cache_lock:
+            cls._kdtree_cache.clear()
+
     def query_resample_kdtree(self,
                               resample_kdtree,
                               tlons,
@@ -1011,21 +2155,38 @@ class XArrayResamplerNN(object):
             args = (mask, dims, self.valid_input_index, dims)
         # res.shape = rows, cols, neighbors
         # j=rows, i=cols, k=neighbors, m=source rows, n=source cols
-        res = da.atop(query_no_distance, 'jik', tlons, 'ji', tlats, 'ji',
+        if self.neighbours == 1:
+            res = da.atop(query_no_distance, 'jik', tlons, 'ji', tlats, 'ji',
+                          valid_oi, 'ji', *args, kdtree=resample_kdtree,
+                          neighbours=self.neighbours, epsilon=self.epsilon,
+                          radius=self.radius_of_influence, dtype=np.int,
+                          new_axes={'k': self.neighbours}, concatenate=True)
+            return res, None
+
+        # Distances are needed for the weighting, l=index or distance
+        res = da.atop(query_with_distance, 'jikl', tlons, 'ji', tlats, 'ji',
                       valid_oi, 'ji', *args, kdtree=resample_kdtree,
                       neighbours=self.neighbours, epsilon=self.epsilon,
-                      radius=self.radius_of_influence, dtype=np.int,
-                      new_axes={'k': self.neighbours}, concatenate=True)
-        return res, None
+                      radius=self.radius_of_influence, dtype=np.float64,
+                      new_axes={'k': self.neighbours, 'l': 2},
+                      concatenate=True)
+        index_array = res[:, :, :, 0].astype(np.int)
+        distance_array = res[:, :, :, 1].astype(self.precision)
+        return index_array, distance_array
 
     def get_neighbour_info(self, mask=None):
         """Return neighbour info.
 
+        Nothing is computed here: the kd-tree on the source, reused from the
+        trees shared between resamplers if possible, and the query stay
+        lazy.
+
         Returns
         -------
         (valid_input_index, valid_output_index,
-        index_array, distance_array) : tuple of numpy arrays
-            Neighbour resampling info
+        index_array, distance_array) : tuple of dask arrays
+            Neighbour resampling info. The distances are only calculated
+            for more than one neighbour, otherwise `distance_array` is None
 
         """
         if self.source_geo_def.size < self.neighbours:
@@ -1034,12 +2195,14 @@ class XArrayResamplerNN(object):
 
         # Create kd-tree
         chunks = mask.chunks if mask is not None else CHUNK_SIZE
-        valid_input_idx, resample_kdtree = self._create_resample_kdtree(
+        valid_input_idx, resample_kdtree = self._get_resample_kdtree(
             chunks=chunks)
         self.valid_input_index = valid_input_idx
         self.delayed_kdtree = resample_kdtree
 
         target_lons, target_lats = self.target_geo_def.get_lonlats_dask()
+        target_lons = target_lons.astype(self.precision, copy=False)
+        target_lats = target_lats.astype(self.precision, copy=False)
         valid_output_idx = ((target_lons >= -180) & (target_lons <= 180) &
                             (target_lats <= 90) & (target_lats >= -90))
 
@@ -1052,13 +2215,109 @@ class XArrayResamplerNN(object):
 
         self.valid_output_index, self.index_array = valid_output_idx, index_arr
         self.distance_array = distance_arr
+        # Source ranges of the target chunks, by source chunks
+        self._source_ranges = {}
 
         return (self.valid_input_index,
                 self.valid_output_index,
                 self.index_array,
                 self.distance_array)
 
-    def get_sample_from_neighbour_info(self, data, fill_value=np.nan):
+    def _get_source_ranges(self, src_chunks):
+        """Get the source offsets and index ranges of the target chunks.
+
+        Which source blocks a target chunk depends on is part of the graph,
+        so the range of source indices used by every target chunk has to be
+        known while the graph is built. The neighbour info is computed and
+        persisted for this the first time it is needed, and kept on the
+        resampler along with the ranges: sampling more data with the same
+        neighbour info does not query the kd-tree again.
+
+        Returns the offsets of the source blocks in the valid source
+        pixels, which the indices refer to, and the (first, last) valid
+        index of every target chunk.
+        """
+        ranges = self._source_ranges.get(src_chunks)
+        if ranges is not None:
+            return ranges
+        if self.distance_array is None:
+            self.valid_input_index, self.index_array = dask.persist(
+                self.valid_input_index, self.index_array)
+        else:
+            (self.valid_input_index, self.index_array,
+             self.distance_array) = dask.persist(
+                self.valid_input_index, self.index_array, self.distance_array)
+        vii = self.valid_input_index.ravel().rechunk((src_chunks, ))
+        index_blocks = self.index_array.to_delayed().reshape(
+            self.index_array.numblocks[:2])
+        valid_counts = [dask.delayed(np.count_nonzero)(block)
+                        for block in vii.to_delayed()]
+        index_ranges = [dask.delayed(_get_index_range)(block)
+                        for block in index_blocks.ravel()]
+        valid_counts, index_ranges = dask.compute(valid_counts, index_ranges)
+        index_ranges = np.array(index_ranges).reshape(index_blocks.shape + (2, ))
+        valid_offsets = np.concatenate(([0], np.cumsum(valid_counts)))
+        self._source_ranges[src_chunks] = valid_offsets, index_ranges
+        return valid_offsets, index_ranges
+
+    def _get_sample_per_target_chunk(self, kernel, new_data, dtype,
+                                     **kwargs):
+        """Run `kernel` for every target chunk on the source it needs.
+
+        Only the source blocks covering the range of source indices used by
+        a target chunk are passed to the task of the chunk. The memory of a
+        task thus scales with the chunk size instead of with the size of the
+        source data. The neighbour info is computed the first time this is
+        called (see `_get_source_ranges`), the kernels and the source data
+        stay lazy.
+        """
+        geo_axis = kwargs['ia_slices'].index(None)
+        src_chunks = new_data.chunks[geo_axis]
+        valid_offsets, index_ranges = self._get_source_ranges(src_chunks)
+        vii = self.valid_input_index.ravel().rechunk((src_chunks, ))
+        index_array = self.index_array
+        distance_array = self.distance_array
+        if self.neighbours == 1:
+            # Convert from multiple neighbor shape to 1 neighbor
+            index_array = index_array[:, :, 0]
+        index_blocks = index_array.to_delayed().reshape(
+            index_array.numblocks[:2])
+        if distance_array is not None:
+            distance_blocks = distance_array.to_delayed().reshape(
+                distance_array.numblocks[:2])
+        src_offsets = np.concatenate(([0], np.cumsum(src_chunks)))
+
+        y_axis = geo_axis
+        x_axis = geo_axis + 1
+        res_rows = []
+        for row, rows in enumerate(index_array.chunks[0]):
+            res_row = []
+            for col, cols in enumerate(index_array.chunks[1]):
+                first_index, last_index = index_ranges[row, col]
+                if last_index < 0:
+                    # No valid neighbours, use the first block as dummy
+                    first, last = 0, 0
+                else:
+                    first = np.searchsorted(valid_offsets, first_index,
+                                            side='right') - 1
+                    last = np.searchsorted(valid_offsets, last_index,
+                                           side='right') - 1
+                src_slice = slice(src_offsets[first], src_offsets[last + 1])
+                data_slices = ((slice(None), ) * geo_axis + (src_slice, ))
+                args = [index_blocks[row, col]]
+                if distance_array is not None:
+                    args.append(distance_blocks[row, col])
+                args.extend((vii[src_slice], new_data[data_slices]))
+                shape = list(new_data.shape)
+                shape[geo_axis:geo_axis + 1] = [rows, cols]
+                block = dask.delayed(_run_on_source_range, pure=True)(
+                    kernel, valid_offsets[first], *args, **kwargs)
+                res_row.append(da.from_delayed(block, shape, dtype=dtype))
+            res_rows.append(da.concatenate(res_row, axis=x_axis))
+        return da.concatenate(res_rows, axis=y_axis)
+
+    def get_sample_from_neighbour_info(self, data, fill_value=np.nan,
+                                       weight_funcs=None):
         """Get the pixels matching the target area.
 
         This method should work for any dimensionality of the provided data
@@ -1067,12 +2326,17 @@ class XArrayResamplerNN(object):
         objects the corresponding dimensions in the data should be
         ``('y', 'x')``.
 
-        This method also attempts to preserve chunk sizes of dask arrays,
-        but does require loading/sharing the fully computed source data before
-        it can actually compute the values to write to the destination array.
-        This can result in large memory usage for large source data arrays,
-        but is a necessary evil until fancier indexing is supported by dask
-        and/or pykdtree.
+        This method also attempts to preserve chunk sizes of dask arrays.
+        Every target chunk is computed from only the source blocks spanning
+        the source indices of its neighbours, so memory scales with the
+        target chunk size and the source area it covers.
+
+        The returned array is not fully lazy: finding these source blocks
+        computes and persists the neighbour info (the kd-tree query) the
+        first time this method is called after `get_neighbour_info`. The
+        persisted neighbour info is kept, so sampling several datasets
+        queries the kd-tree only once. The source data itself is only
+        loaded when the result is computed.
 
         Args:
             data (dask.array.Array): Source data pixels to sample
@@ -1082,22 +2346,26 @@ class XArrayResamplerNN(object):
                                 for that integer type is used. Otherwise,
                                 NaN is used and can be detected in the result
                                 with ``res.isnull()``.
+            weight_funcs (function): Weight function f(dist) used to average
+                                     the neighbours when more than one
+                                     neighbour is used, for instance
+                                     ``lambda r: np.exp(-r ** 2 / sigma ** 2)``
+                                     for gaussian weighting. NaN source
+                                     values are left out of the average and
+                                     the result is always floating point.
 
         """
-        if fill_value is not None and np.isnan(fill_value) and \
-                np.issubdtype(data.dtype, np.integer):
+        is_weighted = (self.neighbours > 1)
+        if is_weighted and weight_funcs is None:
+            raise ValueError('weight_funcs must be supplied when using '
+                             'more than one neighbour')
+
+        if not is_weighted and fill_value is not None and \
+                np.isnan(fill_value) and np.issubdtype(data.dtype, np.integer):
             fill_value = _get_fill_mask_value(data.dtype)
             logger.warning("Fill value incompatible with integer data "
                            "using {:d} instead.".format(fill_value))
 
-        # Convert back to 1 neighbor
-        if self.neighbours > 1:
-            raise NotImplementedError("Nearest neighbor resampling can not "
-                                      "handle more than 1 neighbor yet.")
-        # Convert from multiple neighbor shape to 1 neighbor
-        ia = self.index_array[:, :, 0]
-        vii = self.valid_input_index
-
         if isinstance(self.source_geo_def, geometry.SwathDefinition):
             # could be 1D or 2D
             src_geo_dims = self.source_geo_def.lons.dims
@@ -1137,67 +2405,36 @@ class XArrayResamplerNN(object):
         ia_slices = []
         # whether we have seen the geo dims in our analysis
         geo_handled = False
-        # dimension indexes for da.atop
-        src_adims = []
-        flat_adim = []
-        # map source dimension name to dimension number for da.atop
-        src_dim_to_ind = {}
-        # destination array dimension indexes for da.atop
+        # destination array dimension names
         dst_dims = []
-        for i, dim in enumerate(data.dims):
-            src_dim_to_ind[dim] = i
+        for dim in data.dims:
             if dim in src_geo_dims and not geo_handled:
                 flat_src_shape.append(-1)
                 vii_slices.append(None)  # mark for replacement
                 ia_slices.append(None)  # mark for replacement
-                flat_adim.append(i)
-                src_adims.append(i)
                 dst_dims.extend(dst_geo_dims)
                 geo_handled = True
             elif dim not in src_geo_dims:
                 flat_src_shape.append(data.sizes[dim])
                 vii_slices.append(slice(None))
                 ia_slices.append(slice(None))
-                src_adims.append(i)
                 dst_dims.append(dim)
-        # map destination dimension names to atop dimension indexes
-        dst_dim_to_ind = src_dim_to_ind.copy()
-        dst_dim_to_ind['y'] = i + 1
-        dst_dim_to_ind['x'] = i + 2
-        # FUTURE: when we allow more than one neighbor
-        # neighbors_dim = i + 3
-
-        def _my_index(index_arr, vii, data_arr, vii_slices=None,
-                      ia_slices=None, fill_value=np.nan):
-            vii_slices = tuple(
-                x if x is not None else vii.ravel() for x in vii_slices)
-            mask_slices = tuple(
-                x if x is not None else (index_arr == -1) for x in ia_slices)
-            ia_slices = tuple(
-                x if x is not None else index_arr for x in ia_slices)
-            res = data_arr[vii_slices][ia_slices]
-            res[mask_slices] = fill_value
-            return res
 
         new_data = data.data.reshape(flat_src_shape)
-        vii = vii.ravel()
-        dst_adims = [dst_dim_to_ind[dim] for dim in dst_dims]
-        ia_adims = [dst_dim_to_ind[dim] for dim in dst_geo_dims]
-        # FUTURE: when we allow more than one neighbor add neighbors dimension
-        # dst_adims.append(neighbors_dim)
-        # ia_adims.append(neighbors_dim)
-        # FUTURE: when we allow more than one neighbor we need to add
-        #         the new axis to atop:
-        #         `new_axes={neighbor_dim: self.neighbors}`
         # FUTURE: if/when dask can handle index arrays that are dask arrays
-        #         then we can avoid all of this complicated atop stuff
-        res = da.atop(_my_index, dst_adims,
-                      ia, ia_adims,
-                      vii, flat_adim,
-                      new_data, src_adims,
-                      vii_slices=vii_slices, ia_slices=ia_slices,
-                      fill_value=fill_value,
-                      dtype=new_data.dtype, concatenate=True)
+        #         then we can avoid all of this complicated chunk handling
+        if is_weighted:
+            # The kernel computes in the declared dtype of the blocks
+            kernel = partial(_get_weighted_chunk, dtype=self.precision)
+            res = self._get_sample_per_target_chunk(
+                kernel, new_data, self.precision, vii_slices=vii_slices,
+                ia_slices=ia_slices, fill_value=fill_value,
+                weight_funcs=weight_funcs)
+        else:
+            res = self._get_sample_per_target_chunk(
+                _get_nearest_chunk, new_data, new_data.dtype,
+                vii_slices=vii_slices, ia_slices=ia_slices,
+                fill_value=fill_value)
         res = DataArray(res, dims=dst_dims, coords=coords,
                         attrs=data.attrs.copy())
         res.attrs['_FillValue'] = fill_value
@@ -1207,6 +2444,95 @@ class XArrayResamplerNN(object):
         return res
 
 
+def _get_index_range(index_arr):
+    """Get the lowest and highest valid index, or -1 if there are none."""
+    valid = index_arr[index_arr >= 0]
+    if valid.size == 0:
+        return -1, -1
+    return valid.min(), valid.max()
+
+
+def _run_on_source_range(kernel, offset, index_arr, *args, **kwargs):
+    """Run `kernel` on a range of the source starting at valid index `offset`."""
+    index_arr = np.where(index_arr >= 0, index_arr - offset, -1)
+    return kernel(index_arr, *args, **kwargs)
+
+
+def _get_nearest_chunk(index_arr, vii, data_arr, vii_slices=None,
+                       ia_slices=None, fill_value=np.nan):
+    """Get the nearest neighbours of a chunk of target pixels."""
+    vii_slices = tuple(
+        x if x is not None else vii.ravel() for x in vii_slices)
+    mask_slices = tuple(
+        x if x is not None else (index_arr == -1) for x in ia_slices)
+    ia_slices = tuple(
+        x if x is not None else index_arr for x in ia_slices)
+    res = data_arr[vii_slices][ia_slices]
+    res[mask_slices] = fill_value
+    return res
+
+
+def _get_weighted_chunk(index_arr, distance_arr, vii, data_arr,
+                        vii_slices=None, ia_slices=None, fill_value=np.nan,
+                        weight_funcs=None, dtype=np.float64):
+    """Weighted average of the neighbours of a chunk of target pixels.
+
+    `index_arr` and `distance_arr` are (rows, cols, neighbours) arrays,
+    invalid neighbours have index -1. The neighbours replace the flattened
+    geolocation dimension of `data_arr`, marked with None in the slices.
+    """
+    geo_axis = ia_slices.index(None)
+    neighbour_axis = geo_axis + 2
+    vii_slices = tuple(
+        x if x is not None else vii.ravel() for x in vii_slices)
+    invalid = (index_arr == -1)
+    ia_slices = tuple(
+        x if x is not None else np.where(invalid, 0, index_arr)
+        for x in ia_slices)
+    values = data_arr[vii_slices][ia_slices].astype(dtype)
+
+    # Set out of bounds distance to 1 in order to avoid numerical Inf
+    weights = np.empty(index_arr.shape, dtype=dtype)
+    weights[:] = weight_funcs(np.where(invalid, 1, distance_arr))
+    weights[invalid] = 0
+    weights = weights.reshape((1, ) * geo_axis + weights.shape +
+                              (1, ) * (values.ndim - neighbour_axis - 1))
+    weights = np.where(np.isnan(values), 0, weights)
+    values[np.isnan(values)] = 0
+
+    norm = weights.sum(axis=neighbour_axis)
+    values *= weights
+    res = values.sum(axis=neighbour_axis)
+    valid = (norm > 0)
+    np.divide(res, norm, out=res, where=valid)
+    res[~valid] = fill_value
+    return res
+
+
+def _get_precision_dtype(precision, default=None):
+    """Return the floating point dtype of `precision`, or `default`"""
+    if precision is None:
+        return default if default is None else np.dtype(default)
+    dtype = np.dtype(precision)
+    if dtype not in (np.float32, np.float64):
+        raise ValueError('precision must be float32 or float64')
+    return dtype
+
+
+def _get_distance_dtype(distance_precision, radius_of_influence):
+    """Return the floating point dtype of the distances, or None"""
+    if distance_precision is None:
+        return None
+    dtype = np.dtype(distance_precision)
+    if dtype not in (np.float16, np.float32, np.float64):
+        raise ValueError('distance_precision must be float16, float32 or '
+                         'float64')
+    if radius_of_influence > np.finfo(dtype).max:
+        raise ValueError('radius_of_influence too large for %s distances' %
+                         dtype.name)
+    return dtype
+
+
 def _get_fill_mask_value(data_dtype):
     """Return the maximum value of dtype."""
     if issubclass(data_dtype.type, np.floating):
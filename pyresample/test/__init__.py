@@ -37,6 +37,9 @@ from pyresample.test import (
     test_ewa_fornav,
     test_bilinear,
     test_data_reduce,
+    test_caching,
+    test_instrumentation,
+    test_spatial_mp,
 )
 
 import unittest
@@ -60,6 +63,9 @@ def suite():
     mysuite.addTests(test_ewa_fornav.suite())
     mysuite.addTests(test_bilinear.suite())
     mysuite.addTests(test_data_reduce.suite())
+    mysuite.addTests(test_caching.suite())
+    mysuite.addTests(test_instrumentation.suite())
+    mysuite.addTests(test_spatial_mp.suite())
     return mysuite
 
 
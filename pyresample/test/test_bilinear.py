@@ -159,6 +159,22 @@ class Test(unittest.TestCase):
         self.assertTrue(out_x.all())
         self.assertTrue(out_y.all())
 
+    def test_get_output_xy_rectilinear(self):
+        target_def = geometry.AreaDefinition('latlong', 'latlong', 'latlong',
+                                             {'proj': 'latlong',
+                                              'ellps': 'WGS84'},
+                                             8, 6, [170, 60, 190, 95])
+        proj = Proj(target_def.proj_str)
+        out_x, out_y = bil._get_output_xy(target_def, proj)
+        lons, lats = np.array(target_def.get_lonlats())
+        lons, lats = bil._mask_coordinates(lons, lats)
+        expected = proj(lons, lats)
+        # Both the longitudes east of 180 and the latitudes north of 90
+        # are invalid
+        self.assertTrue(np.isnan(lons).any())
+        np.testing.assert_array_equal(out_x, expected[0])
+        np.testing.assert_array_equal(out_y, expected[1])
+
     def test_get_input_xy(self):
         proj = Proj(self.target_def.proj_str)
         in_x, in_y = bil._get_output_xy(self.swath_def, proj)
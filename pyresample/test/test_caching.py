@@ -0,0 +1,294 @@
+"""Test the caching of resampling information."""
+
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+
+from pyresample import caching, geometry, kd_tree
+from pyresample.caching import CoordinateCache, NeighbourInfoCache
+
+if sys.version_info < (2, 7):
+    import unittest2 as unittest
+else:
+    import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    # separate mock package py<3.3
+    import mock
+
+
+class TestNeighbourInfoCache(unittest.TestCase):
+    """Test the on-disk cache of kd-tree neighbour info."""
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.area_def = geometry.AreaDefinition('areaD',
+                                                'Europe (3km, HRV, VTC)',
+                                                'areaD',
+                                                {'a': '6378144.0',
+                                                 'b': '6356759.0',
+                                                 'lat_0': '50.00',
+                                                 'lat_ts': '50.00',
+                                                 'lon_0': '8.00',
+                                                 'proj': 'stere'},
+                                                100,
+                                                100,
+                                                [-1370912.72,
+                                                 -909968.64000000001,
+                                                 1029087.28,
+                                                 1490031.3600000001])
+        lons = np.fromfunction(lambda y, x: 3 + x, (50, 10))
+        lats = np.fromfunction(lambda y, x: 75 - y, (50, 10))
+        self.swath_def = geometry.SwathDefinition(lons=lons, lats=lats)
+        self.data = np.fromfunction(lambda y, x: y * x, (50, 10))
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def test_store_load(self):
+        """Test storing and memory mapped loading of neighbour info."""
+        cache = NeighbourInfoCache(self.cache_dir)
+        info = (np.ones(5, dtype=np.bool_), np.zeros(3, dtype=np.bool_),
+                np.arange(3), np.linspace(0, 1, 3))
+        self.assertIsNone(cache.load('abc'))
+        cache.store('abc', info)
+        res = cache.load('abc')
+        self.assertEqual(len(res), 4)
+        for expected, actual in zip(info, res):
+            self.assertIsInstance(actual, np.memmap)
+            np.testing.assert_array_equal(actual, expected)
+        self.assertEqual(os.listdir(self.cache_dir), ['abc'])
+
+    def test_store_load_packed(self):
+        """Test bit-packed masks keep their size in the cache."""
+        from pyresample.utils import PackedMask
+        cache = NeighbourInfoCache(self.cache_dir)
+        mask = np.arange(11) % 2 == 0
+        info = (PackedMask.pack(mask), PackedMask.pack(~mask),
+                np.arange(6, dtype=np.uint8), np.linspace(0, 1, 6))
+        cache.store('abc', info)
+        res = cache.load('abc')
+        for expected, actual in zip(info[:2], res[:2]):
+            self.assertIsInstance(actual, PackedMask)
+            self.assertEqual(actual.mask_size, 11)
+            np.testing.assert_array_equal(actual.unpack(), expected.unpack())
+        # Packed masks stored without their size are not loaded
+        os.remove(os.path.join(self.cache_dir, 'abc',
+                               'valid_input_index.mask_size.npy'))
+        self.assertIsNone(cache.load('abc'))
+
+    def test_get_key(self):
+        """Test the cache key depends on geometries and parameters."""
+        key = NeighbourInfoCache.get_key(self.swath_def, self.area_def,
+                                         50000, 1, 0, True)
+        self.assertEqual(key, NeighbourInfoCache.get_key(
+            self.swath_def, self.area_def, 50000, 1, 0, True))
+        self.assertNotEqual(key, NeighbourInfoCache.get_key(
+            self.swath_def, self.area_def, 50000, 8, 0, True))
+        self.assertNotEqual(key, NeighbourInfoCache.get_key(
+            self.swath_def, self.area_def, 40000, 1, 0, True))
+        self.assertNotEqual(key, NeighbourInfoCache.get_key(
+            self.area_def, self.swath_def, 50000, 1, 0, True))
+        self.assertNotEqual(key, NeighbourInfoCache.get_key(
+            self.swath_def, self.area_def, 50000, 1, 0, True,
+            reduce_footprint=True))
+        self.assertNotEqual(key, NeighbourInfoCache.get_key(
+            self.swath_def, self.area_def, 50000, 1, 0, True,
+            projection_search=True))
+        coord_def = geometry.CoordinateDefinition(
+            lons=np.array([12.562036]), lats=np.array([55.715613]))
+        self.assertIsNone(NeighbourInfoCache.get_key(
+            self.swath_def, coord_def, 50000, 1, 0, True))
+
+    def test_eviction(self):
+        """Test that the least recently used entries are evicted."""
+        cache = NeighbourInfoCache(self.cache_dir)
+        info = tuple(np.arange(100, dtype=np.float64) for _ in range(4))
+        cache.store('first', info)
+        cache.store('second', info)
+        entry_size = cache.size // 2
+        # Make 'first' the oldest entry, then use it
+        os.utime(os.path.join(self.cache_dir, 'first'), (0, 0))
+        os.utime(os.path.join(self.cache_dir, 'second'), (1, 1))
+        cache.load('first')
+        cache.max_size = 2 * entry_size
+        cache.store('third', info)
+        self.assertEqual(sorted(os.listdir(self.cache_dir)),
+                         ['first', 'third'])
+        cache.clear()
+        self.assertEqual(os.listdir(self.cache_dir), [])
+
+    def test_resample_nearest_cached(self):
+        """Test that the kd-tree is not used when the cache is hit."""
+        expected = kd_tree.resample_nearest(self.swath_def, self.data,
+                                            self.area_def, 50000, segments=1)
+        res = kd_tree.resample_nearest(self.swath_def, self.data,
+                                       self.area_def, 50000, segments=1,
+                                       cache_dir=self.cache_dir)
+        np.testing.assert_array_equal(res, expected)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+        with mock.patch.object(kd_tree, '_create_resample_kdtree') as kdtree:
+            res = kd_tree.resample_nearest(self.swath_def, self.data,
+                                           self.area_def, 50000, segments=1,
+                                           cache_dir=self.cache_dir)
+            kdtree.assert_not_called()
+        np.testing.assert_array_equal(res, expected)
+
+    def test_resample_gauss_cached(self):
+        """Test weighted resampling from cached neighbour info."""
+        expected = kd_tree.resample_gauss(self.swath_def, self.data,
+                                          self.area_def, 50000, 25000,
+                                          neighbours=4, segments=1)
+        cache = NeighbourInfoCache(self.cache_dir)
+        for _ in range(2):
+            res = kd_tree.resample_gauss(self.swath_def, self.data,
+                                         self.area_def, 50000, 25000,
+                                         neighbours=4, segments=1,
+                                         cache_dir=cache)
+            np.testing.assert_allclose(res, expected)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+
+
+class TestCoordinateCache(unittest.TestCase):
+    """Test the in-memory cache of geometry coordinates."""
+
+    def setUp(self):
+        self.area_def = geometry.AreaDefinition('areaD',
+                                                'Europe (3km, HRV, VTC)',
+                                                'areaD',
+                                                {'a': '6378144.0',
+                                                 'b': '6356759.0',
+                                                 'lat_0': '50.00',
+                                                 'lat_ts': '50.00',
+                                                 'lon_0': '8.00',
+                                                 'proj': 'stere'},
+                                                100,
+                                                100,
+                                                [-1370912.72,
+                                                 -909968.64000000001,
+                                                 1029087.28,
+                                                 1490031.3600000001])
+
+    def test_get_put(self):
+        """Test least recently used eviction and statistics."""
+        cache = CoordinateCache(max_size=400)
+        arrays = (np.arange(10.), np.arange(10.))
+        self.assertIsNone(cache.get(('a', None)))
+        cache.put(('a', None), arrays)
+        res = cache.get(('a', None))
+        np.testing.assert_array_equal(res[0], arrays[0])
+        # Callers get copies
+        res[0][:] = -1
+        np.testing.assert_array_equal(cache.get(('a', None))[0], arrays[0])
+        # Slices are served from the full entry
+        res = cache.get(('a', (2, 4, None)), slice(2, 4))
+        np.testing.assert_array_equal(res[1], arrays[1][2:4])
+        cache.put(('b', None), arrays)
+        cache.get(('a', None))
+        cache.put(('c', None), arrays)
+        self.assertIsNone(cache.get(('b', None)))
+        cache.put(('d', None), (np.arange(100.), ))
+        self.assertIsNone(cache.get(('d', None)))
+        self.assertEqual(cache.stats(),
+                         caching.CacheStats(hits=4, misses=3, evictions=1,
+                                            entries=2, size=320,
+                                            max_size=400))
+        cache.clear()
+        self.assertEqual(cache.stats(),
+                         caching.CacheStats(0, 0, 0, 0, 0, 400))
+
+    def test_lru_order(self):
+        """Test hits, also on slices of an entry, mark it recently used."""
+        cache = CoordinateCache(max_size=320)
+        arrays = (np.arange(10.), np.arange(10.))
+        cache.put(('a', None), arrays)
+        cache.put(('b', None), arrays)
+        self.assertIsNotNone(cache.get(('a', (2, 4, None)), slice(2, 4)))
+        cache.put(('c', None), arrays)
+        self.assertIsNone(cache.get(('b', None)))
+        self.assertIsNotNone(cache.get(('a', None)))
+        cache.get(('c', None))
+        cache.put(('d', None), arrays)
+        self.assertIsNone(cache.get(('a', None)))
+        self.assertEqual(cache.stats().evictions, 2)
+
+    def test_pin(self):
+        """Test pinned coordinates are not evicted."""
+        cache = CoordinateCache(max_size=400)
+        key = (self.area_def.update_hash().hexdigest(), None)
+        arrays = (np.arange(10.), np.arange(10.))
+        cache.pin(self.area_def)
+        cache.put(key, arrays)
+        cache.put(('a', None), arrays)
+        cache.put(('b', None), arrays)
+        self.assertIsNotNone(cache.get(key))
+        self.assertIsNone(cache.get(('a', None)))
+        cache.unpin(self.area_def)
+        cache.put(('c', None), arrays)
+        cache.put(('d', None), arrays)
+        self.assertIsNone(cache.get(key))
+
+    def test_get_slice_key(self):
+        """Test hashable keys of data slices."""
+        self.assertIsNone(caching.get_slice_key(None))
+        self.assertIsNone(caching.get_slice_key(slice(None)))
+        self.assertEqual(caching.get_slice_key(slice(2, 5)), (2, 5, None))
+        self.assertEqual(caching.get_slice_key((0, slice(None))),
+                         (0, (None, None, None)))
+        self.assertFalse(caching.get_slice_key(np.arange(3)))
+        self.assertFalse(caching.get_slice_key((np.arange(3), 0)))
+
+    def test_area_lonlats(self):
+        """Test equal areas share the cached coordinates."""
+        # A disabled cache is not used at all
+        cache = CoordinateCache(max_size=0)
+        with mock.patch.object(caching, 'coordinate_cache', cache):
+            self.area_def.get_lonlats()
+        self.assertEqual(cache.stats(), (0, 0, 0, 0, 0, 0))
+        cache = CoordinateCache(max_size=256 * 1024 ** 2)
+        with mock.patch.object(caching, 'coordinate_cache', cache):
+            lons, lats = self.area_def.get_lonlats()
+            cartesian = self.area_def.get_cartesian_coords()
+            area_def = geometry.AreaDefinition(
+                'other', 'other', 'other', self.area_def.proj_dict,
+                self.area_def.x_size, self.area_def.y_size,
+                self.area_def.area_extent)
+            with mock.patch('pyresample.geometry.Proj') as proj_mock:
+                res = area_def.get_lonlats()
+                res_slice = area_def.get_lonlats(
+                    data_slice=(slice(10, 20), slice(None)))
+                res_cartesian = area_def.get_cartesian_coords()
+            self.assertFalse(proj_mock.called)
+            rotated_def = geometry.AreaDefinition(
+                'other', 'other', 'other', self.area_def.proj_dict,
+                self.area_def.x_size, self.area_def.y_size,
+                self.area_def.area_extent, rotation=45)
+            rotated_lons = rotated_def.get_lonlats()[0]
+        np.testing.assert_array_equal(res[0], lons)
+        np.testing.assert_array_equal(res[1], lats)
+        np.testing.assert_array_equal(res_slice[0], lons[10:20])
+        np.testing.assert_array_equal(res_cartesian, cartesian)
+        self.assertFalse(np.array_equal(rotated_lons, lons))
+        stats = cache.stats()
+        # The cartesian coordinates of the first area reuse its lonlats
+        self.assertEqual(stats.hits, 4)
+        self.assertEqual(stats.entries, 3)
+
+
+def suite():
+    """The test suite."""
+    loader = unittest.TestLoader()
+    mysuite = unittest.TestSuite()
+    mysuite.addTest(loader.loadTestsFromTestCase(TestNeighbourInfoCache))
+    mysuite.addTest(loader.loadTestsFromTestCase(TestCoordinateCache))
+
+    return mysuite
+
+
+if __name__ == '__main__':
+    unittest.main()
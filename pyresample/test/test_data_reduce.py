@@ -23,7 +23,8 @@ from pyresample.data_reduce import (get_valid_index_from_cartesian_grid,
                                     swath_from_lonlat_grid,
                                     swath_from_lonlat_boundaries,
                                     swath_from_cartesian_grid,
-                                    get_valid_index_from_lonlat_grid)
+                                    get_valid_index_from_lonlat_grid,
+                                    get_valid_index_from_lonlat_edges)
 
 
 class Test(unittest.TestCase):
@@ -156,6 +157,46 @@ class Test(unittest.TestCase):
         expected = 999000000.0
         self.assertAlmostEqual(cross_sum, expected)
 
+    def test_lonlat_edges_reduce(self):
+        """Test reducing with the edges of a swath footprint."""
+        lons = np.fromfunction(lambda y, x: -180 + 0.5 * x, (360, 720))
+        lats = np.fromfunction(lambda y, x: -90 + 0.5 * y, (360, 720))
+        # Descending swath crossing the date line
+        swath_lons = np.fromfunction(lambda y, x: 170 + x - 0.1 * y,
+                                     (100, 20))
+        swath_lons = (swath_lons + 180) % 360 - 180
+        swath_lats = np.fromfunction(lambda y, x: 40 - 0.2 * y, (100, 20))
+        swath_def = geometry.SwathDefinition(lons=swath_lons,
+                                             lats=swath_lats)
+        edge_lons, edge_lats = swath_def.get_bbox_lonlats()
+        valid_index = get_valid_index_from_lonlat_edges(
+            edge_lons, edge_lats, lons, lats, 50000)
+        self.assertEqual(valid_index.shape, lons.shape)
+        self.assertLess(valid_index.sum(), 0.02 * lons.size)
+        swath_index = ((np.round((swath_lats + 90) * 2).astype(int)) * 720 +
+                       np.round((swath_lons + 180) * 2).astype(int) % 720)
+        self.assertTrue(valid_index.ravel()[swath_index].all())
+        self.assertTrue(valid_index[int((40 + 90) * 2), 0])
+        self.assertFalse(valid_index[int((40 + 90) * 2), 360])
+
+        # Footprint around the north pole
+        polar_area = geometry.AreaDefinition(
+            'npole', 'npole', 'npole',
+            {'proj': 'stere', 'lat_0': '90', 'lon_0': '0', 'ellps': 'WGS84'},
+            50, 50, [-1000000, -1000000, 1000000, 1000000])
+        polar_def = geometry.SwathDefinition(*polar_area.get_lonlats())
+        edge_lons, edge_lats = polar_def.get_bbox_lonlats()
+        valid_index = get_valid_index_from_lonlat_edges(
+            edge_lons, edge_lats, lons, lats, 50000)
+        self.assertTrue(valid_index[lats >= 81].all())
+        self.assertFalse(valid_index[lats < 76].any())
+
+        # Invalid edges do not reduce
+        swath_lons[0, 0] = np.nan
+        valid_index = get_valid_index_from_lonlat_edges(
+            swath_lons[0], swath_lats[0], lons, lats, 50000)
+        self.assertTrue(valid_index.all())
+
 
 def suite():
     """The test suite.
@@ -653,6 +653,72 @@ class Test(unittest.TestCase):
                                     np.array([47500., 37500., 27500., 17500.,
                                               7500.])))
 
+    def test_is_rectilinear(self):
+        """Test rectilinear areas are unrotated latlong and eqc ones."""
+        area_extent = [-2e6, 4e6, 2e6, 8e6]
+        for proj_dict, expected in (({'proj': 'latlong'}, True),
+                                    ({'proj': 'eqc', 'lon_0': '5'}, True),
+                                    ({'proj': 'merc', 'ellps': 'WGS84'}, False),
+                                    ({'proj': 'stere', 'lat_0': '50'}, False),
+                                    ({'proj': 'ob_tran', 'o_proj': 'eqc',
+                                      'o_lat_p': '40'}, False),
+                                    ({'proj': 'eqc', 'axis': 'neu'}, False)):
+            area_def = geometry.AreaDefinition('test', 'test', 'test',
+                                               proj_dict, 10, 10, area_extent)
+            self.assertEqual(area_def.is_rectilinear, expected)
+        area_def = geometry.AreaDefinition('test', 'test', 'test',
+                                           {'proj': 'eqc'}, 10, 10,
+                                           area_extent, rotation=10)
+        self.assertFalse(area_def.is_rectilinear)
+        self.assertRaises(ValueError, area_def.get_lonlat_vectors)
+
+    def test_get_lonlat_vectors(self):
+        """Test the lon/lats of rectilinear areas are broadcast vectors."""
+        from pyproj import Proj
+        proj_dict = {'proj': 'eqc', 'lon_0': '10', 'ellps': 'WGS84'}
+        area_def = geometry.AreaDefinition('test', 'test', 'test', proj_dict,
+                                           30, 20, [-2e6, 4e6, 2e6, 8e6])
+        xcoords, ycoords = area_def.get_proj_coords()
+        expected = Proj(**proj_dict)(xcoords, ycoords, inverse=True)
+
+        lon_vector, lat_vector = area_def.get_lonlat_vectors()
+        self.assertEqual(lon_vector.shape, (30, ))
+        self.assertEqual(lat_vector.shape, (20, ))
+        # Full grids unless asked for
+        lons, lats = area_def.get_lonlats()
+        self.assertTrue(lons.flags.writeable)
+        self.assertTrue(lats.flags.c_contiguous)
+        self.assertIsNone(geometry._get_lonlat_vectors(lons, lats))
+        lons, lats = area_def.get_lonlats(broadcast=True)
+        self.assertEqual(lons.shape, (20, 30))
+        self.assertFalse(lons.flags.writeable)
+        self.assertEqual(lats.strides[1], 0)
+        np.testing.assert_allclose(lons, expected[0], atol=1e-9)
+        np.testing.assert_allclose(lats, expected[1], atol=1e-9)
+        vectors = geometry._get_lonlat_vectors(lons, lats)
+        np.testing.assert_array_equal(vectors[0], lon_vector)
+        np.testing.assert_array_equal(vectors[1], lat_vector)
+        self.assertIsNone(geometry._get_lonlat_vectors(*expected))
+
+        for data_slice in (slice(2, 7), (slice(None, None, 3), slice(4, 9)),
+                           (3, slice(None)), (slice(None), 0), (3, 4), 5):
+            lons, lats = area_def.get_lonlats(data_slice=data_slice,
+                                              broadcast=True)
+            self.assertEqual(lons.shape, expected[0][data_slice].shape)
+            self.assertEqual(lats.shape, expected[1][data_slice].shape)
+            np.testing.assert_allclose(lons, expected[0][data_slice],
+                                       atol=1e-9)
+            np.testing.assert_allclose(lats, expected[1][data_slice],
+                                       atol=1e-9)
+
+        lons, lats = area_def.get_lonlats(dtype=np.float32, broadcast=True)
+        self.assertEqual(lons.dtype, np.float32)
+        # The views are not stored on the area
+        area_def.get_lonlats(cache=True, broadcast=True)
+        self.assertIsNone(area_def.lons)
+        area_def.get_lonlats(cache=True)
+        self.assertTrue(area_def.lons.flags.writeable)
+
     def test_get_xy_from_lonlat(self):
         """Test the function get_xy_from_lonlat"""
         from pyresample import utils
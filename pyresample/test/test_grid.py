@@ -1,10 +1,17 @@
 import copy
+import sys
 import unittest
 
 import numpy as np
 
 from pyresample import grid, geometry, utils
 
+try:
+    from unittest import mock
+except ImportError:
+    # separate mock package py<3.3
+    import mock
+
 
 def mp(f):
     f.mp = True
@@ -86,6 +93,31 @@ class Test(unittest.TestCase):
                               [112.,  224.,  336.]]])
         self.assertTrue(np.array_equal(res, expected), 'Linesample failed')
 
+    def test_linesample_rectilinear(self):
+        """Test only the lon/lat vectors of a rectilinear target are
+        projected to a rectilinear source."""
+        source_def = geometry.AreaDefinition('eqc', 'eqc', 'eqc',
+                                             {'proj': 'eqc', 'lon_0': '5'},
+                                             50, 40,
+                                             [-2e6, 4e6, 2e6, 8e6])
+        target_def = geometry.AreaDefinition('latlong', 'latlong', 'latlong',
+                                             {'proj': 'latlong',
+                                              'ellps': 'WGS84'},
+                                             30, 20, [-20, 35, 30, 75])
+        data = np.fromfunction(lambda y, x: y * x, (40, 50))
+        lons, lats = target_def.get_lonlats(broadcast=True)
+        rows, cols = grid.get_linesample(lons, lats, source_def)
+        expected = grid.get_linesample(np.array(lons), np.array(lats),
+                                       source_def)
+        np.testing.assert_array_equal(rows, expected[0])
+        np.testing.assert_array_equal(cols, expected[1])
+        res = grid.get_resampled_image(target_def, source_def, data,
+                                       fill_value=None)
+        expected = grid.get_image_from_linesample(expected[0], expected[1],
+                                                  data, fill_value=None)
+        np.testing.assert_array_equal(res.mask, expected.mask)
+        np.testing.assert_array_equal(res, expected)
+
     def test_from_latlon(self):
         data = np.fromfunction(lambda y, x: y * x, (800, 800))
         lons = np.fromfunction(lambda y, x: x, (10, 10))
@@ -152,6 +184,44 @@ class Test(unittest.TestCase):
         self.assertAlmostEqual(
             cross_sum, expected, msg='Resampling of image failed')
 
+    def test_resampled_image_max_memory(self):
+        data = np.fromfunction(lambda y, x: y * x * 10 ** -6, (3712, 3712))
+        target_def = self.area_def
+        source_def = self.msg_area
+        full_plan = grid.estimate_resampled_image_memory(
+            target_def, source_def, data, segments=1)
+        plan = grid.estimate_resampled_image_memory(
+            target_def, source_def, data,
+            max_memory=full_plan.peak_memory // 2)
+        self.assertGreater(plan.segments, 1)
+        self.assertLessEqual(plan.peak_memory, full_plan.peak_memory // 2)
+        expected = grid.get_resampled_image(
+            target_def, source_def, data, segments=1)
+        res = grid.get_resampled_image(
+            target_def, source_def, data,
+            max_memory=full_plan.peak_memory // 2)
+        np.testing.assert_array_equal(res, expected)
+
+    @unittest.skipIf(sys.version_info < (3, 4), "tracemalloc not available")
+    def test_resampled_image_peak_memory_estimate(self):
+        """Test the peak memory estimate against the traced peak."""
+        import tracemalloc
+        from pyresample import caching
+        for data in (np.ones(self.msg_area.shape),
+                     np.ones(self.msg_area.shape + (3, ), dtype=np.float32)):
+            plan = grid.estimate_resampled_image_memory(
+                self.area_def, self.msg_area, data, segments=1)
+            # Cached target coordinates are not part of the estimate
+            with mock.patch.object(caching.coordinate_cache, 'max_size', 0):
+                tracemalloc.start()
+                try:
+                    grid.get_resampled_image(self.area_def, self.msg_area,
+                                             data, segments=1)
+                    peak = tracemalloc.get_traced_memory()[1]
+                finally:
+                    tracemalloc.stop()
+            self.assertLess(abs(plan.peak_memory - peak), 0.1 * peak)
+
     def test_resampled_image_masked(self):
         # Generate test image with masked elements
         data = np.ma.ones(self.msg_area.shape)
@@ -0,0 +1,124 @@
+"""Test the timing and counters of the resampling stages."""
+
+import sys
+
+import numpy as np
+
+from pyresample import geometry, instrumentation, kd_tree
+
+if sys.version_info < (2, 7):
+    import unittest2 as unittest
+else:
+    import unittest
+
+
+class TestInstrumentation(unittest.TestCase):
+    """Test the stage records of the resampling pipelines."""
+
+    def setUp(self):
+        self.area_def = geometry.AreaDefinition('areaD',
+                                                'Europe (3km, HRV, VTC)',
+                                                'areaD',
+                                                {'a': '6378144.0',
+                                                 'b': '6356759.0',
+                                                 'lat_0': '50.00',
+                                                 'lat_ts': '50.00',
+                                                 'lon_0': '8.00',
+                                                 'proj': 'stere'},
+                                                100,
+                                                100,
+                                                [-1370912.72,
+                                                 -909968.64000000001,
+                                                 1029087.28,
+                                                 1490031.3600000001])
+        lons = np.fromfunction(lambda y, x: 3 + x, (50, 10))
+        lats = np.fromfunction(lambda y, x: 75 - y, (50, 10))
+        self.swath_def = geometry.SwathDefinition(lons=lons, lats=lats)
+        self.data = np.fromfunction(lambda y, x: y * x, (50, 10))
+
+    def test_stage(self):
+        """Test stages are only reported to registered callbacks."""
+        records = []
+        with instrumentation.Stage('a') as stage:
+            self.assertFalse(stage.enabled)
+        instrumentation.add_callback(records.append)
+        try:
+            self.assertTrue(instrumentation.is_enabled())
+            with instrumentation.Stage('b', input=3) as stage:
+                self.assertTrue(stage.enabled)
+                stage.count(output=2)
+            with self.assertRaises(ValueError):
+                with instrumentation.Stage('c'):
+                    raise ValueError
+            instrumentation.report('d', 0.5, items=4)
+        finally:
+            instrumentation.remove_callback(records.append)
+        self.assertFalse(instrumentation.is_enabled())
+        self.assertEqual(len(records), 2)
+        self.assertEqual(records[1], ('d', 0.5, {'items': 4}))
+        self.assertEqual(records[0].stage, 'b')
+        self.assertEqual(records[0].counts, {'input': 3, 'output': 2})
+        self.assertGreaterEqual(records[0].duration, 0)
+
+    def test_kd_tree(self):
+        """Test the stages of kd-tree resampling."""
+        with instrumentation.Recorder() as recorder:
+            kd_tree.resample_nearest(self.swath_def, self.data, self.area_def,
+                                     50000, segments=4)
+        summary = recorder.summary()
+        self.assertEqual(list(summary), ['kd_tree.reduce_input',
+                                         'kd_tree.build_kdtree',
+                                         'kd_tree.query',
+                                         'kd_tree.get_neighbour_info',
+                                         'kd_tree.get_sample'])
+        self.assertEqual(summary['kd_tree.reduce_input'].counts['input'],
+                         self.data.size)
+        query = summary['kd_tree.query']
+        self.assertEqual(query.calls, 4)
+        self.assertEqual(query.counts['output'], self.area_def.size)
+        self.assertEqual(
+            summary['kd_tree.get_neighbour_info'].counts['valid_output'],
+            query.counts['valid_output'])
+        self.assertEqual(summary['kd_tree.get_sample'].counts['output'],
+                         self.area_def.size)
+        self.assertGreaterEqual(
+            summary['kd_tree.get_neighbour_info'].duration, query.duration)
+
+    def test_bilinear(self):
+        """Test the stages of bilinear resampling."""
+        from pyresample import bilinear
+        with instrumentation.Recorder() as recorder:
+            bilinear.resample_bilinear(self.data, self.swath_def,
+                                       self.area_def, radius=500e3,
+                                       neighbours=8)
+        summary = recorder.summary()
+        for stage in ('kd_tree.get_neighbour_info', 'bilinear.solve',
+                      'bilinear.get_bil_info', 'bilinear.get_sample'):
+            self.assertEqual(summary[stage].calls, 1)
+        self.assertEqual(summary['bilinear.get_sample'].counts['output'],
+                         self.area_def.size)
+
+    def test_ewa(self):
+        """Test the stages of EWA resampling."""
+        from pyresample.ewa import ll2cr, fornav
+        with instrumentation.Recorder() as recorder:
+            points, cols, rows = ll2cr(self.swath_def, self.area_def)
+            fornav(cols, rows, self.area_def, self.data)
+        summary = recorder.summary()
+        self.assertEqual(summary['ewa.ll2cr'].counts,
+                         {'input': self.data.size, 'valid_input': points})
+        self.assertEqual(summary['ewa.fornav'].counts['output'],
+                         self.area_def.size)
+
+
+def suite():
+    """The test suite."""
+    loader = unittest.TestLoader()
+    mysuite = unittest.TestSuite()
+    mysuite.addTest(loader.loadTestsFromTestCase(TestInstrumentation))
+
+    return mysuite
+
+
+if __name__ == '__main__':
+    unittest.main()
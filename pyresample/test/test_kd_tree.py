@@ -14,6 +14,12 @@ if sys.version_info < (2, 7):
 else:
     import unittest
 
+try:
+    from unittest import mock
+except ImportError:
+    # separate mock package py<3.3
+    import mock
+
 
 class Test(unittest.TestCase):
 
@@ -199,6 +205,453 @@ class Test(unittest.TestCase):
         expected = 15874591.0
         self.assertEqual(cross_sum, expected)
 
+    def test_neighbour_info_segments(self):
+        """Test segmented neighbour info matches the unsegmented one."""
+        lons = np.fromfunction(lambda y, x: 3 + x, (50, 10))
+        lats = np.fromfunction(lambda y, x: 75 - y, (50, 10))
+        swath_def = geometry.SwathDefinition(lons=lons, lats=lats)
+        for source_def, target_def, neighbours in (
+                (swath_def, self.area_def, 4),
+                (self.area_def, swath_def, 1)):
+            expected = kd_tree.get_neighbour_info(source_def, target_def,
+                                                  50000, neighbours=neighbours,
+                                                  segments=1)
+            res = kd_tree.get_neighbour_info(source_def, target_def, 50000,
+                                             neighbours=neighbours,
+                                             segments=7)
+            for exp, act in zip(expected, res):
+                self.assertEqual(exp.shape, act.shape)
+                np.testing.assert_array_equal(exp, act)
+
+    def test_neighbour_info_segments_threads(self):
+        """Test querying segments concurrently in threads."""
+        lons = np.fromfunction(lambda y, x: 3 + x, (50, 10))
+        lats = np.fromfunction(lambda y, x: 75 - y, (50, 10))
+        swath_def = geometry.SwathDefinition(lons=lons, lats=lats)
+        expected = kd_tree.get_neighbour_info(swath_def, self.area_def,
+                                              50000, neighbours=4, segments=1)
+        res = kd_tree.get_neighbour_info(swath_def, self.area_def, 50000,
+                                         neighbours=4, segments=7, nthreads=3)
+        for exp, act in zip(expected, res):
+            np.testing.assert_array_equal(exp, act)
+
+        # Every thread gets a segment
+        from pyresample import instrumentation
+        with instrumentation.Recorder() as recorder:
+            res = kd_tree.get_neighbour_info(swath_def, self.area_def, 50000,
+                                             neighbours=4, segments=1,
+                                             nthreads=3)
+        self.assertEqual(recorder.summary()['kd_tree.query'].calls, 3)
+        for exp, act in zip(expected, res):
+            np.testing.assert_array_equal(exp, act)
+
+    def test_imap_bounded(self):
+        """Test at most max_pending segment results are held at once."""
+        from multiprocessing.pool import ThreadPool
+        calls = []
+
+        def func(item):
+            calls.append(item)
+            return item * 2
+
+        pool = ThreadPool(2)
+        try:
+            results = kd_tree._imap_bounded(pool, func, range(20), 3)
+            for consumed, result in enumerate(results):
+                self.assertEqual(result, consumed * 2)
+                self.assertLessEqual(len(calls), consumed + 3)
+        finally:
+            pool.terminate()
+            pool.join()
+        self.assertEqual(sorted(calls), list(range(20)))
+
+    def test_neighbour_info_rectilinear(self):
+        """Test a rectilinear target matches its generic lon/lat path."""
+        lons = np.fromfunction(lambda y, x: 3 + x, (50, 10))
+        lats = np.fromfunction(lambda y, x: 75 - y, (50, 10))
+        swath_def = geometry.SwathDefinition(lons=lons, lats=lats)
+        area_def = geometry.AreaDefinition('latlong', 'latlong', 'latlong',
+                                           {'proj': 'latlong',
+                                            'ellps': 'WGS84'},
+                                           40, 60, [0, 20, 20, 80])
+        self.assertTrue(area_def.is_rectilinear)
+        for segments in (1, 7):
+            res = kd_tree.get_neighbour_info(swath_def, area_def, 100000,
+                                             neighbours=4, segments=segments)
+            with mock.patch.object(geometry.AreaDefinition, 'is_rectilinear',
+                                   False):
+                expected = kd_tree.get_neighbour_info(swath_def, area_def,
+                                                      100000, neighbours=4,
+                                                      segments=segments)
+            for exp, act in zip(expected[:3], res[:3]):
+                np.testing.assert_array_equal(exp, act)
+            np.testing.assert_allclose(expected[3], res[3])
+
+    def test_neighbour_info_segments_scratch_dir(self):
+        """Test assembling segmented neighbour info in memory maps."""
+        import shutil
+        import tempfile
+        lons = np.fromfunction(lambda y, x: 3 + x, (50, 10))
+        lats = np.fromfunction(lambda y, x: 75 - y, (50, 10))
+        swath_def = geometry.SwathDefinition(lons=lons, lats=lats)
+        expected = kd_tree.get_neighbour_info(self.area_def, swath_def,
+                                              50000, neighbours=4, segments=1)
+        scratch_dir = tempfile.mkdtemp()
+        try:
+            res = kd_tree.get_neighbour_info(self.area_def, swath_def, 50000,
+                                             neighbours=4, segments=3,
+                                             scratch_dir=scratch_dir)
+            self.assertEqual(os.listdir(scratch_dir), [])
+        finally:
+            shutil.rmtree(scratch_dir)
+        self.assertIsInstance(res[2], np.memmap)
+        self.assertIsInstance(res[3], np.memmap)
+        for exp, act in zip(expected, res):
+            np.testing.assert_array_equal(exp, act)
+
+    @unittest.skipIf(sys.version_info < (3, 4), "tracemalloc not available")
+    def test_neighbour_info_segments_peak_memory(self):
+        """Test segmented neighbour info does not copy the result arrays."""
+        import tracemalloc
+        lons = np.fromfunction(lambda y, x: 3 + x, (50, 10))
+        lats = np.fromfunction(lambda y, x: 75 - y, (50, 10))
+        swath_def = geometry.SwathDefinition(lons=lons, lats=lats)
+        tracemalloc.start()
+        try:
+            res = kd_tree.get_neighbour_info(swath_def, self.area_def, 50000,
+                                             neighbours=8, segments=16)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        result_size = sum(arr.nbytes for arr in res)
+        self.assertLess(peak, 1.3 * result_size)
+
+    def test_neighbour_info_float32(self):
+        data = np.fromfunction(lambda y, x: (y + x) * 10 ** -6, (5000, 100))
+        lons = np.fromfunction(
+            lambda y, x: 3 + (10.0 / 100) * x, (5000, 100))
+        lats = np.fromfunction(
+            lambda y, x: 75 - (50.0 / 5000) * y, (5000, 100))
+        swath_def = geometry.SwathDefinition(lons=lons, lats=lats)
+        vii, voi, index_array, distance_array = kd_tree.get_neighbour_info(
+            swath_def, self.area_def, 50000, neighbours=1, segments=1)
+        vii32, voi32, index_array32, distance_array32 = \
+            kd_tree.get_neighbour_info(swath_def, self.area_def, 50000,
+                                       neighbours=1, segments=2,
+                                       precision='float32')
+        self.assertEqual(distance_array32.dtype, np.float32)
+        np.testing.assert_array_equal(vii32, vii)
+        np.testing.assert_array_equal(voi32, voi)
+        # Neighbours only differ where the distances are nearly equal
+        differs = (index_array32 != index_array)
+        self.assertLess(differs.mean(), 0.001)
+        valid = np.isfinite(distance_array)
+        np.testing.assert_array_equal(np.isfinite(distance_array32), valid)
+        np.testing.assert_allclose(distance_array32[valid],
+                                   distance_array[valid], atol=2)
+
+        expected = kd_tree.resample_nearest(swath_def, data, self.area_def,
+                                            50000, segments=1)
+        res = kd_tree.resample_nearest(swath_def, data, self.area_def, 50000,
+                                       segments=1, precision='float32')
+        self.assertEqual(res.dtype, data.dtype)
+        self.assertLess((res != expected).mean(), 0.001)
+        with catch_warnings():
+            expected = kd_tree.resample_gauss(swath_def, data, self.area_def,
+                                              50000, 25000, segments=1)
+            res = kd_tree.resample_gauss(swath_def, data, self.area_def,
+                                         50000, 25000, segments=1,
+                                         precision='float32')
+        self.assertEqual(res.dtype, np.float32)
+        np.testing.assert_allclose(res, expected, rtol=1e-4, atol=2e-6)
+        self.assertRaises(ValueError, kd_tree.get_neighbour_info, swath_def,
+                          self.area_def, 50000, precision='float16')
+
+    def test_neighbour_info_compact(self):
+        data = np.fromfunction(lambda y, x: y * x, (50, 10))
+        lons = np.fromfunction(lambda y, x: 3 + x, (50, 10))
+        lats = np.fromfunction(lambda y, x: 75 - y, (50, 10))
+        swath_def = geometry.SwathDefinition(lons=lons, lats=lats)
+        gauss = lambda r: np.exp(-r ** 2 / 25000.0 ** 2)
+        for neighbours, resample_type in ((1, 'nn'), (4, 'custom')):
+            with catch_warnings():
+                info = kd_tree.get_neighbour_info(swath_def, self.area_def,
+                                                  50000, neighbours=neighbours,
+                                                  segments=1)
+                compact_info = kd_tree.get_neighbour_info(
+                    swath_def, self.area_def, 50000, neighbours=neighbours,
+                    segments=1, compact=True, distance_precision='float16')
+            vii, voi, index_array, distance_array = compact_info
+            self.assertIsInstance(vii, utils.PackedMask)
+            self.assertIsInstance(voi, utils.PackedMask)
+            self.assertEqual(vii.dtype, np.uint8)
+            self.assertEqual(vii.size, (info[0].size + 7) // 8)
+            self.assertEqual(voi.size, (info[1].size + 7) // 8)
+            index_dtype = np.uint8 if info[0].sum() < 256 else np.uint16
+            self.assertEqual(index_array.dtype, index_dtype)
+            self.assertEqual(distance_array.dtype, np.float16)
+            np.testing.assert_array_equal(index_array, info[2])
+            expected = kd_tree.get_sample_from_neighbour_info(
+                resample_type, self.area_def.shape, data, *info,
+                weight_funcs=gauss)
+            res = kd_tree.get_sample_from_neighbour_info(
+                resample_type, self.area_def.shape, data, *compact_info,
+                weight_funcs=gauss)
+            np.testing.assert_allclose(res, expected, rtol=1e-2)
+            # The resample matrix unpacks the masks too
+            expected_matrix = kd_tree.get_resample_matrix(
+                resample_type, *info, weight_funcs=gauss)
+            matrix = kd_tree.get_resample_matrix(resample_type,
+                                                 *compact_info,
+                                                 weight_funcs=gauss)
+            self.assertEqual(matrix.shape, expected_matrix.shape)
+            self.assertEqual(matrix.nnz, expected_matrix.nnz)
+            self.assertLess(abs(matrix - expected_matrix).max(), 1e-2)
+        # Multiple channels
+        data_multi = np.dstack((data, data))
+        res = kd_tree.get_sample_from_neighbour_info(
+            'custom', self.area_def.shape, data_multi, *compact_info,
+            weight_funcs=[gauss, gauss])
+        np.testing.assert_allclose(res[:, :, 1], expected, rtol=1e-2)
+        self.assertRaises(ValueError, kd_tree.get_neighbour_info, swath_def,
+                          self.area_def, 100000, distance_precision='float16')
+
+    def test_neighbour_info_max_memory(self):
+        data = np.fromfunction(lambda y, x: y * x, (50, 10))
+        lons = np.fromfunction(lambda y, x: 3 + x, (50, 10))
+        lats = np.fromfunction(lambda y, x: 75 - y, (50, 10))
+        swath_def = geometry.SwathDefinition(lons=lons, lats=lats)
+        full_plan = kd_tree.estimate_neighbour_info_memory(
+            swath_def, self.area_def, neighbours=1, segments=1)
+        self.assertGreater(full_plan.peak_memory, self.area_def.size * 12)
+        # Without a budget the host memory is not consulted
+        with mock.patch.object(utils, 'get_available_memory',
+                               return_value=0):
+            plan = kd_tree.estimate_neighbour_info_memory(
+                swath_def, self.area_def, neighbours=1)
+        self.assertEqual(plan, (1, full_plan.peak_memory, None))
+        plan = kd_tree.estimate_neighbour_info_memory(
+            swath_def, self.area_def, neighbours=1,
+            max_memory=full_plan.peak_memory)
+        self.assertEqual(plan.segments, 1)
+        plan = kd_tree.estimate_neighbour_info_memory(
+            swath_def, self.area_def, neighbours=1,
+            max_memory=full_plan.peak_memory // 2)
+        self.assertGreater(plan.segments, 1)
+        self.assertLessEqual(plan.peak_memory, full_plan.peak_memory // 2)
+
+        expected = kd_tree.resample_nearest(swath_def, data, self.area_def,
+                                            50000, segments=1)
+        query = kd_tree._query_resample_kdtree
+        with mock.patch.object(kd_tree, '_query_resample_kdtree',
+                               side_effect=query) as query_mock:
+            info = kd_tree.get_neighbour_info(
+                swath_def, self.area_def, 50000, neighbours=1,
+                max_memory=full_plan.peak_memory // 2)
+        self.assertEqual(query_mock.call_count, plan.segments)
+        res = kd_tree.get_sample_from_neighbour_info(
+            'nn', self.area_def.shape, data, *info)
+        np.testing.assert_array_equal(res, expected)
+
+    @unittest.skipIf(sys.version_info < (3, 4), "tracemalloc not available")
+    def test_neighbour_info_peak_memory_estimate(self):
+        """Test the peak memory estimate against the traced peak."""
+        import tracemalloc
+        from pyresample import caching
+        random = np.random.RandomState(0)
+        lons = random.uniform(-10, 30, (100, 1000))
+        lats = random.uniform(40, 65, (100, 1000))
+        swath_def = geometry.SwathDefinition(lons=lons, lats=lats)
+        for precision, neighbours, segments in ((None, 1, 1),
+                                                ('float32', 8, 1),
+                                                (None, 4, 4)):
+            plan = kd_tree.estimate_neighbour_info_memory(
+                swath_def, self.area_def, neighbours=neighbours,
+                segments=segments, precision=precision)
+            # Cached target coordinates are not part of the estimate
+            with mock.patch.object(caching.coordinate_cache, 'max_size', 0):
+                tracemalloc.start()
+                try:
+                    with catch_warnings():
+                        kd_tree.get_neighbour_info(
+                            swath_def, self.area_def, 50000,
+                            neighbours=neighbours, segments=segments,
+                            precision=precision, reduce_data=False)
+                    peak = tracemalloc.get_traced_memory()[1]
+                finally:
+                    tracemalloc.stop()
+            self.assertLess(abs(plan.peak_memory - peak), 0.1 * peak)
+
+    def test_nearest_swath_footprint(self):
+        data = np.fromfunction(lambda y, x: y * x, (50, 10))
+        lons = np.fromfunction(lambda y, x: 3 + x, (50, 10))
+        lats = np.fromfunction(lambda y, x: 75 - y, (50, 10))
+        swath_def = geometry.SwathDefinition(lons=lons, lats=lats)
+        info = kd_tree.get_neighbour_info(swath_def, self.area_def, 50000,
+                                          neighbours=1, segments=1,
+                                          reduce_footprint=True)
+        full_info = kd_tree.get_neighbour_info(swath_def, self.area_def,
+                                               50000, neighbours=1,
+                                               segments=1)
+        self.assertLess(info[1].sum(), full_info[1].sum())
+        res = kd_tree.get_sample_from_neighbour_info(
+            'nn', self.area_def.shape, data, *info)
+        expected = kd_tree.get_sample_from_neighbour_info(
+            'nn', self.area_def.shape, data, *full_info)
+        np.testing.assert_array_equal(res, expected)
+        self.assertEqual(np.count_nonzero(res), np.count_nonzero(expected))
+
+    def test_swath_footprint_pole_and_dateline(self):
+        """Test the footprint reduction of swaths over a pole and across the
+        date line keeps all the target pixels with neighbours."""
+        from pyproj import Proj
+        target_def = geometry.AreaDefinition(
+            'latlong', 'latlong', 'latlong',
+            {'proj': 'latlong', 'ellps': 'WGS84'}, 720, 360,
+            [-180, -90, 180, 90])
+        swaths = (
+            # Over the north pole
+            ({'proj': 'stere', 'lat_0': '90', 'lon_0': '30'},
+             (-1.2e6, 0.8e6), (-2.5e6, 1.5e6)),
+            # Over the south pole, with an edge passing close to it
+            ({'proj': 'stere', 'lat_0': '-90', 'lon_0': '-100'},
+             (-1e4, 2e6), (-1.5e6, 1.5e6)),
+            # Across the date line
+            ({'proj': 'stere', 'lat_0': '40', 'lon_0': '178'},
+             (-1e6, 1e6), (-2e6, 2e6)),
+            # Over the north pole and across the date line
+            ({'proj': 'stere', 'lat_0': '82', 'lon_0': '-175'},
+             (-8e5, 8e5), (-1.5e6, 1.5e6)),
+            # Across the date line, reaching close to the north pole
+            ({'proj': 'stere', 'lat_0': '86', 'lon_0': '-175'},
+             (-8e5, 8e5), (-1.5e6, 3.5e5)))
+        for proj_dict, x_range, y_range in swaths:
+            x = np.linspace(x_range[0], x_range[1], 60)
+            y = np.linspace(y_range[1], y_range[0], 80)
+            lons, lats = Proj(ellps='WGS84', **proj_dict)(
+                *np.meshgrid(x, y), inverse=True)
+            swath_def = geometry.SwathDefinition(lons=lons, lats=lats)
+            for neighbours in (1, 4):
+                info = kd_tree.get_neighbour_info(
+                    swath_def, target_def, 50000, neighbours=neighbours,
+                    segments=1, reduce_footprint=True)
+                full_info = kd_tree.get_neighbour_info(
+                    swath_def, target_def, 50000, neighbours=neighbours,
+                    segments=1)
+                self.assertLess(info[1].sum(), full_info[1].sum())
+                np.testing.assert_array_equal(info[0], full_info[0])
+                # Neighbours of all target pixels, source size if none
+                input_size = info[0].sum()
+                indices = []
+                for voi, index_array in (info[1:3], full_info[1:3]):
+                    full_index_array = np.full(
+                        (target_def.size, neighbours), input_size)
+                    full_index_array[voi] = index_array.reshape(
+                        (-1, neighbours))
+                    indices.append(full_index_array)
+                self.assertTrue((indices[1] < input_size).any())
+                np.testing.assert_array_equal(indices[0], indices[1])
+
+    def test_nearest_area_source(self):
+        """Test the projection search finds the kd-tree neighbours."""
+        geos_def = geometry.AreaDefinition(
+            'geos', 'geos', 'geos',
+            {'a': '6378169.0', 'b': '6356583.8', 'h': '35785831.0',
+             'lon_0': '0.0', 'proj': 'geos'},
+            300, 300,
+            [-5570248.4773392612, -5567248.074173444,
+             5567248.074173444, 5570248.4773392612])
+        global_def = geometry.AreaDefinition(
+            'latlong', 'latlong', 'latlong',
+            {'proj': 'latlong', 'ellps': 'WGS84'}, 360, 180,
+            [-180, -90, 180, 90])
+        polar_def = geometry.AreaDefinition(
+            'laea', 'laea', 'laea',
+            {'proj': 'laea', 'lat_0': '90', 'lon_0': '0', 'ellps': 'WGS84'},
+            200, 200, [-4e6, -4e6, 4e6, 4e6])
+        merc_def = geometry.AreaDefinition(
+            'merc', 'merc', 'merc',
+            {'proj': 'merc', 'lon_0': '10', 'ellps': 'WGS84'},
+            200, 150, [-3e6, 2e6, 3e6, 8e6])
+        # The global target and the geos disk have target pixels off the
+        # disk, the areas cross the date line and the edges of each other
+        for source_def, target_def, radius in (
+                (geos_def, self.area_def, 50000),
+                (geos_def, global_def, 50000),
+                (geos_def, geos_def, 50000),
+                (self.area_def, geos_def, 50000),
+                (global_def, self.area_def, 200000),
+                (merc_def, self.area_def, 50000),
+                (polar_def, global_def, 100000),
+                (polar_def, self.area_def, 50000)):
+            info = kd_tree.get_neighbour_info(source_def, target_def, radius,
+                                              neighbours=1, segments=1,
+                                              projection_search=True)
+            expected = kd_tree.get_neighbour_info(source_def, target_def,
+                                                  radius, neighbours=1,
+                                                  segments=1)
+            self.assertTrue(info[0].all())
+            # Source pixels of all target pixels, -1 if none
+            indices = []
+            distances = []
+            for vii, voi, index_array, distance_array in (info, expected):
+                is_found = index_array < vii.sum()
+                full_index_array = np.full(target_def.size, -1)
+                full_index_array[np.flatnonzero(voi)[is_found]] = \
+                    np.flatnonzero(vii)[index_array[is_found]]
+                indices.append(full_index_array)
+                full_distance_array = np.full(target_def.size, np.inf)
+                full_distance_array[voi] = distance_array
+                distances.append(full_distance_array)
+            self.assertTrue((indices[1] >= 0).any())
+            np.testing.assert_array_equal(indices[0], indices[1])
+            np.testing.assert_allclose(distances[0], distances[1], atol=1e-3)
+
+        data = np.fromfunction(lambda y, x: y * 300 + x, (300, 300))
+        expected = kd_tree.resample_nearest(geos_def, data, self.area_def,
+                                            50000, segments=1,
+                                            fill_value=None)
+        with mock.patch.object(kd_tree, '_query_resample_kdtree') as \
+                query_mock:
+            res = kd_tree.resample_nearest(geos_def, data, self.area_def,
+                                           50000, segments=1,
+                                           fill_value=None,
+                                           projection_search=True)
+        self.assertFalse(query_mock.called)
+        np.testing.assert_array_equal(res.mask, expected.mask)
+        np.testing.assert_array_equal(res, expected)
+
+        # The kd-tree is used by default
+        with mock.patch.object(kd_tree, '_query_area_source') as area_mock:
+            res = kd_tree.resample_nearest(geos_def, data, self.area_def,
+                                           50000, segments=1,
+                                           fill_value=None)
+        self.assertFalse(area_mock.called)
+        np.testing.assert_array_equal(res, expected)
+
+    def test_nearest_rotated_area_source(self):
+        """Test rotated area sources are searched with the kd-tree."""
+        area_def = geometry.AreaDefinition(
+            'rotated', 'rotated', 'rotated',
+            {'a': '6378144.0', 'b': '6356759.0', 'lat_0': '50.00',
+             'lat_ts': '50.00', 'lon_0': '8.00', 'proj': 'stere'},
+            100, 100, [-1370912.72, -909968.64, 1029087.28, 1490031.36],
+            rotation=20)
+        data = np.fromfunction(lambda y, x: y * 100 + x, (100, 100))
+        lons, lats = area_def.get_lonlats()
+        swath_def = geometry.SwathDefinition(lons=lons, lats=lats)
+        expected = kd_tree.resample_nearest(swath_def, data, self.area_def,
+                                            50000, segments=1,
+                                            fill_value=None)
+        with mock.patch.object(kd_tree, '_query_area_source') as area_mock:
+            res = kd_tree.resample_nearest(area_def, data, self.area_def,
+                                           50000, segments=1,
+                                           fill_value=None,
+                                           projection_search=True)
+        self.assertFalse(area_mock.called)
+        np.testing.assert_array_equal(res.mask, expected.mask)
+        np.testing.assert_array_equal(res, expected)
+
     def test_nearest_remap(self):
         data = np.fromfunction(lambda y, x: y * x, (50, 10))
         lons = np.fromfunction(lambda y, x: 3 + x, (50, 10))
@@ -309,6 +762,41 @@ class Test(unittest.TestCase):
         expected = 1461.8429990248171
         self.assertAlmostEqual(cross_sum, expected)
 
+    def test_gauss_multi_float32(self):
+        """Test weighted resampling with float32 accumulation."""
+        data = np.fromfunction(lambda y, x: (y + x) * 10 ** -6, (5000, 100))
+        lons = np.fromfunction(
+            lambda y, x: 3 + (10.0 / 100) * x, (5000, 100))
+        lats = np.fromfunction(
+            lambda y, x: 75 - (50.0 / 5000) * y, (5000, 100))
+        swath_def = geometry.SwathDefinition(lons=lons, lats=lats)
+        data_multi = np.column_stack((data.ravel(), data.ravel(),
+                                      data.ravel()))
+        valid_input_index, valid_output_index, index_array, distance_array = \
+            kd_tree.get_neighbour_info(swath_def, self.area_def, 50000,
+                                       neighbours=8, segments=1)
+
+        def gauss(sigma):
+            return lambda r: np.exp(-r ** 2 / float(sigma) ** 2)
+
+        weight_funcs = [gauss(25000), gauss(15000), gauss(10000)]
+        expected = kd_tree.get_sample_from_neighbour_info(
+            'custom', self.area_def.shape, data_multi, valid_input_index,
+            valid_output_index, index_array, distance_array,
+            weight_funcs=weight_funcs)
+        res = kd_tree.get_sample_from_neighbour_info(
+            'custom', self.area_def.shape, data_multi, valid_input_index,
+            valid_output_index, index_array, distance_array,
+            weight_funcs=weight_funcs, precision='float32')
+        self.assertEqual(res.dtype, np.float32)
+        np.testing.assert_allclose(res, expected, rtol=1e-5, atol=1e-7)
+        self.assertAlmostEqual(res.sum(), 1461.8429990248171, 2)
+        self.assertRaises(ValueError, kd_tree.get_sample_from_neighbour_info,
+                          'custom', self.area_def.shape, data_multi,
+                          valid_input_index, valid_output_index, index_array,
+                          distance_array, weight_funcs=weight_funcs,
+                          precision='int16')
+
     def test_gauss_multi_uncert(self):
         data = np.fromfunction(lambda y, x: (y + x) * 10 ** -6, (5000, 100))
         lons = np.fromfunction(
@@ -345,6 +833,29 @@ class Test(unittest.TestCase):
             self.assertAlmostEqual(cross_sum_stddev, e_stddev)
         self.assertAlmostEqual(cross_sum_counts, expected_counts)
 
+    def test_gauss_uncert_offset(self):
+        data = np.fromfunction(lambda y, x: (y + x) * 10 ** -6, (5000, 100))
+        lons = np.fromfunction(
+            lambda y, x: 3 + (10.0 / 100) * x, (5000, 100))
+        lats = np.fromfunction(
+            lambda y, x: 75 - (50.0 / 5000) * y, (5000, 100))
+        swath_def = geometry.SwathDefinition(lons=lons, lats=lats)
+        with catch_warnings():
+            res, stddev, counts = kd_tree.resample_gauss(
+                swath_def, data, self.area_def, 50000, 25000, segments=1,
+                fill_value=None, with_uncert=True)
+            # The stddev does not depend on a large offset of the data
+            res_offset, stddev_offset, _ = kd_tree.resample_gauss(
+                swath_def, data + 10 ** 4, self.area_def, 50000, 25000,
+                segments=1, fill_value=None, with_uncert=True)
+        self.assertEqual(counts.dtype, np.uint8)
+        self.assertEqual(counts.max(), 8)
+        np.testing.assert_array_equal(res_offset.mask, res.mask)
+        np.testing.assert_allclose(res_offset - 10 ** 4, res, atol=1e-9)
+        np.testing.assert_array_equal(stddev_offset.mask, stddev.mask)
+        np.testing.assert_allclose(stddev_offset, stddev, rtol=1e-5,
+                                   atol=1e-12)
+
     def test_gauss_multi_mp(self):
         data = np.fromfunction(lambda y, x: (y + x) * 10 ** -6, (5000, 100))
         lons = np.fromfunction(
@@ -420,6 +931,163 @@ class Test(unittest.TestCase):
         expected = 4872.8100347930776
         self.assertAlmostEqual(cross_sum, expected)
 
+    def test_batch(self):
+        data = np.fromfunction(lambda y, x: y * x, (50, 10))
+        lons = np.fromfunction(lambda y, x: 3 + x, (50, 10))
+        lats = np.fromfunction(lambda y, x: 75 - y, (50, 10))
+        swath_def = geometry.SwathDefinition(lons=lons, lats=lats)
+        masked = np.ma.array(data.astype(np.float32),
+                             mask=(data.astype(np.int32) % 3 == 0))
+        datasets = [data, data.astype(np.uint8), masked]
+        res = kd_tree.resample_batch(swath_def, datasets, self.area_def,
+                                     50000, segments=1)
+        self.assertEqual(len(res), 3)
+        for dataset, result in zip(datasets, res):
+            expected = kd_tree.resample_nearest(swath_def, dataset,
+                                                self.area_def, 50000, segments=1)
+            np.testing.assert_array_equal(result, expected)
+            self.assertEqual(result.dtype, dataset.dtype)
+        self.assertTrue(np.ma.isMA(res[2]))
+
+        with mock.patch.object(kd_tree, 'get_neighbour_info',
+                               wraps=kd_tree.get_neighbour_info) as gni:
+            res = kd_tree.resample_batch(
+                swath_def, {'a': data, 'b': data * 2}, self.area_def,
+                50000, resample_type='gauss', sigmas=25000, segments=1)
+            self.assertEqual(gni.call_count, 1)
+        self.assertEqual(sorted(res.keys()), ['a', 'b'])
+        expected = kd_tree.resample_gauss(swath_def, data, self.area_def,
+                                          50000, 25000, segments=1)
+        np.testing.assert_allclose(res['a'], expected)
+        np.testing.assert_allclose(res['b'], 2 * expected)
+
+        # Mappings are returned as an OrderedDict with the same keys
+        from collections import OrderedDict, defaultdict
+        datasets = defaultdict(list, [('b', data * 2), ('a', data)])
+        res = kd_tree.resample_batch(swath_def, datasets, self.area_def,
+                                     50000, segments=1)
+        self.assertIsInstance(res, OrderedDict)
+        self.assertEqual(list(res.keys()), list(datasets.keys()))
+        expected = kd_tree.resample_nearest(swath_def, data, self.area_def,
+                                            50000, segments=1)
+        np.testing.assert_array_equal(res['a'], expected)
+
+        res = kd_tree.resample_batch(swath_def, [data], self.area_def, 50000,
+                                     resample_type='custom',
+                                     weight_funcs=lambda r: 1 - r / 100000.0,
+                                     segments=1, with_uncert=True)
+        self.assertEqual(len(res[0]), 3)
+        self.assertRaises(ValueError, kd_tree.resample_batch, swath_def,
+                          [data], self.area_def, 50000, resample_type='gauss')
+        self.assertRaises(TypeError, kd_tree.resample_batch, swath_def,
+                          [data], self.area_def, 50000, resample_type='bad')
+
+    def test_resample_matrix(self):
+        data = np.fromfunction(lambda y, x: y * x, (50, 10))
+        lons = np.fromfunction(lambda y, x: 3 + x, (50, 10))
+        lats = np.fromfunction(lambda y, x: 75 - y, (50, 10))
+        swath_def = geometry.SwathDefinition(lons=lons, lats=lats)
+        data_int = data.astype(np.int32)
+        masked = np.ma.array(data, mask=(data_int % 3 == 0))
+
+        info = kd_tree.get_neighbour_info(swath_def, self.area_def, 50000,
+                                          neighbours=1, segments=1)
+        matrix = kd_tree.get_resample_matrix('nn', *info)
+        self.assertEqual(matrix.shape, (self.area_def.size, data.size))
+        for dataset in (data_int, masked, np.dstack((data, data))):
+            for fill_value in (0, None):
+                expected = kd_tree.resample_nearest(
+                    swath_def, dataset, self.area_def, 50000,
+                    fill_value=fill_value, segments=1)
+                res = kd_tree.get_sample_from_resample_matrix(
+                    matrix, self.area_def.shape, dataset,
+                    fill_value=fill_value)
+                self.assertEqual(res.dtype, expected.dtype)
+                self.assertEqual(np.ma.isMA(res), np.ma.isMA(expected))
+                np.testing.assert_array_equal(np.ma.getmaskarray(res),
+                                              np.ma.getmaskarray(expected))
+                np.testing.assert_array_equal(res, expected)
+
+        info = kd_tree.get_neighbour_info(swath_def, self.area_def, 50000,
+                                          neighbours=8, segments=1)
+        matrix = kd_tree.get_resample_matrix(
+            'custom', *info, weight_funcs=lambda r: np.exp(-r ** 2 / 25000.0 ** 2))
+        data_multi = np.column_stack((data.ravel(), data.ravel()))
+        for dataset, sigmas in ((data, 25000), (masked, 25000),
+                                (data_multi, [25000, 25000])):
+            for fill_value in (0, None):
+                expected = kd_tree.resample_gauss(
+                    swath_def, dataset, self.area_def, 50000, sigmas,
+                    fill_value=fill_value, segments=1)
+                res = kd_tree.get_sample_from_resample_matrix(
+                    matrix, self.area_def.shape, dataset,
+                    fill_value=fill_value)
+                np.testing.assert_array_equal(np.ma.getmaskarray(res),
+                                              np.ma.getmaskarray(expected))
+                np.testing.assert_allclose(res, expected)
+
+        self.assertRaises(ValueError, kd_tree.get_resample_matrix, 'custom',
+                          *info, weight_funcs=[np.cos, np.sin])
+        self.assertRaises(ValueError, kd_tree.get_resample_matrix, 'nn',
+                          *info)
+
+    def test_incremental(self):
+        data = np.fromfunction(lambda y, x: y * x, (50, 10))
+        lons = np.fromfunction(lambda y, x: 3 + x, (50, 10))
+        lats = np.fromfunction(lambda y, x: 75 - y, (50, 10))
+        masked = np.ma.array(data, mask=(data.astype(np.int32) % 3 == 0))
+        data_multi = np.dstack((data, data.astype(np.uint8)))
+
+        def add_blocks(resampler, dataset, blocks):
+            for block in blocks:
+                block_def = geometry.SwathDefinition(lons=lons[block],
+                                                     lats=lats[block])
+                resampler.add_block(block_def, dataset[block])
+
+        blocks = [slice(i, i + 10) for i in range(0, 50, 10)]
+        swath_def = geometry.SwathDefinition(lons=lons, lats=lats)
+        for dataset in (data.astype(np.int32), masked, data_multi):
+            resampler = kd_tree.IncrementalResampler(self.area_def, 50000)
+            add_blocks(resampler, dataset, blocks[:2])
+            first_def = geometry.SwathDefinition(lons=lons[:20],
+                                                 lats=lats[:20])
+            expected = kd_tree.resample_nearest(first_def, dataset[:20],
+                                                self.area_def, 50000,
+                                                fill_value=None, segments=1)
+            res = resampler.get_sample(fill_value=None)
+            np.testing.assert_array_equal(np.ma.getmaskarray(res),
+                                          np.ma.getmaskarray(expected))
+            np.testing.assert_array_equal(res, expected)
+
+            add_blocks(resampler, dataset, blocks[2:])
+            expected = kd_tree.resample_nearest(swath_def, dataset,
+                                                self.area_def, 50000,
+                                                segments=1)
+            res = resampler.get_sample()
+            self.assertEqual(res.dtype, expected.dtype)
+            np.testing.assert_array_equal(np.ma.getmaskarray(res),
+                                          np.ma.getmaskarray(expected))
+            np.testing.assert_array_equal(res, expected)
+
+        resampler = kd_tree.IncrementalResampler(self.area_def, 50000,
+                                                 neighbours=8)
+        self.assertRaises(kd_tree.EmptyResult, resampler.get_sample)
+        add_blocks(resampler, data, blocks[::-1])
+        with catch_warnings():
+            expected = kd_tree.resample_gauss(swath_def, data, self.area_def,
+                                              50000, 25000, with_uncert=True,
+                                              segments=1)
+        res = resampler.get_sample(
+            weight_funcs=lambda r: np.exp(-r ** 2 / 25000.0 ** 2),
+            with_uncert=True)
+        for expected_arr, res_arr in zip(expected, res):
+            np.testing.assert_allclose(res_arr, expected_arr)
+
+        # Blocks far away from the target do not update anything
+        block_def = geometry.SwathDefinition(lons=lons[:10] - 100,
+                                             lats=lats[:10] - 100)
+        self.assertEqual(resampler.add_block(block_def, data[:10]).size, 0)
+
     def test_custom_multi(self):
         def wf1(dist):
             return 1 - dist / 100000.0
@@ -872,7 +1540,180 @@ class TestXArrayResamplerNN(unittest.TestCase):
         expected = 83120259.0
         self.assertEqual(cross_sum, expected)
 
-    @unittest.skipIf(True, "Multiple neighbors not supported yet")
+    def test_nearest_swath_2d_to_swath_chunk_local(self):
+        """Test that target chunks only get the source data they need."""
+        from pyresample.kd_tree import XArrayResamplerNN
+        import xarray as xr
+        import dask.array as da
+        dims = ('my_dim_y', 'my_dim_x')
+        tlons = self.lons_2d.values[::2] + 0.1
+        tlats = self.lats_2d.values[::2] + 0.1
+        target_def = geometry.SwathDefinition(
+            lons=xr.DataArray(da.from_array(tlons, chunks=5), dims=dims),
+            lats=xr.DataArray(da.from_array(tlats, chunks=5), dims=dims))
+        resampler = XArrayResamplerNN(self.swath_def_2d, target_def,
+                                      radius_of_influence=50000,
+                                      neighbours=1)
+        resampler.get_neighbour_info()
+        source_sizes = []
+        orig_run_on_source_range = kd_tree._run_on_source_range
+
+        def run_on_source_range(kernel, offset, index_arr, vii, data_arr,
+                                **kwargs):
+            source_sizes.append(data_arr.size)
+            return orig_run_on_source_range(kernel, offset, index_arr, vii,
+                                            data_arr, **kwargs)
+
+        with mock.patch.object(kd_tree, '_run_on_source_range',
+                               run_on_source_range):
+            res = resampler.get_sample_from_neighbour_info(self.data_2d)
+            res = res.values
+        self.assertEqual(len(source_sizes), 10)
+        self.assertLess(max(source_sizes), self.data_2d.size / 2)
+        expected = kd_tree.resample_nearest(
+            geometry.SwathDefinition(lons=self.lons_2d.values,
+                                     lats=self.lats_2d.values),
+            self.data_2d.values,
+            geometry.SwathDefinition(lons=tlons, lats=tlats), 50000,
+            fill_value=None, segments=1)
+        np.testing.assert_array_equal(res, expected.filled(np.nan))
+
+    def test_neighbour_info_queried_once(self):
+        """Test sampling several datasets queries the kd-tree only once."""
+        from pyresample.kd_tree import XArrayResamplerNN
+        import dask
+        data = self.data_2d
+        for neighbours, kwargs in ((1, {}),
+                                   (4, {'weight_funcs': lambda r: 1.0})):
+            resampler = XArrayResamplerNN(self.swath_def_2d, self.area_def,
+                                          radius_of_influence=50000,
+                                          neighbours=neighbours)
+            with mock.patch.object(kd_tree, '_query_chunk',
+                                   side_effect=kd_tree._query_chunk) as query:
+                with catch_warnings():
+                    resampler.get_neighbour_info()
+                self.assertEqual(query.call_count, 0)
+                res1 = resampler.get_sample_from_neighbour_info(data,
+                                                                **kwargs)
+                num_queries = query.call_count
+                self.assertGreater(num_queries, 0)
+                res2 = resampler.get_sample_from_neighbour_info(data * 2,
+                                                                **kwargs)
+                self.assertEqual(query.call_count, num_queries)
+                res1, res2 = dask.compute(res1, res2)
+                self.assertEqual(query.call_count, num_queries)
+            np.testing.assert_allclose(res2, res1 * 2)
+
+    def test_nearest_swath_2d_to_area_1n_float32(self):
+        """Test 2D swath definition to 2D area definition in float32."""
+        from pyresample.kd_tree import XArrayResamplerNN
+        swath_def = self.swath_def_2d
+        data = self.data_2d
+        resampler = XArrayResamplerNN(swath_def, self.area_def,
+                                      radius_of_influence=50000,
+                                      neighbours=1)
+        resampler.get_neighbour_info()
+        expected = resampler.get_sample_from_neighbour_info(data).values
+        resampler = XArrayResamplerNN(swath_def, self.area_def,
+                                      radius_of_influence=50000,
+                                      neighbours=1, precision='float32')
+        resampler.get_neighbour_info()
+        self.assertEqual(resampler.delayed_kdtree.compute().data.dtype,
+                         np.float32)
+        res = resampler.get_sample_from_neighbour_info(data).values
+        differs = ~((res == expected) | (np.isnan(res) & np.isnan(expected)))
+        self.assertLess(differs.mean(), 0.001)
+
+    def test_kdtree_reuse(self):
+        """Test the kd-tree is built once per source geometry."""
+        from pyresample.kd_tree import XArrayResamplerNN
+        XArrayResamplerNN.clear_kdtree_cache()
+        self.addCleanup(XArrayResamplerNN.clear_kdtree_cache)
+        create = XArrayResamplerNN._create_resample_kdtree
+        data = self.data_2d
+        mask = data.isnull()
+        with mock.patch.object(XArrayResamplerNN, '_create_resample_kdtree',
+                               autospec=True, side_effect=create) as kdtree:
+            resampler = XArrayResamplerNN(self.swath_def_2d, self.area_def,
+                                          radius_of_influence=50000,
+                                          neighbours=1)
+            resampler.get_neighbour_info(mask=mask)
+            expected = resampler.get_sample_from_neighbour_info(data).values
+            resampler.get_neighbour_info(mask=mask | (data > 100))
+            resampler = XArrayResamplerNN(self.swath_def_2d, self.area_def,
+                                          radius_of_influence=50000,
+                                          neighbours=1)
+            resampler.get_neighbour_info(mask=mask)
+            res = resampler.get_sample_from_neighbour_info(data).values
+            self.assertEqual(kdtree.call_count, 1)
+            # Other precisions need another tree
+            resampler = XArrayResamplerNN(self.swath_def_2d, self.area_def,
+                                          radius_of_influence=50000,
+                                          neighbours=1, precision='float32')
+            resampler.get_neighbour_info(mask=mask)
+            self.assertEqual(kdtree.call_count, 2)
+        np.testing.assert_array_equal(res, expected)
+
+    def test_neighbour_info_lazy(self):
+        """Test getting the neighbour info computes nothing."""
+        import dask
+        import dask.array as da
+        import xarray as xr
+        from pyresample.kd_tree import XArrayResamplerNN
+        XArrayResamplerNN.clear_kdtree_cache()
+        self.addCleanup(XArrayResamplerNN.clear_kdtree_cache)
+
+        def no_compute(*args, **kwargs):
+            raise AssertionError('Neighbour info is computed')
+
+        for source_def in (self.swath_def_2d, self.src_area_2d):
+            mask = xr.DataArray(da.zeros(source_def.shape, dtype=bool,
+                                         chunks=5))
+            for neighbours in (1, 4):
+                resampler = XArrayResamplerNN(source_def, self.area_def,
+                                              radius_of_influence=50000,
+                                              neighbours=neighbours)
+                with dask.config.set(scheduler=no_compute):
+                    resampler.get_neighbour_info()
+                    resampler.get_neighbour_info(mask=mask)
+        # The cached trees are the same tasks
+        resampler = XArrayResamplerNN(self.swath_def_2d, self.area_def,
+                                      radius_of_influence=50000)
+        kdtree = resampler._get_resample_kdtree()[1]
+        other = XArrayResamplerNN(self.swath_def_2d, self.area_def,
+                                  radius_of_influence=50000)
+        self.assertEqual(other._get_resample_kdtree()[1].key, kdtree.key)
+
+    def test_kdtree_cache_threads(self):
+        """Test resamplers sharing the kd-tree cache from several threads."""
+        import threading
+        from pyresample.kd_tree import XArrayResamplerNN
+        XArrayResamplerNN.clear_kdtree_cache()
+        self.addCleanup(XArrayResamplerNN.clear_kdtree_cache)
+        sources = (self.swath_def_2d, self.src_area_2d)
+        errors = []
+
+        def get_neighbour_info(source_def):
+            try:
+                for _ in range(3):
+                    resampler = XArrayResamplerNN(source_def, self.area_def,
+                                                  radius_of_influence=50000,
+                                                  neighbours=1)
+                    resampler.get_neighbour_info()
+            except Exception as err:
+                errors.append(err)
+
+        with mock.patch.object(XArrayResamplerNN, 'kdtree_cache_size', 1):
+            threads = [threading.Thread(target=get_neighbour_info,
+                                        args=(sources[i % 2], ))
+                       for i in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(len(XArrayResamplerNN._kdtree_cache), 1)
+
     def test_nearest_swath_1d_mask_to_grid_8n(self):
         """Test 1D swath definition to 2D grid definition; 8 neighbors."""
         from pyresample.kd_tree import XArrayResamplerNN
@@ -882,16 +1723,100 @@ class TestXArrayResamplerNN(unittest.TestCase):
                                       radius_of_influence=100000,
                                       neighbours=8)
         data = self.tdata_1d
-        ninfo = resampler.get_neighbour_info(mask=data.isnull())
-        for val in ninfo[:3]:
-            # vii, ia, voi
+        with catch_warnings():
+            ninfo = resampler.get_neighbour_info(mask=data.isnull())
+        for val in ninfo:
+            # vii, voi, ia, da
             self.assertIsInstance(val, da.Array)
-        res = resampler.get_sample_from_neighbour_info(data)
+        self.assertRaises(ValueError,
+                          resampler.get_sample_from_neighbour_info, data)
+        res = resampler.get_sample_from_neighbour_info(
+            data, weight_funcs=lambda r: np.exp(-r ** 2 / 50000.0 ** 2))
         self.assertIsInstance(res, xr.DataArray)
         self.assertIsInstance(res.data, da.Array)
-        # actual = res.values
-        # expected = TODO
-        # np.testing.assert_allclose(actual, expected)
+        actual = res.values
+        with catch_warnings():
+            expected = kd_tree.resample_gauss(
+                geometry.SwathDefinition(lons=self.tlons_1d.values,
+                                         lats=self.tlats_1d.values),
+                self.tdata_1d.values,
+                geometry.CoordinateDefinition(
+                    lons=np.asarray(self.tgrid.lons),
+                    lats=np.asarray(self.tgrid.lats)),
+                100000, 50000, fill_value=None, reduce_data=False,
+                segments=1)
+        np.testing.assert_allclose(actual, expected.filled(np.nan))
+
+    def test_gauss_swath_2d_to_area_8n(self):
+        """Test 2D swath definition to 2D area definition; 8 neighbors."""
+        from pyresample.kd_tree import XArrayResamplerNN
+        swath_def = self.swath_def_2d
+        data = self.data_2d
+        resampler = XArrayResamplerNN(swath_def, self.area_def,
+                                      radius_of_influence=50000,
+                                      neighbours=8)
+        with catch_warnings():
+            resampler.get_neighbour_info()
+        res = resampler.get_sample_from_neighbour_info(
+            data, weight_funcs=lambda r: np.exp(-r ** 2 / 25000.0 ** 2))
+        self.assertEqual(res.dims, ('y', 'x'))
+        with catch_warnings():
+            expected = kd_tree.resample_gauss(
+                geometry.SwathDefinition(lons=self.lons_2d.values,
+                                         lats=self.lats_2d.values),
+                data.values, self.area_def, 50000, 25000, fill_value=None,
+                segments=1)
+        self.assertEqual(res.dtype, np.float64)
+        np.testing.assert_allclose(res.values, expected.filled(np.nan))
+        expected64 = res.values
+
+        resampler = XArrayResamplerNN(swath_def, self.area_def,
+                                      radius_of_influence=50000,
+                                      neighbours=8, precision='float32')
+        with catch_warnings():
+            resampler.get_neighbour_info()
+        res = resampler.get_sample_from_neighbour_info(
+            data, weight_funcs=lambda r: np.exp(-r ** 2 / 25000.0 ** 2))
+        self.assertEqual(res.dtype, np.float32)
+        values = res.values
+        self.assertEqual(values.dtype, np.float32)
+        with catch_warnings():
+            expected = kd_tree.resample_gauss(
+                geometry.SwathDefinition(lons=self.lons_2d.values,
+                                         lats=self.lats_2d.values),
+                data.values, self.area_def, 50000, 25000, fill_value=None,
+                segments=1, precision='float32')
+        # float32 cartesian coordinates resolve about 0.4 m at the earth
+        # radius. That changes the weights at 25 km by up to ~1e-4, and
+        # neighbours tied within it, or that close to the radius of
+        # influence, may be selected differently in a few pixels
+        for reference in (expected.filled(np.nan), expected64):
+            close = np.isclose(values, reference, rtol=1e-4, equal_nan=True)
+            self.assertLess((~close).mean(), 0.001)
+
+    def test_custom_area_2d_to_area_4n_3d_data(self):
+        """Test 2D area definition to 2D area definition; 4 neighbors, 3d data."""
+        from pyresample.kd_tree import XArrayResamplerNN
+        data = self.data_3d.rename({'my_dim_y': 'y', 'my_dim_x': 'x'})
+        resampler = XArrayResamplerNN(self.src_area_2d, self.area_def,
+                                      radius_of_influence=50000,
+                                      neighbours=4)
+        with catch_warnings():
+            resampler.get_neighbour_info()
+
+        def weight_func(dist):
+            return 1 - dist / 100000.0
+
+        res = resampler.get_sample_from_neighbour_info(
+            data, weight_funcs=weight_func)
+        self.assertEqual(res.dims, ('y', 'x', 'bands'))
+        six.assertCountEqual(self, res.coords['bands'], ['r', 'g', 'b'])
+        with catch_warnings():
+            expected = kd_tree.resample_custom(
+                self.src_area_2d, data.values, self.area_def, 50000,
+                [weight_func] * 3, neighbours=4, fill_value=None,
+                segments=1)
+        np.testing.assert_allclose(res.values, expected.filled(np.nan))
 
 
 def suite():
@@ -0,0 +1,384 @@
+"""Test the worker pool of the multiprocessing kd-tree and projection."""
+
+import os
+import sys
+import time
+import weakref
+
+import numpy as np
+
+try:
+    from unittest import mock
+except ImportError:
+    # separate mock package py<3.3
+    import mock
+
+from pyresample import _multi_proc, _spatial_mp
+
+if sys.version_info < (2, 7):
+    import unittest2 as unittest
+else:
+    import unittest
+
+
+def _fail(state, data_slice, message):
+    raise ValueError(message)
+
+
+def _count_jobs(state, data_slice, counts):
+    state['jobs'] = state.get('jobs', 0) + 1
+    attach = _multi_proc.attach_shared_array
+    attach(state, counts)[data_slice] = state['jobs']
+
+
+def _add_one(state, data_slice, counts, slow):
+    if data_slice.start < slow:
+        time.sleep(0.02)
+    _multi_proc.attach_shared_array(state, counts)[data_slice] += 1
+
+
+class TestWorkerPool(unittest.TestCase):
+    """Test the persistent worker pool."""
+
+    def tearDown(self):
+        _multi_proc.shutdown_pool()
+
+    def test_get_chunks(self):
+        """Test the chunks cover the data once."""
+        for schedule in ('guided', 'dynamic', 'static'):
+            chunks = _multi_proc.get_chunks(1001, 3, schedule=schedule)
+            self.assertEqual(chunks[0][0], 0)
+            self.assertEqual(chunks[-1][1], 1001)
+            for (start, stop), (next_start, _) in zip(chunks, chunks[1:]):
+                self.assertLess(start, stop)
+                self.assertEqual(stop, next_start)
+        self.assertEqual(_multi_proc.get_chunks(0, 3), [])
+        self.assertRaises(ValueError, _multi_proc.get_chunks, 10, 2,
+                          schedule='unknown')
+
+    def test_state(self):
+        """Test the workers keep their state between jobs."""
+        pool = _multi_proc.get_pool(2)
+        with pool.lock:
+            counts, shared = pool.get_array('counts', (10, ), np.int64)
+            stats = pool.run(_count_jobs, (shared, ), 10, chunk=10)
+            self.assertEqual(sum(stat.items for stat in stats), 10)
+            self.assertGreaterEqual(counts.min(), 1)
+            # One of the two workers runs at least two of the chunks
+            pool.run(_count_jobs, (shared, ), 10, chunk=10)
+            pool.run(_count_jobs, (shared, ), 10, chunk=10)
+            self.assertGreaterEqual(counts.max(), 2)
+
+    def test_stealing(self):
+        """Test idle workers take over the work of busy ones."""
+        from pyresample import instrumentation
+        pool = _multi_proc.get_pool(2)
+        with pool.lock, instrumentation.Recorder() as recorder:
+            counts, shared = pool.get_array('counts', (1000, ), np.int64)
+            counts[:] = 0
+            # The chunks of the first worker are slow
+            stats = pool.run(_add_one, (shared, 500), 1000, chunk=10,
+                             schedule='dynamic')
+            self.assertEqual(counts.tolist(), [1] * 1000)
+        self.assertEqual([stat.worker for stat in stats], [0, 1])
+        self.assertEqual(sum(stat.items for stat in stats), 1000)
+        self.assertGreaterEqual(sum(stat.chunks for stat in stats), 100)
+        self.assertGreater(sum(stat.steals for stat in stats), 0)
+        summary = recorder.summary()
+        self.assertEqual(list(summary), ['multi_proc.run',
+                                         'multi_proc.worker0',
+                                         'multi_proc.worker1'])
+        self.assertEqual(summary['multi_proc.worker1'].counts,
+                         {'chunks': stats[1].chunks, 'items': stats[1].items,
+                          'steals': stats[1].steals})
+
+        # Static chunks are not stolen
+        with pool.lock:
+            stats = pool.run(_add_one, (shared, 500), 1000,
+                             schedule='static')
+            self.assertEqual(counts.tolist(), [2] * 1000)
+        self.assertEqual([stat.chunks for stat in stats], [1, 1])
+        self.assertEqual([stat.steals for stat in stats], [0, 0])
+
+    def test_reuse(self):
+        """Test the same workers are used by later queries."""
+        data = np.random.RandomState(0).uniform(size=(1000, 3))
+        tree = _spatial_mp.cKDTree_MP(data, nprocs=2)
+        tree.query(data[:10])
+        pids = _multi_proc.get_pool(2).pids
+        tree.query(data[10:20])
+        self.assertEqual(_multi_proc.get_pool(2).pids, pids)
+
+    def test_errors(self):
+        """Test errors of the workers are raised in the caller."""
+        pool = _multi_proc.get_pool(2)
+        with self.assertRaises(RuntimeError) as context:
+            pool.run(_fail, ('bad chunk', ), 4, chunk=1,
+                     schedule='dynamic')
+        self.assertIn('4 errors', str(context.exception))
+        self.assertIn('bad chunk', str(context.exception))
+        # The pool is still usable
+        self.assertTrue(pool.is_alive())
+        pool.run(_count_jobs, (pool.get_array('counts', (4, ), int)[1], ), 4)
+
+    def test_shutdown(self):
+        """Test the pool is restarted after a shutdown."""
+        pool = _multi_proc.get_pool(2)
+        _multi_proc.shutdown_pool()
+        self.assertFalse(pool.is_alive())
+        self.assertRaises(RuntimeError, pool.run, _fail, ('', ), 1)
+        new_pool = _multi_proc.get_pool(2)
+        self.assertIsNot(new_pool, pool)
+        self.assertTrue(new_pool.is_alive())
+        self.assertIs(_multi_proc.get_pool(3), _multi_proc.get_pool(3))
+        # Pools of other sizes are not shut down, they may be in use
+        self.assertTrue(new_pool.is_alive())
+        self.assertIs(_multi_proc.get_pool(2), new_pool)
+        with new_pool.lock:
+            counts, shared = new_pool.get_array('counts', (10, ), np.int64)
+            counts[:] = 0
+            new_pool.run(_add_one, (shared, 0), 10)
+            self.assertEqual(counts.tolist(), [1] * 10)
+        thread_pool = _multi_proc.get_thread_pool(2)
+        self.assertIsNot(_multi_proc.get_thread_pool(3), thread_pool)
+        self.assertEqual(thread_pool.map(abs, [-1, 2]), [1, 2])
+
+    def test_query(self):
+        """Test the parallel query matches the serial one."""
+        from scipy.spatial import cKDTree
+        random = np.random.RandomState(1)
+        data = random.uniform(size=(2000, 3))
+        points = random.uniform(size=(500, 3))
+        tree = _spatial_mp.cKDTree_MP(data, nprocs=2)
+        serial_tree = cKDTree(data)
+        for k in (1, 4):
+            dist, idx = tree.query(points, k=k, distance_upper_bound=0.1)
+            serial_dist, serial_idx = serial_tree.query(
+                points, k=k, distance_upper_bound=0.1)
+            np.testing.assert_array_equal(idx, serial_idx)
+            np.testing.assert_allclose(dist, serial_dist)
+        self.assertEqual(idx.dtype, np.intc)
+        dist, idx = tree.query(points[:0])
+        self.assertEqual(idx.shape, (0, ))
+
+    def test_proj(self):
+        """Test the parallel projection matches the serial one."""
+        proj_dict = {'proj': 'stere', 'lat_0': 50, 'lon_0': 8,
+                     'ellps': 'WGS84'}
+        lons, lats = np.meshgrid(np.linspace(-10, 30, 40),
+                                 np.linspace(40, 70, 30))
+        proj = _spatial_mp.Proj_MP(**proj_dict)
+        serial_proj = _spatial_mp.Proj(**proj_dict)
+        for nprocs in (2, 3):
+            xs, ys = proj(lons, lats, nprocs=nprocs)
+            serial_xs, serial_ys = serial_proj(lons, lats)
+            self.assertEqual(xs.shape, lons.shape)
+            np.testing.assert_allclose(xs, serial_xs)
+            np.testing.assert_allclose(ys, serial_ys)
+            back_lons, back_lats = proj(xs, ys, inverse=True, nprocs=nprocs)
+            np.testing.assert_allclose(back_lons, lons)
+            np.testing.assert_allclose(back_lats, lats)
+
+    def test_proj_out(self):
+        """Test projecting to float32 and to given arrays."""
+        proj_dict = {'proj': 'stere', 'lat_0': 50, 'lon_0': 8,
+                     'ellps': 'WGS84'}
+        lons, lats = np.meshgrid(np.linspace(-10, 30, 40),
+                                 np.linspace(40, 70, 30))
+        serial_xs, serial_ys = _spatial_mp.Proj(**proj_dict)(lons, lats)
+        for proj_class in (_spatial_mp.Proj, _spatial_mp.Proj_MP):
+            proj = proj_class(**proj_dict)
+            xs, ys = proj(lons.astype(np.float32), lats.astype(np.float32),
+                          nprocs=2, dtype=np.float32)
+            self.assertEqual(xs.dtype, np.float32)
+            np.testing.assert_allclose(xs, serial_xs, rtol=1e-5, atol=1)
+            np.testing.assert_allclose(ys, serial_ys, rtol=1e-5, atol=1)
+            # Non contiguous output
+            out = np.zeros((2, ) + lons.shape[::-1]).transpose((0, 2, 1))
+            res = proj(lons, lats, nprocs=2, out=tuple(out))
+            self.assertTrue(np.may_share_memory(res[0], out))
+            np.testing.assert_allclose(out[0], serial_xs)
+            np.testing.assert_allclose(out[1], serial_ys)
+            self.assertRaises(ValueError, proj, lons, lats, nprocs=2,
+                              out=(xs[:2], ys[:2]))
+            # Lat/lon projections are copied to the output
+            latlong = proj_class(proj='latlong')
+            xs, ys = latlong(lons, lats, nprocs=2, dtype=np.float32)
+            np.testing.assert_allclose(xs, lons, rtol=1e-6)
+
+    def test_proj_threads(self):
+        """Test the projection with the thread pool."""
+        proj_dict = {'proj': 'geos', 'h': 35785831.0, 'lon_0': 0,
+                     'ellps': 'WGS84'}
+        lons, lats = np.meshgrid(np.linspace(-70, 70, 40),
+                                 np.linspace(-70, 70, 30))
+        serial_xs, serial_ys = _spatial_mp.Proj(**proj_dict)(lons, lats)
+        proj = _spatial_mp.Proj_MP(**proj_dict)
+        with mock.patch.object(_spatial_mp, 'PROJ_RELEASES_GIL', True):
+            xs, ys = proj(lons, lats, nprocs=3)
+            thread_pool = _multi_proc.get_thread_pool(3)
+            xs_32, ys_32 = proj(lons, lats, nprocs=3, dtype=np.float32)
+            self.assertIs(_multi_proc.get_thread_pool(3), thread_pool)
+        np.testing.assert_allclose(xs, serial_xs)
+        np.testing.assert_allclose(ys, serial_ys)
+        self.assertEqual(xs_32.dtype, np.float32)
+        np.testing.assert_allclose(xs_32, serial_xs, rtol=1e-6)
+
+
+class TestSharedBuffer(unittest.TestCase):
+    """Test the shared memory buffers."""
+
+    def test_lifecycle(self):
+        """Test arrays outlive the buffer they are from."""
+        with _multi_proc.SharedBuffer(1000) as buffer:
+            array, shared = buffer.get_array((10, 3), np.int64)
+            self.assertEqual(shared.shape, (10, 3))
+            self.assertEqual(np.dtype(shared.dtype), np.int64)
+            self.assertRaises(ValueError, buffer.get_array, (1001, ), 'u1')
+            self.assertFalse(buffer.closed)
+            array[:] = 7
+            # A worker sees the same memory
+            attached = _multi_proc.attach_shared_array({}, shared)
+            self.assertEqual(attached.sum(), 210)
+            attached[0, 0] = 1
+            self.assertEqual(array[0, 0], 1)
+            del attached
+        self.assertTrue(buffer.closed)
+        self.assertNotIn(buffer, _multi_proc._open_buffers)
+        self.assertEqual(array.sum(), 204)
+
+    def test_close_all(self):
+        """Test releasing the buffers still open."""
+        array, shared, buffer = _multi_proc.create_shared_array(
+            (2, 5), np.float32)
+        self.assertIn(buffer, _multi_proc._open_buffers)
+        _multi_proc.close_shared_buffers()
+        self.assertTrue(buffer.closed)
+        self.assertEqual(array.shape, (2, 5))
+        # Closing twice is harmless
+        buffer.close()
+
+    def test_file_fallback(self):
+        """Test the file backing a buffer is removed once unmapped."""
+        with mock.patch.object(_multi_proc, 'shared_memory', None):
+            buffer = _multi_proc.SharedBuffer(1000)
+            array, shared = buffer.get_array((10, ), np.int64)
+            array[:] = 3
+            attached = _multi_proc.attach_shared_array({}, shared,
+                                                       cache=False)
+            self.assertEqual(attached.sum(), 30)
+            del attached
+        self.assertTrue(os.path.isfile(buffer.name))
+        buffer.close()
+        if not hasattr(weakref, 'finalize'):
+            # python 2 removes the file on close
+            self.assertFalse(os.path.isfile(buffer.name))
+            return
+        # The array still maps the file
+        self.assertTrue(os.path.isfile(buffer.name))
+        self.assertEqual(array.sum(), 30)
+        del array
+        self.assertFalse(os.path.isfile(buffer.name))
+
+        # Failing to remove the file is logged
+        with mock.patch.object(_multi_proc, 'shared_memory', None):
+            buffer = _multi_proc.SharedBuffer(1000)
+        try:
+            with mock.patch.object(_multi_proc.os, 'remove',
+                                   side_effect=OSError('in use')), \
+                    mock.patch.object(_multi_proc, 'logger') as logger:
+                buffer.close()
+            self.assertEqual(logger.warning.call_count, 1)
+        finally:
+            os.remove(buffer.name)
+
+    def test_ctypes(self):
+        """Test the types of raw shared arrays."""
+        import ctypes
+        import multiprocessing as mp
+        for ctype in (ctypes.c_int, ctypes.c_uint, ctypes.c_long,
+                      ctypes.c_ulong, ctypes.c_longlong, ctypes.c_double):
+            raw_array = mp.RawArray(ctype, 3)
+            array = _multi_proc.shmem_as_ndarray(raw_array)
+            self.assertEqual(array.dtype.itemsize, ctypes.sizeof(ctype))
+            self.assertEqual(array.dtype, np.dtype(ctype))
+
+
+class TestCartesian(unittest.TestCase):
+    """Test the transform of lon/lats to cartesian coordinates."""
+
+    def setUp(self):
+        random = np.random.RandomState(2)
+        self.lons = random.uniform(-180, 180, 1000)
+        self.lats = random.uniform(-90, 90, 1000)
+        lons = np.radians(self.lons)
+        lats = np.radians(self.lats)
+        self.expected = _spatial_mp.R * np.column_stack(
+            (np.cos(lats) * np.cos(lons), np.cos(lats) * np.sin(lons),
+             np.sin(lats)))
+
+    def test_transform(self):
+        """Test the coordinates and their type."""
+        cartesian = _spatial_mp.Cartesian()
+        coords = cartesian.transform_lonlats(self.lons, self.lats)
+        self.assertEqual(coords.dtype, np.float64)
+        np.testing.assert_allclose(coords, self.expected, atol=1e-6)
+        coords = cartesian.transform_lonlats(self.lons.astype(np.float32),
+                                             self.lats.astype(np.float32))
+        self.assertEqual(coords.dtype, np.float32)
+        np.testing.assert_allclose(coords, self.expected, atol=10)
+        coords = cartesian.transform_lonlats(self.lons, self.lats,
+                                             dtype=np.float32)
+        self.assertEqual(coords.dtype, np.float32)
+        coords = cartesian.transform_lonlats(np.array([0, 90]),
+                                             np.array([0, 0]))
+        np.testing.assert_allclose(coords, [[_spatial_mp.R, 0, 0],
+                                            [0, _spatial_mp.R, 0]], atol=1e-6)
+
+    def test_out(self):
+        """Test the coordinates are written to the given buffer."""
+        cartesian = _spatial_mp.Cartesian()
+        out = np.zeros((1000, 3), dtype=np.float32)
+        coords = cartesian.transform_lonlats(self.lons, self.lats, out=out)
+        self.assertIs(coords, out)
+        np.testing.assert_allclose(out, self.expected, atol=10)
+        self.assertRaises(ValueError, cartesian.transform_lonlats, self.lons,
+                          self.lats, out=out[:10])
+
+    def test_lonlat_vectors(self):
+        """Test the transform of grid points of lon/lat vectors."""
+        cartesian = _spatial_mp.Cartesian()
+        lons, lats = self.lons[:40], self.lats[:25]
+        rows, cols = np.divmod(np.arange(0, 1000, 3), 40)
+        for dtype in (np.float64, np.float32):
+            coords = cartesian.transform_lonlat_vectors(lons, lats, rows,
+                                                        cols, dtype=dtype)
+            expected = cartesian.transform_lonlats(lons[cols], lats[rows],
+                                                   dtype=dtype)
+            self.assertEqual(coords.dtype, dtype)
+            np.testing.assert_allclose(coords, expected,
+                                       atol=1e-6 if dtype == np.float64 else 2)
+
+    def test_threads(self):
+        """Test the chunks transformed by threads."""
+        for ne in (_spatial_mp.ne, None):
+            with mock.patch.object(_spatial_mp, 'MIN_TRANSFORM_CHUNK', 100), \
+                    mock.patch.object(_spatial_mp, 'ne', ne):
+                coords = _spatial_mp.Cartesian_MP(3).transform_lonlats(
+                    self.lons, self.lats)
+            np.testing.assert_allclose(coords, self.expected, atol=1e-6)
+
+
+def suite():
+    """The test suite."""
+    loader = unittest.TestLoader()
+    mysuite = unittest.TestSuite()
+    mysuite.addTest(loader.loadTestsFromTestCase(TestWorkerPool))
+    mysuite.addTest(loader.loadTestsFromTestCase(TestSharedBuffer))
+    mysuite.addTest(loader.loadTestsFromTestCase(TestCartesian))
+
+    return mysuite
+
+
+if __name__ == '__main__':
+    unittest.main()
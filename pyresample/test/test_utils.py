@@ -1,10 +1,17 @@
 import os
 import unittest
+import warnings
 
 import numpy as np
 
 from pyresample.test.utils import create_test_longitude, create_test_latitude
 
+try:
+    from unittest import mock
+except ImportError:
+    # separate mock package py<3.3
+    import mock
+
 
 def tmp(f):
     f.tmp = True
@@ -247,6 +254,68 @@ class TestMisc(unittest.TestCase):
         proj_dict2 = utils.proj4_str_to_dict(proj_str2)
         self.assertDictEqual(proj_dict, proj_dict2)
 
+    def test_plan_segments(self):
+        from pyresample import utils
+        plan = utils.plan_segments(lambda segments: 1000 // segments, 100,
+                                   300)
+        self.assertEqual(plan, (4, 250, 300))
+        plan = utils.plan_segments(lambda segments: 1000 // segments, 100,
+                                   300, min_segments=8)
+        self.assertEqual(plan.segments, 8)
+        # A single segment can be cheaper than several
+        plan = utils.plan_segments(
+            lambda segments: 100 if segments == 1 else 150 // segments, 10,
+            120)
+        self.assertEqual(plan.segments, 1)
+        plan = utils.plan_segments(
+            lambda segments: 100 if segments == 1 else 150 // segments, 10,
+            60)
+        self.assertEqual(plan.segments, 3)
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            plan = utils.plan_segments(lambda segments: 1000 // segments,
+                                       100, 5)
+        self.assertEqual(plan.segments, 100)
+        self.assertEqual(len(caught), 1)
+
+    def test_get_available_memory(self):
+        import io
+        from pyresample import utils
+        meminfo = u'MemTotal:       4096 kB\nMemAvailable:   2048 kB\n'
+        # Without psutil /proc/meminfo is read
+        with mock.patch.dict('sys.modules', {'psutil': None}):
+            with mock.patch.object(utils, 'open', create=True,
+                                   return_value=io.StringIO(meminfo)):
+                self.assertEqual(utils.get_available_memory(), 2048 * 1024)
+            with mock.patch.object(utils, 'open', create=True,
+                                   side_effect=IOError):
+                self.assertIsNone(utils.get_available_memory())
+
+    def test_downcast_index_array(self):
+        from pyresample import utils
+        index_array = np.array([0, 5, -1, 300])
+        res = utils._downcast_index_array(index_array, 10,
+                                          dtypes=(np.uint8, np.uint16))
+        self.assertEqual(res.dtype, np.uint8)
+        np.testing.assert_array_equal(res, [0, 5, 10, 10])
+        # The given array is left untouched
+        np.testing.assert_array_equal(index_array, [0, 5, -1, 300])
+
+    def test_packed_mask(self):
+        import pickle
+        from pyresample import utils
+        mask = np.arange(13) % 3 == 0
+        packed = utils.PackedMask.pack(mask.reshape(1, 13))
+        self.assertEqual(packed.dtype, np.uint8)
+        self.assertEqual(packed.size, 2)
+        self.assertEqual(packed.mask_size, 13)
+        np.testing.assert_array_equal(packed.unpack(), mask)
+        unpickled = pickle.loads(pickle.dumps(packed))
+        self.assertEqual(unpickled.mask_size, 13)
+        np.testing.assert_array_equal(unpickled.unpack(), mask)
+        # Operations on the bytes are not packed masks
+        self.assertNotIsInstance(packed + 1, utils.PackedMask)
+
 
 def suite():
     """The test suite.
@@ -24,11 +24,12 @@
 from __future__ import absolute_import
 
 import os
+import warnings
 import numpy as np
 import six
 import yaml
 from configobj import ConfigObj
-from collections import Mapping
+from collections import Mapping, namedtuple
 from xarray import DataArray
 
 
@@ -499,17 +500,134 @@ def proj4_radius_parameters(proj4_dict):
     return float(new_info['a']), float(new_info['b'])
 
 
-def _downcast_index_array(index_array, size):
-    """Try to downcast array to uint16
+def _downcast_index_array(index_array, size, dtypes=(np.uint16, )):
+    """Try to downcast array to the first of `dtypes` that can hold `size`
+
+    Indices outside [0, size[ are set to `size`.
     """
 
-    if size <= np.iinfo(np.uint16).max:
-        mask = (index_array < 0) | (index_array >= size)
-        index_array[mask] = size
-        index_array = index_array.astype(np.uint16)
+    for dtype in dtypes:
+        if size <= np.iinfo(dtype).max:
+            mask = (index_array < 0) | (index_array >= size)
+            # Downcast to a new array, leaving the given one untouched
+            downcast = index_array.astype(dtype)
+            downcast[mask] = size
+            return downcast
     return index_array
 
 
+class PackedMask(np.ndarray):
+    """Boolean mask bit-packed by :func:`numpy.packbits`
+
+    The array holds the packed bytes, `mask_size` is the size of the
+    unpacked mask. Results of operations on the bytes are plain arrays.
+    """
+
+    def __new__(cls, packed, mask_size):
+        obj = np.asarray(packed, dtype=np.uint8).view(cls)
+        obj.mask_size = int(mask_size)
+        return obj
+
+    def __array_finalize__(self, obj):
+        self.mask_size = getattr(obj, 'mask_size', None)
+
+    def __array_wrap__(self, out_arr, *args):
+        return out_arr.view(np.ndarray)
+
+    def __reduce__(self):
+        return (PackedMask, (self.view(np.ndarray), self.mask_size))
+
+    @classmethod
+    def pack(cls, mask):
+        """Bit-pack the boolean `mask`, flattened"""
+        mask = np.asarray(mask, dtype=np.bool).ravel()
+        return cls(np.packbits(mask), mask.size)
+
+    def unpack(self):
+        """Get the flat boolean mask"""
+        return np.unpackbits(self.view(np.ndarray))[:self.mask_size].view(
+            np.bool)
+
+
+SegmentPlan = namedtuple('SegmentPlan', ['segments', 'peak_memory',
+                                         'memory_budget'])
+SegmentPlan.__doc__ = """Number of segments and the estimated peak memory in bytes
+
+`memory_budget` is the budget the segments were chosen for, None if
+the number of segments was given or no budget was.
+"""
+
+
+def get_available_memory():
+    """Get the system memory available for new allocations
+
+    Uses psutil if installed, /proc/meminfo otherwise. A fraction of it
+    can be given as the `max_memory` budget of the resampling functions.
+
+    Returns
+    -------
+    available : int or None
+        Available memory in bytes, None if it can not be determined
+    """
+
+    try:
+        import psutil
+    except ImportError:
+        pass
+    else:
+        return int(psutil.virtual_memory().available)
+    try:
+        with open('/proc/meminfo') as meminfo:
+            for line in meminfo:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except (IOError, OSError, ValueError):
+        pass
+    return None
+
+
+def plan_segments(peak_memory, rows, memory_budget, min_segments=1):
+    """Choose the least number of row segments fitting in a memory budget
+
+    Parameters
+    ----------
+    peak_memory : callable
+        Function returning the estimated peak memory in bytes when
+        processing in the given number of segments. Beyond two segments
+        the estimate must not grow with the number of segments
+    rows : int
+        Number of rows to segment, the maximum number of segments
+    memory_budget : int
+        Memory budget in bytes
+    min_segments : int, optional
+        Least number of segments to use
+
+    Returns
+    -------
+    plan : SegmentPlan
+        If even one row per segment exceeds the budget, a warning is
+        issued and the plan uses one row per segment
+    """
+
+    low = max(1, min(min_segments, rows))
+    if peak_memory(low) <= memory_budget:
+        return SegmentPlan(low, peak_memory(low), memory_budget)
+    high = max(rows, low)
+    if peak_memory(high) > memory_budget:
+        warnings.warn('Estimated memory use of %d bytes exceeds the memory '
+                      'budget of %d bytes' % (peak_memory(high),
+                                              memory_budget))
+        return SegmentPlan(high, peak_memory(high), memory_budget)
+    # Bisect for the least number of segments within budget
+    while high - low > 1:
+        middle = (low + high) // 2
+        if peak_memory(middle) <= memory_budget:
+            high = middle
+        else:
+            low = middle
+    return SegmentPlan(high, peak_memory(high), memory_budget)
+
+
 def wrap_longitudes(lons):
     """Wrap longitudes to the [-180:+180[ validity range (preserves dtype)
 